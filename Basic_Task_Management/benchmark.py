@@ -0,0 +1,388 @@
+"""Benchmarks for the task store.
+
+Log-backed scenarios write to a throwaway directory so they never touch
+tasks.log. Run a scenario with:
+
+    python benchmark.py store --tasks 1000000
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from store import LogTaskStore, MemoryTaskStore
+
+
+def make_task(number):
+    return {"title": f"Task {number}", "description": "bench", "completed": False}
+
+
+class ListTaskStore:
+    """The original storage: a list of tasks scanned on every update and delete."""
+
+    def __init__(self):
+        self._tasks = []
+        self._next_id = 1
+
+    def create(self, task):
+        task = {**task, "id": self._next_id}
+        self._next_id += 1
+        self._tasks.append(task)
+        return task
+
+    def update(self, task_id, task):
+        for i, existing in enumerate(self._tasks):
+            if existing["id"] == task_id:
+                self._tasks[i] = {**task, "id": task_id}
+                return self._tasks[i]
+        return None
+
+    def delete(self, task_id):
+        for i, existing in enumerate(self._tasks):
+            if existing["id"] == task_id:
+                self._tasks.pop(i)
+                return True
+        return False
+
+
+def fill(store, tasks):
+    start = time.perf_counter()
+    for number in range(tasks):
+        store.create(make_task(number))
+    return time.perf_counter() - start
+
+
+def time_operations(store, tasks, operations):
+    """Update then delete `operations` random tasks; return seconds per op for each."""
+    ids = random.sample(range(1, tasks + 1), operations)
+    start = time.perf_counter()
+    for task_id in ids:
+        assert store.update(task_id, {**make_task(task_id), "completed": True}) is not None
+    update = (time.perf_counter() - start) / operations
+    start = time.perf_counter()
+    for task_id in ids:
+        assert store.delete(task_id)
+    delete = (time.perf_counter() - start) / operations
+    return update, delete
+
+
+def run_store(args):
+    print(f"{args.tasks} tasks, {args.operations} updates and deletes of random ids "
+          f"({args.list_operations} for the list baseline)")
+    print(f"{'store':<14}{'fill s':>10}{'update us':>12}{'delete us':>12}")
+
+    def report(name, fill_seconds, update, delete):
+        print(f"{name:<14}{fill_seconds:>10.2f}{update * 1e6:>12.1f}{delete * 1e6:>12.1f}")
+
+    if not args.skip_list:
+        store = ListTaskStore()
+        fill_seconds = fill(store, args.tasks)
+        report("list scan", fill_seconds, *time_operations(store, args.tasks, args.list_operations))
+        del store
+
+    store = MemoryTaskStore()
+    fill_seconds = fill(store, args.tasks)
+    report("memory", fill_seconds, *time_operations(store, args.tasks, args.operations))
+    del store
+
+    directory = tempfile.mkdtemp(prefix="task_store_bench_")
+    for fsync in ([False, True] if args.fsync else [False]):
+        path = os.path.join(directory, f"tasks-{int(fsync)}.log")
+        store = LogTaskStore(path)
+        fill_seconds = fill(store, args.tasks)
+        if fsync:
+            # Fill without fsync, then time only the updates and deletes with it
+            store.close()
+            store = LogTaskStore(path, fsync=True)
+        operations = args.operations if not fsync else min(args.operations, 1000)
+        report("log+fsync" if fsync else "log", fill_seconds, *time_operations(store, args.tasks, operations))
+        store.close()
+
+    # Startup replay of a log holding every create plus the updates and deletes above
+    path = os.path.join(directory, "tasks-0.log")
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    store = LogTaskStore(path)
+    replay = time.perf_counter() - start
+    print(f"\nreplay of {size / 2**20:.0f} MiB log: {replay:.2f}s, {len(store)} live tasks")
+    store.close()
+
+    store = LogTaskStore(path)
+    store.compact()
+    store.close()
+    start = time.perf_counter()
+    store = LogTaskStore(path)
+    print(f"replay after compaction ({os.path.getsize(path) / 2**20:.0f} MiB): "
+          f"{time.perf_counter() - start:.2f}s")
+    store.close()
+
+
+def run_restart(args):
+    directory = tempfile.mkdtemp(prefix="task_store_restart_")
+    path = os.path.join(directory, "restart.log")
+    random.seed(args.seed)
+
+    def reopen(store):
+        store.close()
+        return LogTaskStore(path, compact_min_records=args.compact_min_records)
+
+    store = LogTaskStore(path, compact_min_records=args.compact_min_records)
+    expected = {}
+    highest = 0
+    compactions = 0
+    for number in range(args.operations):
+        records = store._records
+        choice = random.random()
+        if not expected or choice < 0.4:
+            task = store.create(make_task(number))
+            expected[task["id"]] = task
+            highest = task["id"]
+        elif choice < 0.7:
+            task_id = random.choice(list(expected))
+            expected[task_id] = store.update(task_id, {**make_task(number), "completed": number % 2 == 0})
+        else:
+            task_id = random.choice(list(expected))
+            assert store.delete(task_id)
+            del expected[task_id]
+        if store._records < records:
+            # The change that triggered the compaction must be in the rewritten log
+            compactions += 1
+            store = reopen(store)
+            actual = {task["id"]: task for task in store.list()}
+            assert actual == expected, f"after compaction {compactions}: {len(set(actual) ^ set(expected))} ids differ"
+    store = reopen(store)
+    assert {task["id"]: task for task in store.list()} == expected, "final replay differs"
+    # A create after the restart must not reuse the id of a deleted task
+    assert store.create(make_task(args.operations))["id"] > highest, "id reused after restart"
+    store.close()
+    print(f"{args.operations} operations, {compactions} compactions, each followed by a restart: "
+          f"{len(expected)} tasks replayed as written")
+
+
+class StoreClient:
+    """Calls the store directly, as the handlers do."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def create(self, task):
+        return self.store.create(task)
+
+    def update(self, task_id, task):
+        return self.store.update(task_id, task)
+
+    def delete(self, task_id):
+        return self.store.delete(task_id)
+
+
+class HttpClient:
+    """Sends requests to a running server, one keep-alive connection per thread."""
+
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, decode=True, headers=None):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection("127.0.0.1", self.port)
+        headers = dict(headers or {})
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        payload = response.read()
+        self.local.headers = response.headers
+        return response.status, json.loads(payload) if payload and decode else payload
+
+    def create(self, task):
+        status, task = self.request("POST", "/tasks", task)
+        assert status == 201, status
+        return task
+
+    def update(self, task_id, task):
+        status, task = self.request("PUT", f"/tasks/{task_id}", task)
+        return task if status == 200 else None
+
+    def delete(self, task_id):
+        status, _ = self.request("DELETE", f"/tasks/{task_id}")
+        return status == 204
+
+
+def start_server(store):
+    """Serve main.app with `store` on a free port in a background thread."""
+    import uvicorn
+    import main as task_app
+
+    task_app.store = store
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(task_app.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, port
+
+
+def stress_worker(client, worker, tasks, updates):
+    """Create, repeatedly update and then delete half of this worker's tasks.
+
+    Returns the ids it was given and what each surviving task should hold.
+    """
+    ids = [client.create({"title": f"w{worker} t{i} v0", "description": "stress", "completed": False})["id"]
+           for i in range(tasks)]
+    expected = {}
+    for version in range(1, updates + 1):
+        for i, task_id in enumerate(ids):
+            task = {"title": f"w{worker} t{i} v{version}", "description": "stress", "completed": version % 2 == 0}
+            assert client.update(task_id, task) is not None, f"task {task_id} vanished"
+            expected[task_id] = {**task, "id": task_id}
+    for task_id in ids[::2]:
+        assert client.delete(task_id), f"task {task_id} vanished"
+        del expected[task_id]
+    return ids, expected
+
+
+def run_stress(args):
+    directory = tempfile.mkdtemp(prefix="task_store_stress_")
+    operations = args.threads * args.tasks * (2 + args.updates) - args.threads * (args.tasks // 2)
+    print(f"{args.threads} threads x {args.tasks} tasks x {args.updates} updates "
+          f"({operations} requests){' over HTTP' if args.http else ''}")
+    print(f"{'store':<10}{'seconds':>10}{'ops/s':>12}")
+
+    for backend in ["memory", "log"]:
+        path = os.path.join(directory, "stress.log")
+        store = MemoryTaskStore() if backend == "memory" else LogTaskStore(path, compact_min_records=1000)
+        if args.http:
+            server, thread, port = start_server(store)
+            client = HttpClient(port)
+        else:
+            client = StoreClient(store)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            results = list(pool.map(
+                lambda worker: stress_worker(client, worker, args.tasks, args.updates), range(args.threads)
+            ))
+        elapsed = time.perf_counter() - start
+
+        if args.http:
+            server.should_exit = True
+            thread.join()
+
+        # Every create got its own id, and every acknowledged change is in the store
+        ids = [task_id for worker_ids, _ in results for task_id in worker_ids]
+        assert len(set(ids)) == len(ids) == args.threads * args.tasks, "duplicate task ids"
+        expected = {}
+        for _, worker_expected in results:
+            expected.update(worker_expected)
+        actual = {task["id"]: task for task in store.list()}
+        assert actual == expected, f"{len(set(actual.items()) ^ set(expected.items()))} tasks differ"
+
+        if backend == "log":
+            # Replaying the log, compactions included, reproduces the same tasks
+            store.close()
+            replayed = LogTaskStore(path)
+            assert {task["id"]: task for task in replayed.list()} == expected, "log replay differs"
+            replayed.close()
+
+        print(f"{backend:<10}{elapsed:>10.2f}{operations / elapsed:>12.0f}")
+    print("unique ids, no lost updates")
+
+
+def run_list(args):
+    from typing import List
+
+    import main as task_app
+
+    store = MemoryTaskStore()
+    for number in range(args.tasks):
+        store.create({**make_task(number), "completed": number % 10 == 0})
+
+    # The original handler: return the stored tasks and let FastAPI validate
+    # and serialize each one through response_model
+    @task_app.app.get("/bench/validated", response_model=List[task_app.Task])
+    def get_tasks_validated():
+        return store.list()
+
+    server, thread, port = start_server(store)
+    client = HttpClient(port)
+
+    def timed(path, repeat, headers=None):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            status, body = client.request("GET", path, decode=False, headers=headers)
+            times.append(time.perf_counter() - start)
+            assert status == (304 if headers else 200), status
+        return min(times), len(json.loads(body)) if body else 0
+
+    # Resume from a cursor halfway through the table
+    middle = store.list(after=args.tasks // 2, limit=1)[0]["id"] - 1
+    cursor = task_app.encode_cursor(middle)
+    cases = [
+        ("all, response_model", "/bench/validated", args.repeat),
+        ("all, cached JSON (cold)", "/tasks", 1),
+        ("all, cached JSON", "/tasks", args.repeat),
+        ("all, If-None-Match (304)", "/tasks", args.repeat * 10),
+        ("completed=true", "/tasks?completed=true", args.repeat),
+        ("limit=100", "/tasks?limit=100", args.repeat * 10),
+        ("limit=100, deep cursor", f"/tasks?limit=100&after={cursor}", args.repeat * 10),
+        ("completed=true&limit=100, deep", f"/tasks?completed=true&limit=100&after={cursor}", args.repeat * 10),
+    ]
+    print(f"GET /tasks over HTTP with {args.tasks} tasks (10% completed), best of each")
+    print(f"{'request':<34}{'ms':>10}{'tasks':>10}")
+    for name, path, repeat in cases:
+        headers = {"If-None-Match": client.local.headers["ETag"]} if "304" in name else None
+        seconds, count = timed(path, repeat, headers)
+        print(f"{name:<34}{seconds * 1000:>10.2f}{count:>10}")
+
+    server.should_exit = True
+    thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    store = subparsers.add_parser("store", help="update/delete cost of the list scan vs the indexed stores")
+    store.add_argument("--tasks", type=int, default=1000000)
+    store.add_argument("--operations", type=int, default=10000)
+    store.add_argument("--list-operations", type=int, default=100,
+                       help="operations timed on the list baseline, which scans on each one")
+    store.add_argument("--skip-list", action="store_true", help="skip the original list-scan store")
+    store.add_argument("--fsync", action="store_true", help="also time the log store with fsync on every write")
+    store.set_defaults(func=run_store)
+
+    stress = subparsers.add_parser("stress", help="concurrent create/update/delete; checks ids and lost updates")
+    stress.add_argument("--threads", type=int, default=32)
+    stress.add_argument("--tasks", type=int, default=100, help="tasks created by each thread")
+    stress.add_argument("--updates", type=int, default=3, help="updates of each task")
+    stress.add_argument("--http", action="store_true", help="send the requests to main.app through uvicorn")
+    stress.set_defaults(func=run_stress)
+
+    restart = subparsers.add_parser("restart", help="log store: append, compact, reload and compare the tasks")
+    restart.add_argument("--operations", type=int, default=20000)
+    restart.add_argument("--compact-min-records", type=int, default=100)
+    restart.add_argument("--seed", type=int, default=0)
+    restart.set_defaults(func=run_restart)
+
+    listing = subparsers.add_parser("list", help="GET /tasks: response_model validation vs cached JSON, pages")
+    listing.add_argument("--tasks", type=int, default=100000)
+    listing.add_argument("--repeat", type=int, default=5)
+    listing.set_defaults(func=run_list)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
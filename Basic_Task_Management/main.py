@@ -1,9 +1,14 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
+import base64
+import json
+import secrets
 import uvicorn
 
+from store import create_store
+
 app = FastAPI()
 
 # Enable CORS
@@ -13,6 +18,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Task model
@@ -22,42 +28,75 @@ class Task(BaseModel):
     description: str
     completed: bool = False
 
-# In-memory storage
-tasks = []
-task_counter = 1
+# Task storage, indexed by id (see store.py; TASK_STORE selects the backend)
+store = create_store()
+
+# Pagination cursors: the ID of the last task on a page, as an opaque token
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(last_id: int):
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+# ETags are the store's change counter, prefixed so that tags handed out
+# before a restart never match
+ETAG_PREFIX = secrets.token_hex(4)
 
-# Get all tasks
+def etag_matches(etag: str, if_none_match: str):
+    # If-None-Match uses weak comparison, so W/"x" and "x" are the same tag
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+# Get all tasks, or one page of them
 @app.get("/tasks", response_model=List[Task])
-def get_tasks():
-    return tasks
+def get_tasks(
+    completed: Optional[bool] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    if_none_match: Optional[str] = Header(None)
+):
+    # Read the version before the tasks so the tag is never newer than the body
+    etag = f'W/"{ETAG_PREFIX}-{store.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    tasks = store.list(completed, decode_cursor(after) if after else None, limit)
+    if limit and len(tasks) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(tasks[-1]["id"])
+    # Stored tasks were validated on the way in, so send their cached JSON
+    # instead of re-validating every task against the response model
+    return Response(store.dumps(tasks), media_type="application/json", headers=headers)
 
 # Create a new task
 @app.post("/tasks", response_model=Task, status_code=201)
 def create_task(task: Task):
-    global task_counter
-    task.id = task_counter
-    task_counter += 1
-    tasks.append(task)
-    return task
+    return store.create(task.dict(exclude={"id"}))
 
 # Update a task
 @app.put("/tasks/{task_id}", response_model=Task)
 def update_task(task_id: int, updated_task: Task):
-    for i, task in enumerate(tasks):
-        if task.id == task_id:
-            updated_task.id = task_id  # Ensure ID remains the same
-            tasks[i] = updated_task
-            return updated_task
-    raise HTTPException(status_code=404, detail="Task not found")
+    # The ID in the path wins over any ID in the body
+    task = store.update(task_id, updated_task.dict(exclude={"id"}))
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
 
 # Delete a task
 @app.delete("/tasks/{task_id}", status_code=204)
 def delete_task(task_id: int):
-    for i, task in enumerate(tasks):
-        if task.id == task_id:
-            tasks.pop(i)
-            return
-    raise HTTPException(status_code=404, detail="Task not found")
+    if not store.delete(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
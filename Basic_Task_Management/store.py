@@ -0,0 +1,292 @@
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+# Task storage backends. Tasks are plain dicts ({"id", "title", "description",
+# "completed"}) kept in a dict keyed by id, so lookups, updates and deletes
+# are O(1) and listing follows creation order (dicts keep insertion order).
+#
+# FastAPI runs the sync handlers on a threadpool, so every operation holds the
+# store's lock: ids are allocated once, a check and the write that follows it
+# can't interleave with another request, and log records are appended in the
+# same order the changes are applied.
+#
+# Ids only grow and are never reused, so the dict is also in id order. Paging
+# with a cursor (the last id seen) and filtering on `completed` go through
+# IdIndex secondary indexes instead of scanning, and each task is encoded to
+# JSON once when it is written so listing doesn't re-encode every task.
+#
+# Pick the backend with TASK_STORE:
+#   memory - tasks live only in this process (the default)
+#   log    - every change is appended to TASK_LOG_PATH and replayed at startup
+
+
+class IdIndex:
+    """A set of task ids that can be read back in ascending order from any id.
+
+    Removed ids are only dropped from the membership set; the sorted list is
+    rebuilt once more than half of it is stale, so removal stays O(1)
+    amortized. Adding the largest id so far is an append.
+    """
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._ids = sorted(ids)
+        self._members = set(self._ids)
+
+    def __len__(self):
+        return len(self._members)
+
+    def add(self, task_id: int):
+        if task_id in self._members:
+            return
+        self._members.add(task_id)
+        ids = self._ids
+        if not ids or task_id > ids[-1]:
+            ids.append(task_id)
+            return
+        position = bisect_left(ids, task_id)
+        if ids[position] != task_id:
+            ids.insert(position, task_id)
+
+    def discard(self, task_id: int):
+        if task_id not in self._members:
+            return
+        self._members.remove(task_id)
+        if len(self._ids) > 2 * len(self._members) + 1024:
+            self._ids = [i for i in self._ids if i in self._members]
+
+    def after(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+        """Return up to `limit` ids greater than `after_id`, in ascending order."""
+        ids, members = self._ids, self._members
+        position = 0 if after_id is None else bisect_right(ids, after_id)
+        if len(ids) == len(members):
+            # No stale ids to skip
+            return ids[position:None if limit is None else position + limit]
+        found = []
+        for task_id in islice(ids, position, None):
+            if task_id in members:
+                found.append(task_id)
+                if len(found) == limit:
+                    break
+        return found
+
+
+def _without_id(task: dict) -> dict:
+    return {key: value for key, value in task.items() if key != "id"}
+
+
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def _encode(record) -> bytes:
+    return _encoder.encode(record).encode()
+
+
+class MemoryTaskStore:
+    def __init__(self):
+        self._tasks: Dict[int, dict] = {}
+        self._next_id = 1
+        # Reentrant so a write can compact the log while holding it
+        self._lock = threading.RLock()
+        # Task id -> (task, its JSON), valid while the task is that same object
+        self._encoded: Dict[int, tuple] = {}
+        self._version = 0
+        self._reindex()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    @property
+    def version(self) -> int:
+        """Number of changes made through this store; ETags are built from it."""
+        return self._version
+
+    def _reindex(self):
+        self._index = IdIndex(self._tasks)
+        self._by_completed = {
+            completed: IdIndex(task_id for task_id, task in self._tasks.items() if task["completed"] == completed)
+            for completed in (False, True)
+        }
+
+    def list(self, completed: Optional[bool] = None, after: Optional[int] = None,
+             limit: Optional[int] = None) -> List[dict]:
+        """Return tasks in id order, optionally only those with ids above `after`."""
+        with self._lock:
+            if completed is None and after is None:
+                return list(islice(self._tasks.values(), limit))
+            index = self._index if completed is None else self._by_completed[completed]
+            tasks = self._tasks
+            return [tasks[task_id] for task_id in index.after(after, limit)]
+
+    def dumps(self, tasks: List[dict]) -> bytes:
+        """Encode tasks from `list` as a JSON array from each task's cached JSON."""
+        return b"[" + b",".join(self._encoded_task(task) for task in tasks) + b"]"
+
+    def _encoded_task(self, task: dict) -> bytes:
+        cached = self._encoded.get(task["id"])
+        if cached is None or cached[0] is not task:
+            # Replayed from the log, or replaced since `list` returned it
+            cached = self._encoded[task["id"]] = (task, _encode(task))
+        return cached[1]
+
+    def get(self, task_id: int) -> Optional[dict]:
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def create(self, task: dict) -> dict:
+        with self._lock:
+            task = {"id": self._next_id, **_without_id(task)}
+            self._next_id += 1
+            self._put(task)
+            return task
+
+    def update(self, task_id: int, task: dict) -> Optional[dict]:
+        with self._lock:
+            if task_id not in self._tasks:
+                return None
+            task = {"id": task_id, **_without_id(task)}
+            self._put(task)
+            return task
+
+    def delete(self, task_id: int) -> bool:
+        with self._lock:
+            if task_id not in self._tasks:
+                return False
+            self._remove(task_id)
+            return True
+
+    def _put(self, task: dict, encoded: Optional[bytes] = None):
+        task_id = task["id"]
+        previous = self._tasks.get(task_id)
+        self._tasks[task_id] = task
+        self._version += 1
+        self._encoded[task_id] = (task, encoded or _encode(task))
+        self._index.add(task_id)
+        if previous is not None and previous["completed"] != task["completed"]:
+            self._by_completed[previous["completed"]].discard(task_id)
+        self._by_completed[task["completed"]].add(task_id)
+
+    def _remove(self, task_id: int):
+        task = self._tasks.pop(task_id)
+        self._version += 1
+        self._encoded.pop(task_id, None)
+        self._index.discard(task_id)
+        self._by_completed[task["completed"]].discard(task_id)
+
+
+class LogTaskStore(MemoryTaskStore):
+    """Memory store whose changes are appended to a JSON-lines log.
+
+    Each line is {"put": task}, {"delete": id} or, after a compaction,
+    {"next_id": n}. On startup the log is replayed into memory; when it holds
+    more than `compact_ratio` times as many records as there are live tasks
+    it is rewritten with one record per task. With `fsync` every write is
+    flushed to disk before it returns; without it a crash can lose the writes
+    still in the OS cache.
+    """
+
+    def __init__(self, path: str, fsync: bool = False, compact_ratio: float = 2.0, compact_min_records: int = 10000):
+        super().__init__()
+        self._path = path
+        self._fsync = fsync
+        self._compact_ratio = compact_ratio
+        self._compact_min_records = compact_min_records
+        self._records = 0
+        self._replay()
+        self._log = open(self._path, "ab")
+
+    def _replay(self):
+        if not os.path.exists(self._path):
+            return
+        tasks = self._tasks
+        intact = 0
+        with open(self._path, "rb") as log:
+            for line in log:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final record from a crash mid-write; everything before it is intact
+                    break
+                intact += len(line)
+                if "put" in record:
+                    task = record["put"]
+                    tasks[task["id"]] = task
+                    self._next_id = max(self._next_id, task["id"] + 1)
+                elif "delete" in record:
+                    tasks.pop(record["delete"], None)
+                else:
+                    self._next_id = max(self._next_id, record["next_id"])
+                self._records += 1
+        if intact < os.path.getsize(self._path):
+            # Drop the torn record so new appends start on a clean line
+            os.truncate(self._path, intact)
+        self._reindex()
+        self._maybe_compact()
+
+    def _append(self, line: bytes):
+        self._log.write(line)
+        self._log.flush()
+        if self._fsync:
+            os.fsync(self._log.fileno())
+        self._records += 1
+
+    def _put(self, task: dict, encoded: Optional[bytes] = None):
+        # The task's JSON goes into the log record and the listing cache alike
+        encoded = encoded or _encode(task)
+        self._append(b'{"put":' + encoded + b"}\n")
+        super()._put(task, encoded)
+        # Only once the change is applied, or a compaction would leave it out
+        self._maybe_compact()
+
+    def _remove(self, task_id: int):
+        self._append(_encode({"delete": task_id}) + b"\n")
+        super()._remove(task_id)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._records < self._compact_min_records:
+            return
+        if self._records <= self._compact_ratio * max(len(self._tasks), 1):
+            return
+        self.compact()
+
+    def compact(self):
+        """Rewrite the log with one record per live task."""
+        with self._lock:
+            log = getattr(self, "_log", None)
+            if log is not None:
+                log.close()
+            temporary_path = self._path + ".compact"
+            with open(temporary_path, "wb") as compacted:
+                # Ids of deleted tasks are never handed out again
+                compacted.write(_encode({"next_id": self._next_id}) + b"\n")
+                for task in self._tasks.values():
+                    compacted.write(b'{"put":' + self._encoded_task(task) + b"}\n")
+                compacted.flush()
+                os.fsync(compacted.fileno())
+            os.replace(temporary_path, self._path)
+            self._records = len(self._tasks) + 1
+            if log is not None:
+                self._log = open(self._path, "ab")
+
+    def close(self):
+        with self._lock:
+            self._log.close()
+
+
+def create_store():
+    """Create the task store selected by the environment."""
+    backend = os.getenv("TASK_STORE", "memory")
+    if backend == "memory":
+        return MemoryTaskStore()
+    if backend == "log":
+        return LogTaskStore(
+            os.getenv("TASK_LOG_PATH", "tasks.log"),
+            fsync=os.getenv("TASK_LOG_FSYNC", "false").lower() in ("1", "true", "yes", "on"),
+        )
+    raise ValueError(f"Unknown TASK_STORE {backend!r}; expected 'memory' or 'log'")
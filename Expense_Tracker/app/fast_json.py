@@ -0,0 +1,26 @@
+import os
+from fastapi import Response
+from .schemas import serializer
+
+# Fast JSON mode (FAST_JSON_ENABLED) takes the expense lists off FastAPI's
+# generic serialization path.
+#
+# By default FastAPI validates a handler's return value against the
+# response_model, dumps the result to Python objects and then encodes those
+# with json.dumps. The list routes are the only responses large enough for
+# that to matter, so they pass their rows through render(), which validates
+# them once and encodes them straight to JSON bytes with the schema's
+# prebuilt serializer. FastAPI passes the finished Response through
+# untouched; the headers set on the injected Response (the ETag) are copied
+# onto it. Every other response goes through orjson.
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "false").lower() in ("1", "true", "yes", "on")
+
+def render(schema, rows, response: Response):
+    """Return `rows` for FastAPI to encode as `schema`, or in fast JSON mode
+    the finished JSON response."""
+    if not FAST_JSON_ENABLED:
+        return rows
+    adapter = serializer(schema)
+    rendered = Response(adapter.dump_json(adapter.validate_python(rows, from_attributes=True)), media_type="application/json")
+    rendered.raw_headers.extend(response.raw_headers)
+    return rendered
@@ -1,17 +1,23 @@
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 from datetime import date
 
 from .database import engine, Base
+from .fast_json import FAST_JSON_ENABLED
 from .routers import expenses
 from .models import Expense
+from .rollup import ensure_rollup
+from .versions import bump_version
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from .database import SessionLocal
 
 # Create the FastAPI app
-app = FastAPI(title="Expense Tracker API")
+app = FastAPI(title="Expense Tracker API",
+              default_response_class=ORJSONResponse if FAST_JSON_ENABLED else JSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -22,8 +28,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Arbitrary key for the PostgreSQL advisory lock taken around schema creation
+SCHEMA_LOCK_KEY = 7240532
+
 # Create database tables
-Base.metadata.create_all(bind=engine)
+with engine.begin() as connection:
+    if connection.dialect.name == "postgresql":
+        # Several workers starting together would otherwise race to create the same tables
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+    Base.metadata.create_all(bind=connection)
+    
+    # Add indexes declared on the models to tables created before they existed
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
 
 # Add sample data if database is empty
 def add_sample_data():
@@ -63,6 +81,7 @@ def add_sample_data():
                 ),
             ]
             db.add_all(sample_expenses)
+            bump_version(db)
             db.commit()
     except Exception as e:
         print(f"Error adding sample data: {e}")
@@ -72,6 +91,11 @@ def add_sample_data():
 @app.on_event("startup")
 def startup_event():
     add_sample_data()
+    db = SessionLocal()
+    try:
+        ensure_rollup(db)
+    finally:
+        db.close()
 
 # Create API router
 api_router = APIRouter(prefix="/api")
@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, Date
+from sqlalchemy import Column, Integer, String, Float, Date, Index
 from .database import Base
 from datetime import date
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        # Date range filters (list, export)
+        Index("ix_expenses_date", "date"),
+        # Category filter with optional date range
+        Index("ix_expenses_category_date", "category", "date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Float, nullable=False)
@@ -18,4 +24,20 @@ class Expense(Base):
             "category": self.category,
             "description": self.description,
             "date": str(self.date) if self.date else None
-        } 
\ No newline at end of file
+        } 
+
+class ExpenseDailyRollup(Base):
+    """Per-day, per-category totals kept in step with the expenses table."""
+    __tablename__ = "expense_daily_rollup"
+    
+    date = Column(Date, primary_key=True)
+    category = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+class DataVersion(Base):
+    """Write version of the expense data behind the ETags (app/versions.py)."""
+    __tablename__ = "data_version"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
@@ -0,0 +1,81 @@
+from datetime import date
+from typing import Optional
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import Expense, ExpenseDailyRollup
+
+# expense_daily_rollup holds one row per (date, category) with the sum and
+# count of the matching expenses. Every write to expenses adjusts the rollup
+# in the same transaction, so range totals read a few rows per day instead of
+# every expense in the range.
+
+def _category_key(category):
+    return getattr(category, "value", category)
+
+def _rollup_upsert(db: Session):
+    upsert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    statement = upsert(ExpenseDailyRollup)
+    return statement.on_conflict_do_update(
+        index_elements=[ExpenseDailyRollup.date, ExpenseDailyRollup.category],
+        set_={
+            "total": ExpenseDailyRollup.total + statement.excluded.total,
+            "count": ExpenseDailyRollup.count + statement.excluded.count,
+        }
+    )
+
+def add_to_rollup(db: Session, day: date, category, amount: float, count: int = 1):
+    """Add `amount`/`count` (negative to subtract) to one rollup row. Does not commit."""
+    db.execute(_rollup_upsert(db).values(
+        date=day, category=_category_key(category), total=amount, count=count
+    ))
+    if count < 0:
+        db.execute(delete(ExpenseDailyRollup).where(
+            ExpenseDailyRollup.date == day,
+            ExpenseDailyRollup.category == _category_key(category),
+            ExpenseDailyRollup.count <= 0
+        ))
+
+def add_many_to_rollup(db: Session, expenses):
+    """Add new expenses (dicts with date, category, amount) to the rollup.
+
+    The expenses are summed per (date, category) first and the rollup rows are
+    upserted with one executemany. Does not commit.
+    """
+    totals = {}
+    for expense in expenses:
+        key = (expense["date"], _category_key(expense["category"]))
+        total, count = totals.get(key, (0, 0))
+        totals[key] = (total + expense["amount"], count + 1)
+    if totals:
+        db.execute(_rollup_upsert(db), [
+            {"date": day, "category": category, "total": total, "count": count}
+            for (day, category), (total, count) in totals.items()
+        ])
+
+def rebuild_rollup(db: Session):
+    """Recompute the whole rollup from expenses with one GROUP BY. Does not commit."""
+    db.execute(delete(ExpenseDailyRollup))
+    db.execute(insert(ExpenseDailyRollup).from_select(
+        ["date", "category", "total", "count"],
+        select(Expense.date, Expense.category, func.sum(Expense.amount), func.count(Expense.id))
+        .group_by(Expense.date, Expense.category)
+    ))
+
+def ensure_rollup(db: Session):
+    """Build the rollup for databases that have expenses but no rollup rows yet."""
+    has_rollup = db.query(ExpenseDailyRollup.date).first() is not None
+    if not has_rollup and db.query(Expense.id).first() is not None:
+        rebuild_rollup(db)
+        db.commit()
+
+def totals_by_category(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """Return {category: total} for a date range, read from the rollup."""
+    query = db.query(ExpenseDailyRollup.category, func.sum(ExpenseDailyRollup.total))
+    if start_date:
+        query = query.filter(ExpenseDailyRollup.date >= start_date)
+    if end_date:
+        query = query.filter(ExpenseDailyRollup.date <= end_date)
+    return dict(query.group_by(ExpenseDailyRollup.category).all())
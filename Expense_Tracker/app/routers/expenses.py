@@ -1,19 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date
-from sqlalchemy import func
+from sqlalchemy import func, insert, select
+import csv
+import io
+import json
 
-from ..database import get_db
+from ..database import get_db, SessionLocal
+from ..fast_json import render
 from ..models import Expense as ExpenseModel
+from ..rollup import add_to_rollup, add_many_to_rollup, totals_by_category
 from ..schemas import Expense, ExpenseCreate, ExpenseUpdate, TotalExpense
+from ..versions import bump_version, conditional_get
 
 router = APIRouter(
     tags=["expenses"]
 )
 
-@router.get("/", response_model=List[Expense])
+MAX_BULK_EXPENSES = 10000
+
+@router.get("/", response_model=List[Expense], dependencies=[Depends(conditional_get())])
 def get_expenses(
+    response: Response,
     db: Session = Depends(get_db),
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
@@ -25,7 +35,56 @@ def get_expenses(
     if end_date:
         query = query.filter(ExpenseModel.date <= end_date)
         
-    return query.all()
+    return render(List[Expense], query.all(), response)
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = ["id", "date", "category", "amount", "description"]
+
+def _export_rows(start_date: Optional[date], end_date: Optional[date]):
+    # The export opens its own session because the body is streamed after
+    # the request's dependencies have finished
+    db = SessionLocal()
+    try:
+        query = select(*(getattr(ExpenseModel, field) for field in EXPORT_FIELDS))
+        if start_date:
+            query = query.where(ExpenseModel.date >= start_date)
+        if end_date:
+            query = query.where(ExpenseModel.date <= end_date)
+        result = db.execute(query.order_by(ExpenseModel.id).execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for partition in result.mappings().partitions():
+            yield [{**row, "date": str(row["date"]) if row["date"] else None} for row in partition]
+    finally:
+        db.close()
+
+def _stream_ndjson(start_date: Optional[date], end_date: Optional[date]):
+    for rows in _export_rows(start_date, end_date):
+        yield "".join(json.dumps(row) + "\n" for row in rows)
+
+def _stream_csv(start_date: Optional[date], end_date: Optional[date]):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for rows in _export_rows(start_date, end_date):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@router.get("/export")
+def export_expenses(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    if format == "csv":
+        return StreamingResponse(
+            _stream_csv(start_date, end_date),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=expenses.csv"}
+        )
+    return StreamingResponse(_stream_ndjson(start_date, end_date), media_type="application/x-ndjson")
 
 @router.post("/", response_model=Expense, status_code=201)
 def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db)):
@@ -36,20 +95,60 @@ def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db)):
         date=expense.date or date.today()
     )
     db.add(db_expense)
+    add_to_rollup(db, db_expense.date, db_expense.category, db_expense.amount)
+    bump_version(db)
     db.commit()
     db.refresh(db_expense)
     return db_expense
 
+@router.post("/bulk", response_model=List[Expense], status_code=201)
+def create_expenses_bulk(expenses: List[ExpenseCreate], db: Session = Depends(get_db)):
+    if len(expenses) > MAX_BULK_EXPENSES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_EXPENSES} expenses per request")
+    
+    today = date.today()
+    rows = [
+        {
+            "amount": expense.amount,
+            "category": expense.category.value,
+            "description": expense.description,
+            "date": expense.date or today
+        }
+        for expense in expenses
+    ]
+    
+    # One executemany for the expenses and one for the rollup, in one transaction
+    ids = []
+    if rows:
+        ids = db.execute(
+            insert(ExpenseModel).returning(ExpenseModel.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        add_many_to_rollup(db, rows)
+        bump_version(db)
+    db.commit()
+    
+    # Results are in request order, one created expense per item
+    return [{"id": expense_id, **row} for expense_id, row in zip(ids, rows)]
+
 @router.put("/{expense_id}", response_model=Expense)
 def update_expense(expense_id: int, expense: ExpenseUpdate, db: Session = Depends(get_db)):
     db_expense = db.query(ExpenseModel).filter(ExpenseModel.id == expense_id).first()
     if not db_expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
+    old_key = (db_expense.date, db_expense.category, db_expense.amount)
+    
     update_data = expense.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_expense, key, value)
     
+    # Move the expense between rollup rows if its date, category or amount changed
+    new_key = (db_expense.date, db_expense.category, db_expense.amount)
+    if new_key != old_key:
+        add_to_rollup(db, old_key[0], old_key[1], -old_key[2], count=-1)
+        add_to_rollup(db, new_key[0], new_key[1], new_key[2])
+    bump_version(db)
+    
     db.commit()
     db.refresh(db_expense)
     return db_expense
@@ -60,13 +159,16 @@ def delete_expense(expense_id: int, db: Session = Depends(get_db)):
     if not db_expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
+    add_to_rollup(db, db_expense.date, db_expense.category, -db_expense.amount, count=-1)
     db.delete(db_expense)
+    bump_version(db)
     db.commit()
     return None
 
 @router.get("/category/{category}", response_model=List[Expense])
 def get_expenses_by_category(
     category: str,
+    response: Response,
     db: Session = Depends(get_db),
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
@@ -78,29 +180,15 @@ def get_expenses_by_category(
     if end_date:
         query = query.filter(ExpenseModel.date <= end_date)
         
-    return query.all()
+    return render(List[Expense], query.all(), response)
 
-@router.get("/total", response_model=TotalExpense)
+@router.get("/total", response_model=TotalExpense, dependencies=[Depends(conditional_get())])
 def get_total_expenses(
     db: Session = Depends(get_db),
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
 ):
-    query = db.query(ExpenseModel)
-    
-    if start_date:
-        query = query.filter(ExpenseModel.date >= start_date)
-    if end_date:
-        query = query.filter(ExpenseModel.date <= end_date)
-    
-    expenses = query.all()
-    
-    total = sum(expense.amount for expense in expenses)
-    
-    by_category = {}
-    for expense in expenses:
-        if expense.category not in by_category:
-            by_category[expense.category] = 0
-        by_category[expense.category] += expense.amount
+    # One GROUP BY over the daily rollup instead of loading every expense
+    by_category = totals_by_category(db, start_date, end_date)
     
-    return {"total": total, "by_category": by_category} 
\ No newline at end of file
+    return {"total": sum(by_category.values()), "by_category": by_category} 
\ No newline at end of file
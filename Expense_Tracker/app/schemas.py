@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, TypeAdapter, validator
 from typing import Optional, List
-from datetime import date
+from functools import lru_cache
+import datetime
 import enum
 
 class CategoryEnum(str, enum.Enum):
@@ -23,20 +24,25 @@ class ExpenseBase(BaseModel):
         return v
 
 class ExpenseCreate(ExpenseBase):
-    date: Optional[date] = None
+    date: Optional[datetime.date] = None
 
 class ExpenseUpdate(ExpenseBase):
     amount: Optional[float] = Field(None, gt=0)
     category: Optional[CategoryEnum] = None
-    date: Optional[date] = None
+    date: Optional[datetime.date] = None
     
 class Expense(ExpenseBase):
     id: int
-    date: date
+    date: datetime.date
     
     class Config:
         from_attributes = True
 
 class TotalExpense(BaseModel):
     total: float
-    by_category: dict 
\ No newline at end of file
+    by_category: dict
+
+@lru_cache(maxsize=None)
+def serializer(schema) -> TypeAdapter:
+    """TypeAdapter for a response schema such as List[Expense], built once and shared."""
+    return TypeAdapter(schema) 
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+import secrets
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Response
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .database import get_db
+from .models import DataVersion
+
+# Version-based ETags for conditional GETs.
+#
+# data_version holds one number that every write to expenses bumps in its
+# own transaction, next to the rollup update (both the list and the totals
+# are views of the same expenses, so they share it). A GET route tagged with
+# Depends(conditional_get()) reads it with one primary-key lookup, sends it
+# as its ETag and answers a matching If-None-Match with 304 before the
+# handler runs. The version lives in the database, so every server process
+# sends the same tag.
+#
+# Bumping one row makes concurrent writers queue on its lock until they
+# commit; writes for the same day and category already do on their rollup
+# row. The first version is random, so a recreated database does not repeat
+# tags.
+ETAGS_ENABLED = os.getenv("ETAGS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+
+DATA_VERSION_ID = 1
+
+def bump_version(db: Session):
+    """Bump the data version in the session's transaction. Does not commit."""
+    upsert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    statement = upsert(DataVersion).values(id=DATA_VERSION_ID, version=secrets.randbelow(2**31))
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[DataVersion.id],
+        set_={"version": DataVersion.version + 1}
+    ))
+
+def _matches(etag: str, if_none_match: str):
+    # If-None-Match uses weak comparison, so W/"x" and "x" are the same tag
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in tags]
+
+def conditional_get():
+    """Dependency that tags the response with the data version and raises
+    304 Not Modified when the client already holds it."""
+    def check(response: Response, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+        if not ETAGS_ENABLED:
+            return
+        version = db.query(DataVersion.version).filter(DataVersion.id == DATA_VERSION_ID).scalar()
+        etag = f'W/"{version or 0}"'
+        # no-cache: browsers keep the body but revalidate it on every request
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if if_none_match and _matches(etag, if_none_match):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return check
@@ -0,0 +1,523 @@
+"""Benchmarks for the Expense Tracker backend.
+
+Each scenario runs against a throwaway SQLite database so it never touches
+expenses.db. Run a scenario with:
+
+    python benchmark.py total --rows 10000000
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import List
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, event, func, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeout
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, SQLITE_PRAGMAS, create_sqlite_engine, get_db
+from app import fast_json as fast_json_mode
+from app.models import Expense
+from app.rollup import rebuild_rollup
+from app.routers import expenses
+from app.schemas import CategoryEnum, Expense as ExpenseSchema, ExpenseCreate, TotalExpense, serializer
+
+CATEGORIES = [category.value for category in CategoryEnum]
+
+
+def make_session_factory(tuned=False):
+    """Create an empty database in a temporary file and return a sessionmaker.
+
+    With `tuned` the engine comes from the app's SQLite factory (WAL, pragmas,
+    pool); otherwise it is a bare engine with SQLite's defaults.
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="expense_tracker_bench_"), "bench.db")
+    if tuned:
+        engine = create_sqlite_engine(f"sqlite:///{path}", pragmas=SQLITE_PRAGMAS, pool="queue")
+    else:
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def add_expenses(SessionLocal, rows, years):
+    """Insert `rows` random expenses spread over the last `years` years."""
+    first_day = date.today() - timedelta(days=365 * years)
+    db = SessionLocal()
+    try:
+        chunk = 100000
+        for start in range(0, rows, chunk):
+            db.execute(insert(Expense), [
+                {"amount": round(random.uniform(1, 500), 2),
+                 "category": random.choice(CATEGORIES),
+                 "description": "bench",
+                 "date": first_day + timedelta(days=random.randrange(365 * years))}
+                for _ in range(start, min(start + chunk, rows))
+            ])
+        rebuild_rollup(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def python_sum_total(db, start_date, end_date):
+    """The original /total implementation: load every expense and sum in Python."""
+    query = db.query(Expense)
+    if start_date:
+        query = query.filter(Expense.date >= start_date)
+    if end_date:
+        query = query.filter(Expense.date <= end_date)
+    by_category = {}
+    for expense in query.all():
+        by_category[expense.category] = by_category.get(expense.category, 0) + expense.amount
+    return {"total": sum(by_category.values()), "by_category": by_category}
+
+
+def group_by_total(db, start_date, end_date):
+    """A single GROUP BY category over the expenses table."""
+    query = db.query(Expense.category, func.sum(Expense.amount))
+    if start_date:
+        query = query.filter(Expense.date >= start_date)
+    if end_date:
+        query = query.filter(Expense.date <= end_date)
+    by_category = dict(query.group_by(Expense.category).all())
+    return {"total": sum(by_category.values()), "by_category": by_category}
+
+
+def rollup_total(db, start_date, end_date):
+    """The /total endpoint as shipped, reading expense_daily_rollup."""
+    return expenses.get_total_expenses(db=db, start_date=start_date, end_date=end_date)
+
+
+def run_total(args):
+    """Time /total over several date ranges with each implementation."""
+    SessionLocal = make_session_factory()
+    start = time.perf_counter()
+    add_expenses(SessionLocal, args.rows, args.years)
+    print(f"seeded {args.rows} expenses over {args.years} years in {time.perf_counter() - start:.1f}s")
+
+    today = date.today()
+    ranges = {
+        "last 30 days": (today - timedelta(days=30), today),
+        "last year": (today - timedelta(days=365), today),
+        "all time": (None, None),
+    }
+    implementations = [("python sum", python_sum_total), ("group by", group_by_total), ("rollup", rollup_total)]
+    if args.skip_python_sum:
+        implementations = implementations[1:]
+    for label, (start_date, end_date) in ranges.items():
+        results = {}
+        for name, implementation in implementations:
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                result = implementation(db, start_date, end_date)
+                results[name] = (time.perf_counter() - start, result["total"])
+            finally:
+                db.close()
+        timings = " ".join(f"{name}={elapsed * 1000:.1f}ms" for name, (elapsed, _) in results.items())
+        print(f"{label:<13} {timings}")
+        totals = [total for _, total in results.values()]
+        assert all(math.isclose(total, totals[0], rel_tol=1e-6) for total in totals), "implementations disagree"
+
+
+def run_bulk(args):
+    """Compare POST /api/expenses/ one item at a time with POST /api/expenses/bulk."""
+    first_day = date.today() - timedelta(days=365)
+    items = [
+        ExpenseCreate(amount=round(random.uniform(1, 500), 2), category=random.choice(CATEGORIES),
+                      description="bench", date=first_day + timedelta(days=random.randrange(365)))
+        for _ in range(args.items)
+    ]
+    runs = [("single", None)] + [(f"bulk/{size}", size) for size in args.batch_sizes]
+    for label, batch_size in runs:
+        SessionLocal = make_session_factory()
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            if batch_size is None:
+                for item in items:
+                    expenses.create_expense(item, db=db)
+            else:
+                for offset in range(0, len(items), batch_size):
+                    expenses.create_expenses_bulk(items[offset:offset + batch_size], db=db)
+            elapsed = time.perf_counter() - start
+            total = expenses.get_total_expenses(db=db, start_date=None, end_date=None)["total"]
+        finally:
+            db.close()
+        print(f"{label:<11} items={len(items)} elapsed={elapsed:.2f}s throughput={len(items) / elapsed:.0f} expenses/s")
+        assert math.isclose(total, sum(item.amount for item in items), rel_tol=1e-9), "rollup drifted"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_mixed(args):
+    """Compare SQLite's defaults with the tuned engine under mixed reads and writes.
+
+    Readers list the last month and fetch totals while writers add expenses;
+    a --write-ratio share of requests are writes.
+    """
+    today = date.today()
+    month_ago = today - timedelta(days=30)
+    for tuned in (False, True):
+        SessionLocal = make_session_factory(tuned=tuned)
+        add_expenses(SessionLocal, rows=args.rows, years=1)
+        latencies = {"read": [], "write": []}
+        errors = []
+        timeouts = []
+        remaining = iter(range(args.requests))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                kind = "write" if random.random() < args.write_ratio else "read"
+                db = SessionLocal()
+                start = time.perf_counter()
+                try:
+                    if kind == "write":
+                        expenses.create_expense(ExpenseCreate(
+                            amount=round(random.uniform(1, 500), 2), category=random.choice(CATEGORIES),
+                            description="bench", date=today), db=db)
+                    else:
+                        expenses.get_expenses(Response(), db=db, start_date=month_ago, end_date=today)
+                        expenses.get_total_expenses(db=db, start_date=month_ago, end_date=today)
+                    latencies[kind].append(time.perf_counter() - start)
+                except PoolTimeout as e:
+                    # No free connection in time: the default pool is smaller than --threads
+                    timeouts.append(e)
+                except OperationalError as e:
+                    # SQLite's busy timeout ran out waiting for another writer
+                    (timeouts if "database is locked" in str(e) else errors).append(e)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    db.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(args.threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        label = "tuned" if tuned else "default"
+        done = sum(len(values) for values in latencies.values())
+        print(f"[{label}] requests={args.requests} threads={args.threads} elapsed={elapsed:.2f}s "
+              f"throughput={done / elapsed:.0f} req/s timeouts={len(timeouts)} errors={len(errors)}")
+        for kind, values in latencies.items():
+            if values:
+                print(f"[{label}] {kind:<5} p50={percentile(values, 50) * 1000:.2f}ms "
+                      f"p99={percentile(values, 99) * 1000:.2f}ms")
+        # Failed requests are left out of the latencies. Lock and pool
+        # timeouts are what SQLite's defaults are measured for here; the tuned
+        # engine must have none, and any other failure makes the numbers wrong
+        if tuned:
+            errors += timeouts
+        assert not errors, f"[{label}] {len(errors)} of {args.requests} requests failed, first: {errors[0]!r}"
+
+
+def explain_statements(engine, call):
+    """Run `call()` and return (sql, EXPLAIN QUERY PLAN details) for each SELECT it issued."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            plans.append((statement, [row[-1] for row in rows]))
+    return plans
+
+
+def run_plans(args):
+    """Fail if a filtered expense query falls back to a full table scan."""
+    SessionLocal = make_session_factory()
+    add_expenses(SessionLocal, rows=1000, years=1)
+    engine = SessionLocal.kw["bind"]
+    today = date.today()
+    month_ago = today - timedelta(days=30)
+
+    def with_session(handler, **handler_args):
+        def call():
+            db = SessionLocal()
+            try:
+                handler(db=db, **handler_args)
+            finally:
+                db.close()
+        return call
+
+    hot_queries = {
+        "GET /api/expenses/?start_date&end_date": with_session(
+            expenses.get_expenses, response=Response(), start_date=month_ago, end_date=today),
+        "GET /api/expenses/category/{category}": with_session(
+            expenses.get_expenses_by_category, category="food", response=Response(), start_date=None, end_date=None),
+        "GET /api/expenses/category/{category}?start_date": with_session(
+            expenses.get_expenses_by_category, category="food", response=Response(), start_date=month_ago, end_date=None),
+        "GET /api/expenses/total?start_date&end_date": with_session(
+            expenses.get_total_expenses, start_date=month_ago, end_date=today),
+    }
+    full_scans = []
+    for name, call in hot_queries.items():
+        print(name)
+        for statement, details in explain_statements(engine, call):
+            for detail in details:
+                # Scans of materialized subqueries are fine; scans of real tables are not
+                scan = (detail.startswith("SCAN ") and " USING " not in detail
+                        and detail.split()[1] in Base.metadata.tables)
+                print(f"    {'FULL SCAN ' if scan else ''}{detail}")
+                if scan:
+                    full_scans.append((name, detail, " ".join(statement.split())))
+    for name, detail, statement in full_scans:
+        print(f"{name}: {detail}\n    {statement}")
+    assert not full_scans, f"{len(full_scans)} full table scan(s) in hot queries"
+
+
+async def asgi_call(app, method, path, body=None, headers=None):
+    """Send one HTTP request straight to an ASGI app; return (status code, response headers)."""
+    path, _, query_string = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    request_headers = [(b"host", b"bench"), (b"content-type", b"application/json")]
+    request_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query_string.encode(), "root_path": "", "headers": request_headers,
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    sent = False
+    response = {}
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode(): value.decode() for name, value in message["headers"]}
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"]
+
+
+def build_app(SessionLocal, fast_json=False):
+    """Build an app serving the expenses router against the bench database.
+
+    FAST_JSON_ENABLED is read per request, so it applies to the app built last.
+    """
+    fast_json_mode.FAST_JSON_ENABLED = fast_json
+    app = FastAPI(default_response_class=ORJSONResponse if fast_json else JSONResponse)
+    app.include_router(expenses.router, prefix="/api/expenses")
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[get_db] = override_get_db
+    return app
+
+
+def run_etag(args):
+    """Check conditional GETs: a matching If-None-Match gets 304 after one
+    version lookup, and a write, from this or another process, changes the
+    ETag."""
+    SessionLocal = make_session_factory()
+    add_expenses(SessionLocal, args.rows, 1)
+    app = build_app(SessionLocal)
+
+    statements = []
+
+    def count(*_):
+        statements.append(1)
+
+    async def get(path, etag=None, expect=None):
+        statements.clear()
+        start = time.perf_counter()
+        status, headers = await asgi_call(app, "GET", path, headers={"If-None-Match": etag} if etag else None)
+        elapsed = time.perf_counter() - start
+        assert expect is None or status == expect, f"GET {path} gave {status}, expected {expect}"
+        return headers.get("etag"), len(statements), elapsed
+
+    async def check():
+        tags = {}
+        for path in ["/api/expenses/", "/api/expenses/total"]:
+            tags[path], queried, _ = await get(path, expect=200)
+            assert tags[path], f"GET {path} sent no ETag"
+            full = min([(await get(path, expect=200))[2] for _ in range(args.repeat)])
+            results = [await get(path, tags[path], expect=304) for _ in range(args.repeat)]
+            assert all(queried == 1 for _, queried, _ in results), f"304 for GET {path} ran more than the version lookup"
+            not_modified = min(elapsed for _, _, elapsed in results)
+            print(f"GET {path:<20} 200: {queried} statements {full * 1000:7.2f}ms   "
+                  f"304: 1 statement {not_modified * 1000:6.2f}ms")
+
+        expense = {"amount": 9.99, "category": "food", "description": "etag"}
+        status, _ = await asgi_call(app, "POST", "/api/expenses/", expense)
+        assert status == 201
+        for path in tags:
+            tags[path], _, _ = await get(path, tags[path], expect=200)
+        print("a write changes the ETags of both resources")
+
+        # The version lives in the database, so a write made by another
+        # server process changes the tags too
+        other_process = (
+            "from app.database import SessionLocal\n"
+            "from app.models import Expense\n"
+            "from app.versions import bump_version\n"
+            "db = SessionLocal()\n"
+            "db.query(Expense).filter(Expense.id == 1).update({Expense.description: 'elsewhere'})\n"
+            "bump_version(db)\n"
+            "db.commit()\n"
+        )
+        database_url = SessionLocal.kw["bind"].url.render_as_string(hide_password=False)
+        subprocess.run([sys.executable, "-c", other_process], check=True,
+                       env={**os.environ, "DATABASE_URL": database_url})
+        for path in tags:
+            await get(path, tags[path], expect=200)
+        print("writes from other processes change the ETags too")
+
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        asyncio.run(check())
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+
+
+def run_serialize(args):
+    """Time serializing each response schema: FastAPI's path (validate, dump
+    to Python, json.dumps), the same with orjson, and the schema's prebuilt
+    serializer encoding straight to JSON bytes.
+
+    Then time GET /api/expenses/ end to end with and without FAST_JSON_ENABLED.
+    """
+    SessionLocal = make_session_factory()
+    add_expenses(SessionLocal, args.items, 1)
+    db = SessionLocal()
+    try:
+        rows = db.query(Expense).order_by(Expense.id).all()
+    finally:
+        db.close()
+    by_category = {category: round(random.uniform(1, 5000), 2) for category in CATEGORIES}
+    schemas = {
+        "List[Expense]": (List[ExpenseSchema], rows),
+        "Expense": (ExpenseSchema, rows[0]),
+        "TotalExpense": (TotalExpense, {"total": sum(by_category.values()), "by_category": by_category}),
+    }
+
+    async def fastapi_path(field, content, response_class):
+        return response_class(await serialize_response(field=field, response_content=content)).body
+
+    def best(call):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            body = call()
+            times.append(time.perf_counter() - start)
+        return min(times), body
+
+    print(f"best of {args.repeat}, ms per response")
+    print(f"{'schema':<16}{'fastapi':>10}{'+orjson':>10}{'adapter':>10}{'speedup':>9}")
+    for name, (schema, content) in schemas.items():
+        field = create_response_field(name=f"Response_{name}", type_=schema)
+        adapter = serializer(schema)
+        loop = asyncio.new_event_loop()
+        try:
+            default, expected = best(lambda: loop.run_until_complete(fastapi_path(field, content, JSONResponse)))
+            orjson, body = best(lambda: loop.run_until_complete(fastapi_path(field, content, ORJSONResponse)))
+            assert json.loads(body) == json.loads(expected), f"{name}: orjson body differs"
+        finally:
+            loop.close()
+        fast, body = best(lambda: adapter.dump_json(adapter.validate_python(content, from_attributes=True)))
+        assert json.loads(body) == json.loads(expected), f"{name}: serializer body differs"
+        print(f"{name:<16}{default * 1000:>10.2f}{orjson * 1000:>10.2f}{fast * 1000:>10.2f}{default / fast:>8.1f}x")
+
+    async def end_to_end(app):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            status, _ = await asgi_call(app, "GET", "/api/expenses/")
+            times.append(time.perf_counter() - start)
+            assert status == 200
+        return min(times)
+
+    default = asyncio.run(end_to_end(build_app(SessionLocal)))
+    fast = asyncio.run(end_to_end(build_app(SessionLocal, fast_json=True)))
+    print(f"\nGET /api/expenses/ ({args.items} expenses): {default * 1000:.1f}ms default, "
+          f"{fast * 1000:.1f}ms with FAST_JSON_ENABLED ({default / fast:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    total = subparsers.add_parser("total", help="GET /api/expenses/total over a large table")
+    total.add_argument("--rows", type=int, default=10000000)
+    total.add_argument("--years", type=int, default=10)
+    total.add_argument("--skip-python-sum", action="store_true",
+                       help="skip the original load-everything implementation")
+    total.set_defaults(func=run_total)
+
+    bulk = subparsers.add_parser("bulk", help="single-item vs bulk expense ingestion throughput")
+    bulk.add_argument("--items", type=int, default=20000)
+    bulk.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    bulk.set_defaults(func=run_bulk)
+
+    mixed = subparsers.add_parser("mixed", help="SQLite defaults vs the tuned engine under mixed reads and writes")
+    mixed.add_argument("--rows", type=int, default=10000)
+    mixed.add_argument("--threads", type=int, default=16)
+    mixed.add_argument("--requests", type=int, default=2000)
+    mixed.add_argument("--write-ratio", type=float, default=0.2)
+    mixed.set_defaults(func=run_mixed)
+
+    plans = subparsers.add_parser("plans", help="EXPLAIN QUERY PLAN for hot queries; fails on full table scans")
+    plans.set_defaults(func=run_plans)
+
+    etag = subparsers.add_parser("etag", help="conditional GETs: 304 after one version lookup, new ETag after a write")
+    etag.add_argument("--rows", type=int, default=1000)
+    etag.add_argument("--repeat", type=int, default=20)
+    etag.set_defaults(func=run_etag)
+
+    serialize = subparsers.add_parser("serialize", help="response serialization per schema: FastAPI default vs orjson vs prebuilt serializers")
+    serialize.add_argument("--items", type=int, default=10000, help="expenses in the list response")
+    serialize.add_argument("--repeat", type=int, default=20)
+    serialize.set_defaults(func=run_serialize)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,18 @@ def test_create_expense():
     else:
         print("Error:", response.text)
 
+def test_bulk_create():
+    data = [
+        {"amount": 12.5, "category": "food", "description": "Bulk expense 1", "date": "2024-01-15"},
+        {"amount": 30.0, "category": "transport", "description": "Bulk expense 2"}
+    ]
+    response = requests.post(f"{BASE_URL}/api/expenses/bulk", json=data)
+    print("POST /api/expenses/bulk:", response.status_code)
+    if response.status_code == 201:
+        print(json.dumps(response.json(), indent=2))
+    else:
+        print("Error:", response.text)
+
 def test_get_total():
     response = requests.get(f"{BASE_URL}/api/expenses/total")
     print("GET /api/expenses/total:", response.status_code)
@@ -33,8 +45,30 @@ def test_get_total():
     else:
         print("Error:", response.text)
 
+def test_conditional_get():
+    response = requests.get(f"{BASE_URL}/api/expenses")
+    etag = response.headers.get("ETag")
+    print("GET /api/expenses ETag:", etag)
+    response = requests.get(f"{BASE_URL}/api/expenses", headers={"If-None-Match": etag})
+    print("GET /api/expenses with If-None-Match (expect 304):", response.status_code)
+    requests.post(f"{BASE_URL}/api/expenses", json={"amount": 5.0, "category": "other", "description": "ETag test"})
+    response = requests.get(f"{BASE_URL}/api/expenses", headers={"If-None-Match": etag})
+    print("GET /api/expenses after a write (expect 200):", response.status_code, response.headers.get("ETag"))
+
+def test_export():
+    response = requests.get(f"{BASE_URL}/api/expenses/export", params={"format": "csv"}, stream=True)
+    print("GET /api/expenses/export?format=csv:", response.status_code)
+    if response.status_code == 200:
+        for line in response.iter_lines(decode_unicode=True):
+            print(line)
+    else:
+        print("Error:", response.text)
+
 if __name__ == "__main__":
     print("Testing API endpoints...")
     test_get_expenses()
     test_create_expense()
-    test_get_total() 
\ No newline at end of file
+    test_bulk_create()
+    test_get_total()
+    test_conditional_get()
+    test_export() 
\ No newline at end of file
@@ -1,16 +1,30 @@
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-# Use SQLite for simplicity, can be changed to PostgreSQL or other DB
-SQLALCHEMY_DATABASE_URL = "sqlite:///./ticket_booking.db"
+from app import config
+from app.database.engines import async_url, create_database_engine, create_async_database_engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# SQLite by default; set DATABASE_URL to use PostgreSQL (see engines.py)
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+engine = create_database_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine needs aiosqlite (or asyncpg), so it is only created in
+# async mode. The sync engine stays for startup and the background threads
+# (group commit writer, seat counter flushes, hold sweeps, worker id leases).
+async_engine = None
+AsyncSessionLocal = None
+if config.ASYNC_DB_ENABLED:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    
+    ASYNC_SQLALCHEMY_DATABASE_URL = config.ASYNC_DATABASE_URL or async_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_database_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+    # Objects keep their loaded values after commit, so handlers return them
+    # without a refresh that would check out a connection again
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Dependency to get DB session
@@ -19,4 +33,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
+
+# Async dependency used by the routers in app/routers/aio
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,58 @@
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+from app import config
+from app.database.sqlite import create_sqlite_engine, create_async_sqlite_engine
+
+# Engine selection by URL. SQLite goes through the tuned SQLite factory;
+# server databases (PostgreSQL) get a QueuePool sized from app.config,
+# pre-ping so connections dropped by the server or a proxy are replaced
+# instead of failing a request, recycling of long-lived connections, and a
+# per-connection statement timeout so a runaway query cannot hold a pool
+# slot (and its locks) indefinitely.
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == "sqlite"
+
+def async_url(url):
+    """The async-driver form of a sync database URL."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {url.get_backend_name()}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+def _server_options(url, async_engine=False):
+    options = {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if make_url(url).get_backend_name() == "postgresql" and config.DB_STATEMENT_TIMEOUT_MS:
+        timeout = str(config.DB_STATEMENT_TIMEOUT_MS)
+        if async_engine:
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+def create_database_engine(url):
+    """Create the engine for `url` with the backend's pool and connection settings."""
+    if is_sqlite(url):
+        return create_sqlite_engine(url)
+    return create_engine(url, **_server_options(url))
+
+def create_async_database_engine(url):
+    """Async counterpart of create_database_engine."""
+    if is_sqlite(url):
+        return create_async_sqlite_engine(url)
+    from sqlalchemy.ext.asyncio import create_async_engine
+    
+    return create_async_engine(url, **_server_options(url, async_engine=True))
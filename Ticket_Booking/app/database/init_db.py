@@ -1,12 +1,44 @@
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from app.models.models import Base, Venue, Event, TicketType, Booking, BookingStatus
+from app.models.models import Base, Venue, Event, TicketType, Booking, BookingStatus, SeatHold, TableVersion, WorkerIdLease
 from app.database.database import engine, SessionLocal
+from app.database.search import create_search_index
+from app.utils.counters import reconcile_counters
 from datetime import datetime, timedelta
 import random
 
-# Create tables
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+# Arbitrary key for the PostgreSQL advisory lock taken around schema creation
+SCHEMA_LOCK_KEY = 7240531
+
+# Tables the server creates for itself on startup, for databases set up by
+# run.py before they existed
+SERVER_TABLES = [SeatHold.__table__, TableVersion.__table__, WorkerIdLease.__table__]
+
+def _lock_schema(connection):
+    if connection.dialect.name == "postgresql":
+        # Several workers starting together would otherwise race to
+        # create the same tables and enum types
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+# Create tables, with their indexes and the search index
+def create_tables(bind=engine):
+    with bind.begin() as connection:
+        _lock_schema(connection)
+        Base.metadata.create_all(bind=connection)
+        create_indexes(connection)
+        create_search_index(connection)
+
+# Create the server's own tables if they are missing
+def create_server_tables(bind=engine):
+    with bind.begin() as connection:
+        _lock_schema(connection)
+        Base.metadata.create_all(bind=connection, tables=SERVER_TABLES)
+
+# Add indexes declared on the models to tables created before they existed
+def create_indexes(bind=engine):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
 
 # Add sample data
 def add_sample_data():
@@ -36,19 +68,19 @@ def add_sample_data():
         db.add_all(events)
         db.commit()
         
-        # Add ticket types
+        # Add ticket types (quantity_available is net of the sample bookings below)
         ticket_types = [
             # For Rock Concert
             TicketType(name="VIP", price=150.00, quantity_available=100, event_id=1),
-            TicketType(name="Standard", price=75.00, quantity_available=1000, event_id=1),
+            TicketType(name="Standard", price=75.00, quantity_available=998, event_id=1),
             TicketType(name="Economy", price=40.00, quantity_available=3000, event_id=1),
             
             # For Classical Symphony
             TicketType(name="Premium", price=120.00, quantity_available=200, event_id=2),
-            TicketType(name="Regular", price=60.00, quantity_available=800, event_id=2),
+            TicketType(name="Regular", price=60.00, quantity_available=796, event_id=2),
             
             # For Comedy Night
-            TicketType(name="Front Row", price=80.00, quantity_available=50, event_id=3),
+            TicketType(name="Front Row", price=80.00, quantity_available=49, event_id=3),
             TicketType(name="General", price=40.00, quantity_available=250, event_id=3),
             
             # For Jazz Festival
@@ -96,6 +128,10 @@ def add_sample_data():
         ]
         db.add_all(bookings)
         db.commit()
+        
+        # Seed the stats counters from the rows above
+        reconcile_counters(db)
+        db.commit()
     finally:
         db.close()
 
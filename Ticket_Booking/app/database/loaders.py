@@ -0,0 +1,26 @@
+from sqlalchemy.orm import joinedload, selectinload, raiseload
+from app.models.models import Venue, Event, TicketType, Booking
+from app.schemas import schemas
+
+# Relationship loading profiles, one per response schema.
+#
+# Each profile eagerly loads exactly the relationships the schema serializes
+# (joinedload for many-to-one, selectinload for collections) and raises on any
+# other lazy load, so an endpoint issues a fixed number of SELECTs no matter
+# how many rows it returns.
+LOADER_PROFILES = {
+    schemas.Venue: (raiseload("*"),),
+    schemas.Event: (raiseload("*"),),
+    schemas.TicketType: (raiseload("*"),),
+    schemas.Booking: (raiseload("*"),),
+    schemas.EventWithVenue: (joinedload(Event.venue), raiseload("*")),
+    schemas.EventWithTickets: (selectinload(Event.ticket_types), raiseload("*")),
+    schemas.EventWithBookings: (selectinload(Event.bookings), raiseload("*")),
+    schemas.VenueWithEvents: (selectinload(Venue.events), raiseload("*")),
+    schemas.TicketTypeWithBookings: (selectinload(TicketType.bookings), raiseload("*")),
+    schemas.BookingWithDetails: (joinedload(Booking.event), joinedload(Booking.ticket_type), raiseload("*")),
+}
+
+def load_for(query, schema):
+    """Apply the loading profile for `schema` to an ORM query."""
+    return query.options(*LOADER_PROFILES[schema])
@@ -0,0 +1,47 @@
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+def _write_lock(model):
+    # SQLite has no row locks and ignores FOR UPDATE. A no-op UPDATE takes the
+    # database write lock first, so the rows cannot change until we commit.
+    return (
+        update(model)
+        .values(id=model.id)
+        .execution_options(synchronize_session=False)
+    )
+
+def _locks_rows(db):
+    return db.get_bind().dialect.name != "sqlite"
+
+def get_for_update(db: Session, model, row_id):
+    """Load one row by primary key, locked against other writers until the
+    transaction ends. Returns None if the row does not exist.
+
+    Use it for read-modify-write paths (e.g. cancelling a booking releases its
+    seats only if it was not cancelled already), so two concurrent requests
+    cannot both act on the same old state.
+    """
+    query = db.query(model).filter(model.id == row_id).populate_existing()
+    if _locks_rows(db):
+        return query.with_for_update().first()
+    db.execute(_write_lock(model).where(model.id == row_id))
+    return query.first()
+
+async def get_for_update_async(db: AsyncSession, model, row_id):
+    """get_for_update for an AsyncSession."""
+    statement = select(model).where(model.id == row_id).execution_options(populate_existing=True)
+    if _locks_rows(db):
+        return (await db.scalars(statement.with_for_update())).first()
+    await db.execute(_write_lock(model).where(model.id == row_id))
+    return (await db.scalars(statement)).first()
+
+def get_all_for_update(db: Session, model):
+    """Load every row of a small table in id order, all locked until the
+    transaction ends (the order keeps two such callers from deadlocking)."""
+    query = db.query(model).order_by(model.id).populate_existing()
+    if _locks_rows(db):
+        return query.with_for_update().all()
+    # As above: take the SQLite write lock before reading
+    db.execute(_write_lock(model))
+    return query.all()
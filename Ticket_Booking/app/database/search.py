@@ -0,0 +1,279 @@
+import logging
+import weakref
+from sqlalchemy import column, func, or_, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.database.loaders import load_for
+from app.models.models import Booking, Event, TicketType, Venue
+from app.schemas.schemas import BookingWithDetails
+
+logger = logging.getLogger(__name__)
+
+# Booking search.
+#
+# A booking matches a term that appears in its event, venue or ticket type
+# name, or in the booker's name or email. The two kinds of field are searched
+# differently, because only the second needs an index:
+#
+# - Event, venue and ticket type names live in small catalog tables, so the
+#   term is matched against those names (ILIKE) and the bookings are then
+#   found by event_id and ticket_type_id. Assuming bookings are spread evenly
+#   over the catalog, a term matching a share s of it matches about s * N of
+#   the N bookings: reading those through the foreign key indexes costs
+#   s * N rows, reading bookings in id order until the page is full costs
+#   (skip + limit) / s, and the cheaper of the two is used.
+#
+# - On SQLite, the booker's user_name and user_email are indexed in
+#   booking_search, an FTS5 table with one row per booking (its rowid is the
+#   booking id) that triggers on bookings keep in step with every write, bulk
+#   inserts and raw SQL included. The trigram tokenizer matches any substring
+#   of three or more characters regardless of case, so it finds what ILIKE
+#   '%term%' finds, but from the index instead of a scan of every booking.
+#   Keeping it up to date is the dearest part of inserting a booking (see
+#   `python benchmark.py search`), so it holds only the two fields no other
+#   index can serve.
+#
+# Ranking costs a bm25 evaluation per match, so only the first RANK_WINDOW
+# matches by id are ranked: bookings whose booker fields match come first,
+# best match first, then those matched only through a catalog name, in id
+# order. Any further matches follow them in id order. The order does not
+# depend on how many matches there are, so paging through a search with
+# skip/limit stays consistent while bookings are added.
+#
+# Terms shorter than three characters, and databases without the index,
+# search the booker fields with ILIKE and list matches in id order. On
+# PostgreSQL create_search_index adds pg_trgm GIN indexes, which serve those
+# ILIKE filters. Creating the pg_trgm extension needs a privileged role;
+# without it the indexes are skipped with a warning and the filters scan.
+
+# Booker fields indexed in booking_search: search field -> column
+BOOKER_FIELDS = {
+    "user_name": Booking.user_name,
+    "user_email": Booking.user_email,
+}
+
+# Catalog fields: search field -> (bookings column, the table it refers to,
+# query for the ids of that table whose name contains a term)
+CATALOG_FIELDS = {
+    "event": ("event_id", Event, lambda term: select(Event.id).where(Event.name.icontains(term, autoescape=True))),
+    "venue": ("event_id", Event, lambda term: select(Event.id).join(Venue, Event.venue_id == Venue.id)
+              .where(Venue.name.icontains(term, autoescape=True))),
+    "ticket_type": ("ticket_type_id", TicketType, lambda term: select(TicketType.id)
+                    .where(TicketType.name.icontains(term, autoescape=True))),
+}
+
+# Shortest term the trigram index can look up
+MIN_INDEXED_TERM_LENGTH = 3
+
+# Most matches a search can have and still be ranked
+RANK_WINDOW = 1000
+
+SEARCH_COLUMNS = ["user_name", "user_email"]
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS booking_search USING fts5(
+        user_name, user_email, tokenize = 'trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS booking_search_insert AFTER INSERT ON bookings BEGIN
+        INSERT INTO booking_search (rowid, user_name, user_email) VALUES (new.id, new.user_name, new.user_email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS booking_search_update AFTER UPDATE OF user_name, user_email ON bookings BEGIN
+        UPDATE booking_search SET user_name = new.user_name, user_email = new.user_email WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS booking_search_delete AFTER DELETE ON bookings BEGIN
+        DELETE FROM booking_search WHERE rowid = old.id;
+    END
+    """,
+]
+
+# Triggers of the first layout, which also copied the catalog names into
+# booking_search and rewrote them on every rename
+_FIRST_LAYOUT_TRIGGERS = [
+    "booking_search_insert", "booking_search_update", "booking_search_delete",
+    "booking_search_event", "booking_search_venue", "booking_search_ticket_type",
+]
+
+POSTGRESQL_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_bookings_user_name_trgm ON bookings USING gin (user_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_bookings_user_email_trgm ON bookings USING gin (user_email gin_trgm_ops)",
+]
+
+# Engine -> whether its database has the booking_search table
+_index_available = weakref.WeakKeyDictionary()
+
+def _sqlite_supports_trigram(connection):
+    # The trigram tokenizer arrived in SQLite 3.34
+    version = tuple(int(part) for part in connection.exec_driver_sql("SELECT sqlite_version()").scalar().split("."))
+    return version >= (3, 34) and bool(
+        connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar()
+    )
+
+def create_search_index(connection):
+    """Create the search index and its triggers, filling it from the existing
+    bookings the first time. Safe to run on every startup."""
+    if connection.dialect.name == "sqlite" and _sqlite_supports_trigram(connection):
+        columns = [row[1] for row in connection.exec_driver_sql("PRAGMA table_info(booking_search)")]
+        if columns and columns != SEARCH_COLUMNS:
+            # Built with the first layout: replace it
+            for trigger in _FIRST_LAYOUT_TRIGGERS:
+                connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+            connection.exec_driver_sql("DROP TABLE booking_search")
+            columns = []
+        for statement in SQLITE_SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+        if not columns:
+            rebuild_search_index(connection)
+    elif connection.dialect.name == "postgresql" and _create_trigram_extension(connection):
+        for statement in POSTGRESQL_SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+    _index_available.pop(connection.engine, None)
+
+def _create_trigram_extension(connection):
+    # Returns whether pg_trgm is available. Creating it needs a privileged
+    # role, so a failure only costs the indexes, not the startup.
+    if connection.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first():
+        return True
+    try:
+        with connection.begin_nested():
+            connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DBAPIError:
+        logger.warning(
+            "Could not create the pg_trgm extension, so booking search runs without its indexes; "
+            "run CREATE EXTENSION pg_trgm as a privileged role and restart", exc_info=True
+        )
+        return False
+    return True
+
+def rebuild_search_index(connection):
+    """Refill booking_search from the bookings table."""
+    connection.exec_driver_sql("DELETE FROM booking_search")
+    connection.exec_driver_sql(
+        "INSERT INTO booking_search (rowid, user_name, user_email) SELECT id, user_name, user_email FROM bookings"
+    )
+
+def has_search_index(db: Session):
+    engine = db.get_bind()
+    if engine not in _index_available:
+        _index_available[engine] = engine.dialect.name == "sqlite" and db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'booking_search'")
+        ).first() is not None
+    return _index_available[engine]
+
+def _match_expression(filters):
+    # Each term is quoted as an FTS5 string, so it is matched literally
+    return " OR ".join(
+        "{%s} : \"%s\"" % (" ".join(fields), term.replace('"', '""'))
+        for fields, term in filters
+    )
+
+def _catalog_conditions(db: Session, filters, rows):
+    # Booking conditions for the catalog rows whose names the terms appear in,
+    # planned for reading the first `rows` matches
+    matches = []
+    matched = {}
+    for fields, term in filters:
+        for field in fields:
+            if field in CATALOG_FIELDS:
+                booking_column, table, matching = CATALOG_FIELDS[field]
+                count = db.execute(select(func.count()).select_from(matching(term).subquery())).scalar()
+                if count:
+                    matches.append((booking_column, matching(term)))
+                    matched[table] = matched.get(table, 0) + count
+    share = sum(count / db.query(func.count(table.id)).scalar() for table, count in matched.items())
+    # Ids are handed out in order, so the largest is about the number of bookings
+    indexed = share * share * (db.query(func.max(Booking.id)).scalar() or 0) <= rows
+    conditions = []
+    for booking_column, ids in matches:
+        booking_column = getattr(Booking, booking_column)
+        # `column + 0` keeps SQLite off the foreign key index, so it reads
+        # bookings in id order and stops at the LIMIT
+        conditions.append((booking_column if indexed else booking_column + 0).in_(ids))
+    return conditions
+
+def _ids(db: Session, match, conditions, skip, limit, after=None):
+    # Ids of the bookings matching the index expression or any condition, in id order
+    if not conditions:
+        # The index alone: read its matches in rowid order, which stops at the LIMIT
+        return db.execute(
+            text(
+                "SELECT rowid FROM booking_search WHERE booking_search MATCH :match AND rowid > :after "
+                "ORDER BY rowid LIMIT :limit OFFSET :skip"
+            ),
+            {"match": match, "after": after or 0, "limit": limit, "skip": skip}
+        ).scalars().all()
+    if match is not None:
+        conditions = conditions + [Booking.id.in_(
+            text("SELECT rowid FROM booking_search WHERE booking_search MATCH :match")
+            .bindparams(match=match).columns(column("rowid"))
+        )]
+    query = select(Booking.id).where(or_(*conditions))
+    if after is not None:
+        query = query.where(Booking.id > after)
+    return db.execute(query.order_by(Booking.id).offset(skip).limit(limit)).scalars().all()
+
+def find_bookings(db: Session, filters, skip: int = 0, limit: int = 100):
+    """Return bookings matching any of `filters`: the first RANK_WINDOW
+    matches by id with the best booker matches first, then any others in id
+    order.
+
+    `filters` is a list of (search field names, text) pairs; a booking
+    matches a pair if the text appears in any of those fields. With no
+    filters every booking is returned, in id order.
+    """
+    query = load_for(db.query(Booking), BookingWithDetails)
+    if not filters:
+        return query.order_by(Booking.id).offset(skip).limit(limit).all()
+
+    booker_filters = [
+        ([field for field in fields if field in BOOKER_FIELDS], term) for fields, term in filters
+    ]
+    booker_filters = [(fields, term) for fields, term in booker_filters if fields]
+    indexed = booker_filters and has_search_index(db) and all(
+        len(term) >= MIN_INDEXED_TERM_LENGTH for _, term in booker_filters
+    )
+    # A ranked search reads at least the whole window
+    conditions = _catalog_conditions(db, filters, (max(skip, RANK_WINDOW) if indexed else skip) + limit)
+    if not indexed:
+        conditions += [
+            BOOKER_FIELDS[field].icontains(term, autoescape=True)
+            for fields, term in booker_filters for field in fields
+        ]
+        if not conditions:
+            return []
+        return query.filter(or_(*conditions)).order_by(Booking.id).offset(skip).limit(limit).all()
+
+    match = _match_expression(booker_filters)
+    window = _ids(db, match, conditions, 0, RANK_WINDOW)
+    ids = []
+    if skip < len(window):
+        # Ranking only needs the scores of the index matches inside the window
+        scores = dict(db.execute(
+            text(
+                "SELECT rowid, rank FROM booking_search WHERE booking_search MATCH :match "
+                "AND rowid BETWEEN :first AND :last"
+            ),
+            {"match": match, "first": window[0], "last": window[-1]}
+        ).all())
+        ranked = sorted(window, key=lambda booking_id: (booking_id not in scores, scores.get(booking_id, 0), booking_id))
+        ids = ranked[skip:skip + limit]
+    if len(window) == RANK_WINDOW and len(ids) < limit:
+        ids += _ids(db, match, conditions, max(skip - RANK_WINDOW, 0), limit - len(ids), after=window[-1])
+    bookings = {booking.id: booking for booking in query.filter(Booking.id.in_(ids))}
+    return [bookings[booking_id] for booking_id in ids if booking_id in bookings]
+
+if __name__ == "__main__":
+    # Rebuild job: python -m app.database.search
+    from app.database.database import engine
+    with engine.begin() as connection:
+        if connection.dialect.name != "sqlite" or not _sqlite_supports_trigram(connection):
+            raise SystemExit("Only SQLite databases have a search index to rebuild")
+        create_search_index(connection)
+        rebuild_search_index(connection)
+    print("Search index rebuilt")
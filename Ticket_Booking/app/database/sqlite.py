@@ -0,0 +1,72 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, StaticPool
+
+from app import config
+
+# Engine factory for SQLite.
+#
+# WAL lets readers keep going while a writer commits and makes commits cheaper
+# (with synchronous=NORMAL a commit only appends to the WAL; the database
+# stays consistent after a power loss but may lose the last transactions).
+# busy_timeout makes a writer wait for the lock instead of failing with
+# "database is locked". The pragmas are connection settings, so they are
+# applied from a connect event to every connection the pool opens.
+#
+# SQLite allows one writer at a time, so a large pool does not buy write
+# throughput; it keeps a connection (and its page cache and mmap) ready for
+# every worker thread so requests do not wait for a checkout.
+
+def _pragma_statements(pragmas):
+    return [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+
+def apply_pragmas(engine, pragmas=None):
+    """Run the tuning pragmas on every new connection of `engine` (sync or async)."""
+    statements = _pragma_statements(config.SQLITE_PRAGMAS if pragmas is None else pragmas)
+
+    @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+def pool_options(url, pool=None, async_engine=False):
+    """Pool arguments for create_engine / create_async_engine."""
+    if make_url(url).database in (None, "", ":memory:"):
+        # Every connection to :memory: is a new empty database
+        return {"poolclass": StaticPool}
+    if (pool or config.SQLITE_POOL) == "null":
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": AsyncAdaptedQueuePool if async_engine else QueuePool,
+        "pool_size": config.SQLITE_POOL_SIZE,
+        "max_overflow": config.SQLITE_MAX_OVERFLOW,
+        "pool_timeout": config.SQLITE_POOL_TIMEOUT,
+    }
+
+def create_sqlite_engine(url, pragmas=None, pool=None, **options):
+    """Create a SQLite engine with the configured pool and pragmas.
+
+    `pragmas` and `pool` override the settings from app.config, and pool
+    arguments in `options` (e.g. pool_size) override those of `pool`; tuning
+    is skipped entirely when SQLITE_TUNING_ENABLED is off.
+    """
+    options.setdefault("connect_args", {"check_same_thread": False})
+    if not config.SQLITE_TUNING_ENABLED and pragmas is None and pool is None:
+        return create_engine(url, **options)
+    engine = create_engine(url, **{**pool_options(url, pool=pool), **options})
+    apply_pragmas(engine, pragmas)
+    return engine
+
+def create_async_sqlite_engine(url, pragmas=None, pool=None, **options):
+    """Async (aiosqlite) counterpart of create_sqlite_engine."""
+    from sqlalchemy.ext.asyncio import create_async_engine  # needs aiosqlite
+    
+    if not config.SQLITE_TUNING_ENABLED and pragmas is None and pool is None:
+        return create_async_engine(url, **options)
+    engine = create_async_engine(url, **{**pool_options(url, pool=pool, async_engine=True), **options})
+    apply_pragmas(engine, pragmas)
+    return engine
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -24,6 +24,10 @@ class Venue(Base):
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Events at a venue (venue events, occupancy)
+        Index("ix_events_venue_id", "venue_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -38,6 +42,10 @@ class Event(Base):
 
 class TicketType(Base):
     __tablename__ = "ticket_types"
+    __table_args__ = (
+        # Ticket types of an event (availability, revenue)
+        Index("ix_ticket_types_event_id", "event_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)  # VIP, Standard, Economy
@@ -51,6 +59,12 @@ class TicketType(Base):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Seats booked per ticket type by status; covers SUM(quantity)
+        Index("ix_bookings_ticket_type_status", "ticket_type_id", "status", "quantity"),
+        # Bookings of an event by status (event bookings, revenue, occupancy)
+        Index("ix_bookings_event_status", "event_id", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_name = Column(String)
@@ -67,4 +81,54 @@ class Booking(Base):
     
     # Relationships
     event = relationship("Event", back_populates="bookings")
-    ticket_type = relationship("TicketType", back_populates="bookings") 
\ No newline at end of file
+    ticket_type = relationship("TicketType", back_populates="bookings")
+
+# Seats taken off sale for a short checkout window (app/utils/holds.py); a
+# hold becomes a booking when confirmed or is deleted once it expires
+class SeatHold(Base):
+    __tablename__ = "seat_holds"
+    __table_args__ = (
+        # Due holds, oldest first (sweeper)
+        Index("ix_seat_holds_expires_at", "expires_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_name = Column(String)
+    user_email = Column(String)
+    quantity = Column(Integer)
+    expires_at = Column(DateTime)
+    
+    # Foreign keys
+    event_id = Column(Integer, ForeignKey("events.id"))
+    ticket_type_id = Column(Integer, ForeignKey("ticket_types.id"))
+
+# Running totals behind /booking-system/stats, split over COUNTER_STRIPES rows
+# (ids 1..N) that are summed on read
+class SystemCounters(Base):
+    __tablename__ = "system_counters"
+    
+    id = Column(Integer, primary_key=True)
+    total_events = Column(Integer, default=0)
+    total_venues = Column(Integer, default=0)
+    total_bookings = Column(Integer, default=0)
+    total_revenue = Column(Float, default=0)  # confirmed bookings only
+    booked_tickets = Column(Integer, default=0)  # seats held by non-cancelled bookings
+    available_tickets = Column(Integer, default=0)
+
+# Confirmation code worker ids held by running server processes
+# (app/utils/confirmation_codes.py); a lease not renewed within
+# CONFIRMATION_WORKER_LEASE_TTL seconds is free to take over
+class WorkerIdLease(Base):
+    __tablename__ = "worker_id_leases"
+    
+    worker_id = Column(Integer, primary_key=True, autoincrement=False)
+    holder = Column(String, nullable=False)
+    renewed_at = Column(DateTime, nullable=False)
+
+# Write versions of the tables behind ETag-tagged routes (app/utils/versions.py),
+# bumped in the same transaction as the write
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+    
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
@@ -0,0 +1,250 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional
+
+from app.database.database import get_async_db
+from app.database.loaders import load_for
+from app.database.locking import get_for_update_async
+from app.database.search import find_bookings
+from app.models.models import Booking, Event, TicketType, BookingStatus
+from app.routers.bookings import MAX_BULK_BOOKINGS, export_bookings
+from app.schemas.schemas import Booking as BookingSchema
+from app.schemas.schemas import BookingCreate, BookingUpdate, BookingStatusUpdate, BookingWithDetails, BookingBulkResult
+from app.utils.booking_writer import booking_writer, create_bookings
+from app.utils.cache import occupancy_cache, ticket_type_cache
+from app.utils.confirmation_codes import is_valid, normalize, CODE_LENGTH
+from app.utils.counters import bump_counters_async
+from app.utils.helpers import generate_confirmation_code, calculate_total_price_async, invalidate_booking_caches_async
+from app.utils.inventory import reserve_tickets_async, release_tickets_async
+from app.utils.pagination import paginate_async
+from app.utils.waiting_room import waiting_room
+
+# Async versions of app/routers/bookings.py; the routes, responses and caches are the same.
+# The bulk insert and the search are multi-step sync functions shared with the
+# threadpool routes; they run on the request's AsyncSession through run_sync,
+# so their queries still go through the async driver.
+
+router = APIRouter()
+
+@router.post("/", response_model=BookingSchema, status_code=status.HTTP_201_CREATED)
+async def create_booking(
+    booking: BookingCreate,
+    db: AsyncSession = Depends(get_async_db),
+    x_queue_token: Optional[str] = Header(None, description="Admitted queue token, for events behind a waiting room")
+):
+    """Create a new booking."""
+    if booking_writer.running:
+        # Group commit: the writer thread validates and commits this booking
+        # in one transaction with the others queued alongside it
+        with waiting_room.admission(booking.event_id, x_queue_token):
+            try:
+                result = await booking_writer.book_async(booking)
+            except TimeoutError:
+                raise HTTPException(status_code=503, detail="Too many bookings queued; try again")
+            if "error" in result:
+                raise HTTPException(status_code=result["status_code"], detail=result["error"])
+        return result["booking"]
+    
+    # Check if event exists
+    venue_id = await db.scalar(select(Event.venue_id).where(Event.id == booking.event_id))
+    if venue_id is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    # Check if ticket type exists
+    ticket_type = (await db.execute(
+        select(TicketType.event_id, TicketType.price).where(TicketType.id == booking.ticket_type_id)
+    )).first()
+    if not ticket_type:
+        raise HTTPException(status_code=404, detail="Ticket type not found")
+    
+    # Check if ticket type belongs to the event
+    if ticket_type.event_id != booking.event_id:
+        raise HTTPException(status_code=400, detail="Ticket type does not belong to this event")
+    if booking.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    
+    # Events behind a waiting room only take bookings from admitted buyers;
+    # the queue token is used up once the booking is committed
+    with waiting_room.admission(booking.event_id, x_queue_token):
+        # Reserve the seats; the conditional UPDATE fails instead of overselling
+        if not await reserve_tickets_async(db, booking.ticket_type_id, booking.quantity):
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Not enough tickets available")
+        
+        # Create booking in the same transaction as the reservation
+        db_booking = Booking(
+            **booking.dict(),
+            total_price=ticket_type.price * booking.quantity,
+            confirmation_code=generate_confirmation_code(),
+            status=BookingStatus.PENDING
+        )
+        
+        db.add(db_booking)
+        await bump_counters_async(db, total_bookings=1)
+        await db.commit()
+    occupancy_cache.invalidate(venue_id)
+    ticket_type_cache.invalidate(booking.ticket_type_id)
+    return db_booking
+
+@router.post("/bulk", response_model=List[BookingBulkResult])
+async def create_bookings_bulk(bookings: List[BookingCreate], db: AsyncSession = Depends(get_async_db)):
+    """Create many bookings in one transaction; returns a result per item, in order."""
+    if len(bookings) > MAX_BULK_BOOKINGS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_BOOKINGS} bookings per request")
+    
+    # Bookings for events behind a waiting room need a queue token each
+    errors = {
+        index: (403, "Event is behind a waiting room; book it with a queue token")
+        for index, booking in enumerate(bookings) if waiting_room.is_open(booking.event_id)
+    }
+    return await db.run_sync(create_bookings, bookings, errors)
+
+@router.get("/", response_model=List[BookingWithDetails])
+async def get_bookings(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all bookings with event, venue, and ticket type details."""
+    bookings = await paginate_async(db, load_for(select(Booking), BookingWithDetails), Booking.id, response, skip, limit, after)
+    return bookings
+
+@router.get("/search", response_model=List[BookingWithDetails])
+async def search_bookings(
+    q: Optional[str] = Query(None, description="Text to find in event, venue and ticket type names and the booker's name or email"),
+    event: Optional[str] = Query(None, description="Event name to search for"),
+    venue: Optional[str] = Query(None, description="Venue name to search for"),
+    ticket_type: Optional[str] = Query(None, description="Ticket type to search for"),
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Search bookings by any text, event name, venue, and/or ticket type, best matches first."""
+    filters = [(("event", "venue", "ticket_type", "user_name", "user_email"), q)] if q else []
+    filters += [((field,), term) for field, term in (("event", event), ("venue", venue), ("ticket_type", ticket_type)) if term]
+    
+    # Bookings matching any of the given terms, from the search index where possible
+    bookings = await db.run_sync(find_bookings, filters, skip, limit)
+    return bookings
+
+# Streams from its own sync session on a worker thread, as in threadpool mode
+router.get("/export")(export_bookings)
+
+@router.get("/by-code/{code}", response_model=BookingWithDetails)
+async def get_booking_by_code(code: str, db: AsyncSession = Depends(get_async_db)):
+    """Get a booking by its confirmation code."""
+    code = normalize(code)
+    # A mistyped generated code fails its check character without a query
+    if len(code) == CODE_LENGTH and not is_valid(code):
+        raise HTTPException(status_code=404, detail="Booking not found")
+    booking = (await db.scalars(load_for(select(Booking), BookingWithDetails).where(Booking.confirmation_code == code))).first()
+    if booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return booking
+
+@router.get("/{booking_id}", response_model=BookingWithDetails)
+async def get_booking(booking_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get a specific booking by ID."""
+    booking = (await db.scalars(load_for(select(Booking), BookingWithDetails).where(Booking.id == booking_id))).first()
+    if booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return booking
+
+@router.put("/{booking_id}", response_model=BookingSchema)
+async def update_booking(booking_id: int, booking_update: BookingUpdate, db: AsyncSession = Depends(get_async_db)):
+    """Update booking details."""
+    # Lock the booking so concurrent changes cannot both act on its old status
+    db_booking = await get_for_update_async(db, Booking, booking_id)
+    if db_booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    if booking_update.quantity is not None and booking_update.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    
+    # Update quantity if provided and different
+    if booking_update.quantity is not None and booking_update.quantity != db_booking.quantity:
+        # Cancelled bookings hold no seats, so only live bookings touch inventory
+        if db_booking.status != BookingStatus.CANCELLED:
+            if booking_update.quantity > db_booking.quantity:
+                additional_tickets = booking_update.quantity - db_booking.quantity
+                if not await reserve_tickets_async(db, db_booking.ticket_type_id, additional_tickets):
+                    await db.rollback()
+                    raise HTTPException(status_code=400, detail="Not enough tickets available")
+            else:
+                # Return tickets to available pool
+                returned_tickets = db_booking.quantity - booking_update.quantity
+                await release_tickets_async(db, db_booking.ticket_type_id, returned_tickets)
+        
+        # Recalculate total price
+        old_price = db_booking.total_price
+        db_booking.total_price = await calculate_total_price_async(db, db_booking.ticket_type_id, booking_update.quantity)
+        if db_booking.status == BookingStatus.CONFIRMED:
+            await bump_counters_async(db, total_revenue=db_booking.total_price - old_price)
+    
+    # Update other fields
+    update_data = booking_update.dict(exclude_unset=True)
+    for key, value in update_data.items():
+        setattr(db_booking, key, value)
+    
+    await db.commit()
+    await invalidate_booking_caches_async(db, db_booking.event_id, db_booking.ticket_type_id)
+    return db_booking
+
+@router.patch("/{booking_id}/status", response_model=BookingSchema)
+async def update_booking_status(booking_id: int, status_update: BookingStatusUpdate, db: AsyncSession = Depends(get_async_db)):
+    """Update booking status (confirmed, cancelled, pending)."""
+    # Lock the booking so concurrent changes cannot both act on its old status
+    db_booking = await get_for_update_async(db, Booking, booking_id)
+    if db_booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    
+    old_status = db_booking.status
+    new_status = status_update.status
+    
+    # If cancelling a booking, return tickets to available pool
+    if old_status != BookingStatus.CANCELLED and new_status == BookingStatus.CANCELLED:
+        await release_tickets_async(db, db_booking.ticket_type_id, db_booking.quantity)
+    
+    # If un-cancelling a booking, check if tickets are still available
+    if old_status == BookingStatus.CANCELLED and new_status != BookingStatus.CANCELLED:
+        if not await reserve_tickets_async(db, db_booking.ticket_type_id, db_booking.quantity):
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Not enough tickets available")
+    
+    # Revenue only counts confirmed bookings
+    if old_status != new_status:
+        if old_status == BookingStatus.CONFIRMED:
+            await bump_counters_async(db, total_revenue=-db_booking.total_price)
+        if new_status == BookingStatus.CONFIRMED:
+            await bump_counters_async(db, total_revenue=db_booking.total_price)
+    
+    db_booking.status = new_status
+    await db.commit()
+    await invalidate_booking_caches_async(db, db_booking.event_id, db_booking.ticket_type_id)
+    return db_booking
+
+@router.delete("/{booking_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_booking(booking_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Cancel a booking."""
+    # Lock the booking so concurrent changes cannot both act on its old status
+    db_booking = await get_for_update_async(db, Booking, booking_id)
+    if db_booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    
+    # If booking is not already cancelled, return tickets to available pool
+    if db_booking.status != BookingStatus.CANCELLED:
+        await release_tickets_async(db, db_booking.ticket_type_id, db_booking.quantity)
+    
+    await bump_counters_async(
+        db,
+        total_bookings=-1,
+        total_revenue=-db_booking.total_price if db_booking.status == BookingStatus.CONFIRMED else 0
+    )
+    
+    event_id, ticket_type_id = db_booking.event_id, db_booking.ticket_type_id
+    await db.delete(db_booking)
+    await db.commit()
+    await invalidate_booking_caches_async(db, event_id, ticket_type_id)
+    return None
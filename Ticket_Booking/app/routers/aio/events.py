@@ -0,0 +1,134 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+
+from app.database.database import get_async_db
+from app.database.loaders import load_for
+from app.models.models import Event, Venue, Booking, TicketType, BookingStatus
+from app.routers.events import MAX_BULK_EVENT_IDS
+from app.schemas.schemas import Event as EventSchema
+from app.schemas.schemas import EventCreate, EventWithVenue, Booking as BookingSchema
+from app.utils.cache import cached_route, event_cache, event_list_cache, venue_events_cache
+from app.utils.counters import bump_counters_async
+from app.utils.helpers import get_ticket_availability
+from app.utils.pagination import paginate_async
+from app.utils.versions import conditional_get_async
+
+# Async versions of app/routers/events.py; the routes, responses and caches are the same
+
+router = APIRouter()
+
+@router.post("/", response_model=EventSchema, status_code=status.HTTP_201_CREATED)
+async def create_event(event: EventCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create a new event."""
+    # Check if venue exists
+    if await db.scalar(select(Venue.id).where(Venue.id == event.venue_id)) is None:
+        raise HTTPException(status_code=404, detail="Venue not found")
+    
+    db_event = Event(**event.dict())
+    db.add(db_event)
+    await bump_counters_async(db, total_events=1)
+    await db.commit()
+    event_list_cache.clear()
+    venue_events_cache.invalidate(event.venue_id)
+    return db_event
+
+@router.get("/", response_model=List[EventWithVenue], dependencies=[Depends(conditional_get_async("events", "venues"))])
+@cached_route(event_list_cache, List[EventWithVenue], key=("skip", "limit", "after"))
+async def get_events(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all events with venue information."""
+    events = await paginate_async(db, load_for(select(Event), EventWithVenue), Event.id, response, skip, limit, after)
+    return events
+
+@router.get("/available-tickets", response_model=Dict[int, List[dict]])
+async def get_available_tickets_bulk(
+    ids: str = Query(..., description="Comma-separated event ids, e.g. 1,2,3"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get available tickets for several events in one request, keyed by event id."""
+    try:
+        event_ids = sorted({int(event_id) for event_id in ids.split(",") if event_id.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(event_ids) > MAX_BULK_EVENT_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_EVENT_IDS} event ids per request")
+    
+    # Events without ticket types are listed with no entries; unknown ids are left out
+    existing = (await db.scalars(select(Event.id).where(Event.id.in_(event_ids)))).all()
+    availability = await db.run_sync(get_ticket_availability, existing)
+    return {event_id: availability.get(event_id, []) for event_id in existing}
+
+@router.get("/{event_id}", response_model=EventWithVenue, dependencies=[Depends(conditional_get_async("events", "venues"))])
+@cached_route(event_cache, EventWithVenue, key="event_id")
+async def get_event(event_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get a specific event by ID."""
+    event = (await db.scalars(load_for(select(Event), EventWithVenue).where(Event.id == event_id))).first()
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return event
+
+@router.get("/{event_id}/bookings", response_model=List[BookingSchema])
+async def get_event_bookings(event_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get all bookings for a specific event."""
+    if await db.scalar(select(Event.id).where(Event.id == event_id)) is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    bookings = (await db.scalars(load_for(select(Booking), BookingSchema).where(Booking.event_id == event_id))).all()
+    return bookings
+
+@router.get("/{event_id}/available-tickets", response_model=List[dict])
+async def get_available_tickets(event_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get available tickets for an event."""
+    if await db.scalar(select(Event.id).where(Event.id == event_id)) is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    availability = await db.run_sync(get_ticket_availability, [event_id])
+    return availability.get(event_id, [])
+
+@router.get("/{event_id}/revenue", response_model=dict)
+async def get_event_revenue(event_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Calculate total revenue for a specific event."""
+    # Revenue and seats sold from confirmed bookings
+    confirmed = select(
+        Booking.event_id,
+        func.sum(Booking.total_price).label("total_revenue"),
+        func.sum(Booking.quantity).label("tickets_sold")
+    ).where(
+        Booking.event_id == event_id,
+        Booking.status == BookingStatus.CONFIRMED
+    ).group_by(Booking.event_id).subquery()
+    
+    # Seats still on sale
+    on_sale = select(
+        TicketType.event_id,
+        func.sum(TicketType.quantity_available).label("tickets_available")
+    ).where(TicketType.event_id == event_id).group_by(TicketType.event_id).subquery()
+    
+    row = (await db.execute(select(
+        Event.id,
+        Event.name,
+        func.coalesce(confirmed.c.total_revenue, 0).label("total_revenue"),
+        func.coalesce(confirmed.c.tickets_sold, 0).label("tickets_sold"),
+        func.coalesce(on_sale.c.tickets_available, 0).label("tickets_available")
+    ).outerjoin(
+        confirmed, confirmed.c.event_id == Event.id
+    ).outerjoin(
+        on_sale, on_sale.c.event_id == Event.id
+    ).where(Event.id == event_id))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    return {
+        "event_id": row.id,
+        "event_name": row.name,
+        "total_revenue": row.total_revenue,
+        "tickets_sold": row.tickets_sold,
+        "tickets_available": row.tickets_available
+    }
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.database import get_async_db
+from app.routers.stats import get_cache_stats, reconcile_booking_stats
+from app.utils.counters import read_counters_async
+from app.utils.versions import conditional_get_async
+
+# Async versions of app/routers/stats.py; the routes and responses are the same
+
+router = APIRouter()
+
+async def _counters_version(db: AsyncSession):
+    # Every booking bumps the counters, so they are their own version
+    return ".".join(str(value) for value in await read_counters_async(db))
+
+@router.get("/stats", response_model=dict, dependencies=[Depends(conditional_get_async(version=_counters_version))])
+async def get_booking_stats(db: AsyncSession = Depends(get_async_db)):
+    """Get booking statistics (total bookings, events, venues, available tickets)."""
+    # Read the running totals kept up to date by every write path
+    counters = await read_counters_async(db)
+    
+    return {
+        "total_events": counters.total_events,
+        "total_venues": counters.total_venues,
+        "total_bookings": counters.total_bookings,
+        "total_revenue": float(counters.total_revenue),
+        "available_tickets": counters.available_tickets
+    }
+
+# Reads no database
+router.get("/stats/cache", response_model=dict)(get_cache_stats)
+
+# Stays a sync handler on a threadpool session: with the availability cache
+# on, the reconcile holds the cache's locks while it counts, which on the
+# event loop would stall every booking's reserve behind it
+router.post("/stats/reconcile", response_model=dict)(reconcile_booking_stats)
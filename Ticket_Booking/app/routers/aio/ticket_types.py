@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional
+
+from app.database.database import get_async_db
+from app.database.loaders import load_for
+from app.models.models import TicketType, Event, Booking
+from app.schemas.schemas import TicketType as TicketTypeSchema
+from app.schemas.schemas import TicketTypeCreate, Booking as BookingSchema
+from app.utils.cache import cached_route, ticket_type_cache
+from app.utils.counters import bump_counters_async
+from app.utils.pagination import paginate_async
+
+# Async versions of app/routers/ticket_types.py; the routes, responses and caches are the same
+
+router = APIRouter()
+
+@router.post("/", response_model=TicketTypeSchema, status_code=status.HTTP_201_CREATED)
+async def create_ticket_type(ticket_type: TicketTypeCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create a new ticket type."""
+    # Check if event exists
+    if await db.scalar(select(Event.id).where(Event.id == ticket_type.event_id)) is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    db_ticket_type = TicketType(**ticket_type.dict())
+    db.add(db_ticket_type)
+    await bump_counters_async(db, available_tickets=db_ticket_type.quantity_available)
+    await db.commit()
+    return db_ticket_type
+
+@router.get("/", response_model=List[TicketTypeSchema])
+async def get_ticket_types(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all ticket types."""
+    ticket_types = await paginate_async(db, load_for(select(TicketType), TicketTypeSchema), TicketType.id, response, skip, limit, after)
+    return ticket_types
+
+@router.get("/{type_id}", response_model=TicketTypeSchema)
+@cached_route(ticket_type_cache, TicketTypeSchema, key="type_id")
+async def get_ticket_type(type_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get a specific ticket type by ID."""
+    ticket_type = (await db.scalars(load_for(select(TicketType), TicketTypeSchema).where(TicketType.id == type_id))).first()
+    if ticket_type is None:
+        raise HTTPException(status_code=404, detail="Ticket type not found")
+    return ticket_type
+
+@router.get("/{type_id}/bookings", response_model=List[BookingSchema])
+async def get_ticket_type_bookings(type_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get all bookings for a specific ticket type."""
+    if await db.scalar(select(TicketType.id).where(TicketType.id == type_id)) is None:
+        raise HTTPException(status_code=404, detail="Ticket type not found")
+    
+    bookings = (await db.scalars(load_for(select(Booking), BookingSchema).where(Booking.ticket_type_id == type_id))).all()
+    return bookings
@@ -0,0 +1,91 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select
+from typing import List, Optional
+
+from app.database.database import get_async_db
+from app.database.loaders import load_for
+from app.models.models import Venue, Event, Booking, BookingStatus
+from app.schemas.schemas import Venue as VenueSchema
+from app.schemas.schemas import VenueCreate, Event as EventSchema
+from app.utils.cache import cached_route, occupancy_cache, venue_cache, venue_events_cache
+from app.utils.counters import bump_counters_async
+from app.utils.pagination import paginate_async
+
+# Async versions of app/routers/venues.py; the routes, responses and caches are the same
+
+router = APIRouter()
+
+@router.post("/", response_model=VenueSchema, status_code=status.HTTP_201_CREATED)
+async def create_venue(venue: VenueCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create a new venue."""
+    db_venue = Venue(**venue.dict())
+    db.add(db_venue)
+    await bump_counters_async(db, total_venues=1)
+    await db.commit()
+    # A lookup of this id before it existed must not outlive the venue's creation
+    occupancy_cache.invalidate(db_venue.id)
+    return db_venue
+
+@router.get("/", response_model=List[VenueSchema])
+async def get_venues(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all venues."""
+    venues = await paginate_async(db, load_for(select(Venue), VenueSchema), Venue.id, response, skip, limit, after)
+    return venues
+
+@router.get("/{venue_id}", response_model=VenueSchema)
+@cached_route(venue_cache, VenueSchema, key="venue_id")
+async def get_venue(venue_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get a specific venue by ID."""
+    venue = (await db.scalars(load_for(select(Venue), VenueSchema).where(Venue.id == venue_id))).first()
+    if venue is None:
+        raise HTTPException(status_code=404, detail="Venue not found")
+    return venue
+
+@router.get("/{venue_id}/events", response_model=List[EventSchema])
+@cached_route(venue_events_cache, List[EventSchema], key="venue_id")
+async def get_venue_events(venue_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get all events at a specific venue."""
+    if await db.scalar(select(Venue.id).where(Venue.id == venue_id)) is None:
+        raise HTTPException(status_code=404, detail="Venue not found")
+    
+    events = (await db.scalars(load_for(select(Event), EventSchema).where(Event.venue_id == venue_id))).all()
+    return events
+
+@router.get("/{venue_id}/occupancy", response_model=dict)
+async def get_venue_occupancy(venue_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get venue occupancy statistics."""
+    return await occupancy_cache.get_or_set_async(venue_id, lambda: _compute_venue_occupancy(db, venue_id))
+
+async def _compute_venue_occupancy(db: AsyncSession, venue_id: int):
+    # Seats held by live bookings across every event at the venue, in one query
+    row = (await db.execute(select(
+        Venue.id,
+        Venue.name,
+        Venue.capacity,
+        func.coalesce(func.sum(Booking.quantity), 0).label("total_bookings")
+    ).outerjoin(
+        Event, Event.venue_id == Venue.id
+    ).outerjoin(
+        Booking, and_(Booking.event_id == Event.id, Booking.status != BookingStatus.CANCELLED)
+    ).where(Venue.id == venue_id).group_by(Venue.id))).first()
+    if row is None:
+        # Raised inside the cache lookup, so an unknown venue is never cached
+        raise HTTPException(status_code=404, detail="Venue not found")
+    
+    # Calculate occupancy rate
+    occupancy_rate = (row.total_bookings / row.capacity) * 100 if row.capacity > 0 else 0
+    
+    return {
+        "venue_id": row.id,
+        "venue_name": row.name,
+        "capacity": row.capacity,
+        "total_bookings": row.total_bookings,
+        "occupancy_rate": round(occupancy_rate, 2)
+    }
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.database.database import get_async_db
+from app.models.models import Event
+from app.routers.waiting_room import get_waiting_room, close_waiting_room, join_queue, get_queue_token
+from app.schemas.schemas import QueueToken, WaitingRoom, WaitingRoomSettings
+from app.utils.waiting_room import waiting_room
+
+# Async version of app/routers/waiting_room.py. Only opening a room reads
+# the database; the other routes are async already and are shared.
+
+router = APIRouter()
+
+@router.put("/events/{event_id}", response_model=WaitingRoom)
+async def open_waiting_room(event_id: int, settings: WaitingRoomSettings, db: AsyncSession = Depends(get_async_db)):
+    """Put an event's bookings behind a waiting room, or change its admission rate."""
+    if await db.scalar(select(Event.id).where(Event.id == event_id)) is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if settings.admit_per_second <= 0:
+        raise HTTPException(status_code=400, detail="admit_per_second must be positive")
+    if settings.burst is not None and settings.burst <= 0:
+        raise HTTPException(status_code=400, detail="burst must be positive")
+    waiting_room.open(event_id, settings.admit_per_second, settings.burst)
+    return waiting_room.room(event_id)
+
+router.get("/events/{event_id}", response_model=WaitingRoom)(get_waiting_room)
+router.delete("/events/{event_id}", status_code=status.HTTP_204_NO_CONTENT)(close_waiting_room)
+router.post("/events/{event_id}/tokens", response_model=QueueToken, status_code=status.HTTP_201_CREATED)(join_queue)
+router.get("/tokens/{token}", response_model=QueueToken)(get_queue_token)
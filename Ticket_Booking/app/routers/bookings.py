@@ -1,19 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from sqlalchemy import or_
+from typing import List, Literal, Optional
 
 from app.database.database import get_db
-from app.models.models import Booking, Event, Venue, TicketType, BookingStatus
+from app.database.loaders import load_for
+from app.database.locking import get_for_update
+from app.database.search import find_bookings
+from app.models.models import Booking, Event, TicketType, BookingStatus
 from app.schemas.schemas import Booking as BookingSchema
-from app.schemas.schemas import BookingCreate, BookingUpdate, BookingStatusUpdate, BookingWithDetails
-from app.utils.helpers import generate_confirmation_code, calculate_total_price, check_ticket_availability, update_ticket_availability
+from app.schemas.schemas import BookingCreate, BookingUpdate, BookingStatusUpdate, BookingWithDetails, BookingBulkResult
+from app.utils.booking_writer import booking_writer, create_bookings
+from app.utils.cache import occupancy_cache, ticket_type_cache
+from app.utils.confirmation_codes import is_valid, normalize, CODE_LENGTH
+from app.utils.counters import bump_counters
+from app.utils.export import stream_bookings_csv, stream_bookings_ndjson
+from app.utils.helpers import generate_confirmation_code, calculate_total_price, invalidate_booking_caches
+from app.utils.inventory import reserve_tickets, release_tickets
+from app.utils.pagination import paginate
+from app.utils.waiting_room import waiting_room
 
 router = APIRouter()
 
+MAX_BULK_BOOKINGS = 10000
+
 @router.post("/", response_model=BookingSchema, status_code=status.HTTP_201_CREATED)
-def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
+def create_booking(
+    booking: BookingCreate,
+    db: Session = Depends(get_db),
+    x_queue_token: Optional[str] = Header(None, description="Admitted queue token, for events behind a waiting room")
+):
     """Create a new booking."""
+    if booking_writer.running:
+        # Group commit: the writer thread validates and commits this booking
+        # in one transaction with the others queued alongside it
+        with waiting_room.admission(booking.event_id, x_queue_token):
+            try:
+                result = booking_writer.book(booking)
+            except TimeoutError:
+                raise HTTPException(status_code=503, detail="Too many bookings queued; try again")
+            if "error" in result:
+                raise HTTPException(status_code=result["status_code"], detail=result["error"])
+        return result["booking"]
+    
     # Check if event exists
     event = db.query(Event).filter(Event.id == booking.event_id).first()
     if not event:
@@ -27,71 +56,111 @@ def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
     # Check if ticket type belongs to the event
     if ticket_type.event_id != booking.event_id:
         raise HTTPException(status_code=400, detail="Ticket type does not belong to this event")
+    if booking.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
     
-    # Check ticket availability
-    if not check_ticket_availability(db, booking.ticket_type_id, booking.quantity):
-        raise HTTPException(status_code=400, detail="Not enough tickets available")
-    
-    # Calculate total price
-    total_price = calculate_total_price(db, booking.ticket_type_id, booking.quantity)
-    if total_price is None:
-        raise HTTPException(status_code=400, detail="Could not calculate total price")
-    
-    # Generate confirmation code
-    confirmation_code = generate_confirmation_code()
-    
-    # Create booking
-    db_booking = Booking(
-        **booking.dict(),
-        total_price=total_price,
-        confirmation_code=confirmation_code,
-        status=BookingStatus.PENDING
-    )
-    
-    db.add(db_booking)
-    db.commit()
+    # Events behind a waiting room only take bookings from admitted buyers;
+    # the queue token is used up once the booking is committed
+    with waiting_room.admission(booking.event_id, x_queue_token):
+        # Reserve the seats; the conditional UPDATE fails instead of overselling
+        if not reserve_tickets(db, booking.ticket_type_id, booking.quantity):
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Not enough tickets available")
+        
+        # Calculate total price
+        total_price = ticket_type.price * booking.quantity
+        
+        # Generate confirmation code
+        confirmation_code = generate_confirmation_code()
+        
+        # Create booking in the same transaction as the reservation
+        db_booking = Booking(
+            **booking.dict(),
+            total_price=total_price,
+            confirmation_code=confirmation_code,
+            status=BookingStatus.PENDING
+        )
+        
+        venue_id = event.venue_id
+        db.add(db_booking)
+        bump_counters(db, total_bookings=1)
+        db.commit()
+    occupancy_cache.invalidate(venue_id)
+    ticket_type_cache.invalidate(booking.ticket_type_id)
     db.refresh(db_booking)
     
-    # Update ticket availability
-    update_ticket_availability(db, booking.ticket_type_id, booking.quantity)
-    
     return db_booking
 
+@router.post("/bulk", response_model=List[BookingBulkResult])
+def create_bookings_bulk(bookings: List[BookingCreate], db: Session = Depends(get_db)):
+    """Create many bookings in one transaction; returns a result per item, in order."""
+    if len(bookings) > MAX_BULK_BOOKINGS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_BOOKINGS} bookings per request")
+    
+    # Bookings for events behind a waiting room need a queue token each
+    errors = {
+        index: (403, "Event is behind a waiting room; book it with a queue token")
+        for index, booking in enumerate(bookings) if waiting_room.is_open(booking.event_id)
+    }
+    return create_bookings(db, bookings, errors)
+
 @router.get("/", response_model=List[BookingWithDetails])
-def get_bookings(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_bookings(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_db)
+):
     """Get all bookings with event, venue, and ticket type details."""
-    bookings = db.query(Booking).offset(skip).limit(limit).all()
+    bookings = paginate(load_for(db.query(Booking), BookingWithDetails), Booking.id, response, skip, limit, after)
     return bookings
 
 @router.get("/search", response_model=List[BookingWithDetails])
 def search_bookings(
+    q: Optional[str] = Query(None, description="Text to find in event, venue and ticket type names and the booker's name or email"),
     event: Optional[str] = Query(None, description="Event name to search for"),
     venue: Optional[str] = Query(None, description="Venue name to search for"),
     ticket_type: Optional[str] = Query(None, description="Ticket type to search for"),
+    skip: int = 0,
+    limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    """Search bookings by event name, venue, and/or ticket type."""
-    query = db.query(Booking).join(Event).join(TicketType)
-    
-    filters = []
-    if event:
-        filters.append(Event.name.ilike(f"%{event}%"))
-    if venue:
-        query = query.join(Venue, Event.venue_id == Venue.id)
-        filters.append(Venue.name.ilike(f"%{venue}%"))
-    if ticket_type:
-        filters.append(TicketType.name.ilike(f"%{ticket_type}%"))
-    
-    if filters:
-        query = query.filter(or_(*filters))
-    
-    bookings = query.all()
+    """Search bookings by any text, event name, venue, and/or ticket type, best matches first."""
+    filters = [(("event", "venue", "ticket_type", "user_name", "user_email"), q)] if q else []
+    filters += [((field,), term) for field, term in (("event", event), ("venue", venue), ("ticket_type", ticket_type)) if term]
+    
+    # Bookings matching any of the given terms, from the search index where possible
+    bookings = find_bookings(db, filters, skip, limit)
     return bookings
 
+@router.get("/export")
+def export_bookings(format: Literal["ndjson", "csv"] = Query("ndjson", description="Export format")):
+    """Stream every booking with event and ticket type names as NDJSON or CSV."""
+    if format == "csv":
+        return StreamingResponse(
+            stream_bookings_csv(),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=bookings.csv"}
+        )
+    return StreamingResponse(stream_bookings_ndjson(), media_type="application/x-ndjson")
+
+@router.get("/by-code/{code}", response_model=BookingWithDetails)
+def get_booking_by_code(code: str, db: Session = Depends(get_db)):
+    """Get a booking by its confirmation code."""
+    code = normalize(code)
+    # A mistyped generated code fails its check character without a query
+    if len(code) == CODE_LENGTH and not is_valid(code):
+        raise HTTPException(status_code=404, detail="Booking not found")
+    booking = load_for(db.query(Booking), BookingWithDetails).filter(Booking.confirmation_code == code).first()
+    if booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return booking
+
 @router.get("/{booking_id}", response_model=BookingWithDetails)
 def get_booking(booking_id: int, db: Session = Depends(get_db)):
     """Get a specific booking by ID."""
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = load_for(db.query(Booking), BookingWithDetails).filter(Booking.id == booking_id).first()
     if booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
     return booking
@@ -99,27 +168,32 @@ def get_booking(booking_id: int, db: Session = Depends(get_db)):
 @router.put("/{booking_id}", response_model=BookingSchema)
 def update_booking(booking_id: int, booking_update: BookingUpdate, db: Session = Depends(get_db)):
     """Update booking details."""
-    db_booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    # Lock the booking so concurrent changes cannot both act on its old status
+    db_booking = get_for_update(db, Booking, booking_id)
     if db_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
+    if booking_update.quantity is not None and booking_update.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
     
     # Update quantity if provided and different
     if booking_update.quantity is not None and booking_update.quantity != db_booking.quantity:
-        # Check if new quantity is available
-        if booking_update.quantity > db_booking.quantity:
-            additional_tickets = booking_update.quantity - db_booking.quantity
-            if not check_ticket_availability(db, db_booking.ticket_type_id, additional_tickets):
-                raise HTTPException(status_code=400, detail="Not enough tickets available")
-            
-            # Update ticket availability
-            update_ticket_availability(db, db_booking.ticket_type_id, additional_tickets)
-        else:
-            # Return tickets to available pool
-            returned_tickets = db_booking.quantity - booking_update.quantity
-            update_ticket_availability(db, db_booking.ticket_type_id, returned_tickets, is_cancellation=True)
+        # Cancelled bookings hold no seats, so only live bookings touch inventory
+        if db_booking.status != BookingStatus.CANCELLED:
+            if booking_update.quantity > db_booking.quantity:
+                additional_tickets = booking_update.quantity - db_booking.quantity
+                if not reserve_tickets(db, db_booking.ticket_type_id, additional_tickets):
+                    db.rollback()
+                    raise HTTPException(status_code=400, detail="Not enough tickets available")
+            else:
+                # Return tickets to available pool
+                returned_tickets = db_booking.quantity - booking_update.quantity
+                release_tickets(db, db_booking.ticket_type_id, returned_tickets)
         
         # Recalculate total price
+        old_price = db_booking.total_price
         db_booking.total_price = calculate_total_price(db, db_booking.ticket_type_id, booking_update.quantity)
+        if db_booking.status == BookingStatus.CONFIRMED:
+            bump_counters(db, total_revenue=db_booking.total_price - old_price)
     
     # Update other fields
     update_data = booking_update.dict(exclude_unset=True)
@@ -127,13 +201,15 @@ def update_booking(booking_id: int, booking_update: BookingUpdate, db: Session =
         setattr(db_booking, key, value)
     
     db.commit()
+    invalidate_booking_caches(db, db_booking.event_id, db_booking.ticket_type_id)
     db.refresh(db_booking)
     return db_booking
 
 @router.patch("/{booking_id}/status", response_model=BookingSchema)
 def update_booking_status(booking_id: int, status_update: BookingStatusUpdate, db: Session = Depends(get_db)):
     """Update booking status (confirmed, cancelled, pending)."""
-    db_booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    # Lock the booking so concurrent changes cannot both act on its old status
+    db_booking = get_for_update(db, Booking, booking_id)
     if db_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -142,30 +218,47 @@ def update_booking_status(booking_id: int, status_update: BookingStatusUpdate, d
     
     # If cancelling a booking, return tickets to available pool
     if old_status != BookingStatus.CANCELLED and new_status == BookingStatus.CANCELLED:
-        update_ticket_availability(db, db_booking.ticket_type_id, db_booking.quantity, is_cancellation=True)
+        release_tickets(db, db_booking.ticket_type_id, db_booking.quantity)
     
     # If un-cancelling a booking, check if tickets are still available
     if old_status == BookingStatus.CANCELLED and new_status != BookingStatus.CANCELLED:
-        if not check_ticket_availability(db, db_booking.ticket_type_id, db_booking.quantity):
+        if not reserve_tickets(db, db_booking.ticket_type_id, db_booking.quantity):
+            db.rollback()
             raise HTTPException(status_code=400, detail="Not enough tickets available")
-        update_ticket_availability(db, db_booking.ticket_type_id, db_booking.quantity)
+    
+    # Revenue only counts confirmed bookings
+    if old_status != new_status:
+        if old_status == BookingStatus.CONFIRMED:
+            bump_counters(db, total_revenue=-db_booking.total_price)
+        if new_status == BookingStatus.CONFIRMED:
+            bump_counters(db, total_revenue=db_booking.total_price)
     
     db_booking.status = new_status
     db.commit()
+    invalidate_booking_caches(db, db_booking.event_id, db_booking.ticket_type_id)
     db.refresh(db_booking)
     return db_booking
 
 @router.delete("/{booking_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_booking(booking_id: int, db: Session = Depends(get_db)):
     """Cancel a booking."""
-    db_booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    # Lock the booking so concurrent changes cannot both act on its old status
+    db_booking = get_for_update(db, Booking, booking_id)
     if db_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     # If booking is not already cancelled, return tickets to available pool
     if db_booking.status != BookingStatus.CANCELLED:
-        update_ticket_availability(db, db_booking.ticket_type_id, db_booking.quantity, is_cancellation=True)
+        release_tickets(db, db_booking.ticket_type_id, db_booking.quantity)
+    
+    bump_counters(
+        db,
+        total_bookings=-1,
+        total_revenue=-db_booking.total_price if db_booking.status == BookingStatus.CONFIRMED else 0
+    )
     
+    event_id, ticket_type_id = db_booking.event_id, db_booking.ticket_type_id
     db.delete(db_booking)
     db.commit()
+    invalidate_booking_caches(db, event_id, ticket_type_id)
     return None 
\ No newline at end of file
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional
+from sqlalchemy import func
 
 from app.database.database import get_db
-from app.models.models import Event, Venue, Booking, TicketType
+from app.database.loaders import load_for
+from app.models.models import Event, Venue, Booking, TicketType, BookingStatus
 from app.schemas.schemas import Event as EventSchema
 from app.schemas.schemas import EventCreate, EventWithVenue, EventWithBookings, Booking as BookingSchema, TicketType as TicketTypeSchema
+from app.utils.cache import cached_route, event_cache, event_list_cache, venue_events_cache
+from app.utils.counters import bump_counters
+from app.utils.helpers import get_ticket_availability
+from app.utils.pagination import paginate
+from app.utils.versions import conditional_get
 
 router = APIRouter()
 
+MAX_BULK_EVENT_IDS = 100
+
 @router.post("/", response_model=EventSchema, status_code=status.HTTP_201_CREATED)
 def create_event(event: EventCreate, db: Session = Depends(get_db)):
     """Create a new event."""
@@ -19,20 +28,49 @@ def create_event(event: EventCreate, db: Session = Depends(get_db)):
     
     db_event = Event(**event.dict())
     db.add(db_event)
+    bump_counters(db, total_events=1)
     db.commit()
+    event_list_cache.clear()
+    venue_events_cache.invalidate(event.venue_id)
     db.refresh(db_event)
     return db_event
 
-@router.get("/", response_model=List[EventWithVenue])
-def get_events(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@router.get("/", response_model=List[EventWithVenue], dependencies=[Depends(conditional_get("events", "venues"))])
+@cached_route(event_list_cache, List[EventWithVenue], key=("skip", "limit", "after"))
+def get_events(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_db)
+):
     """Get all events with venue information."""
-    events = db.query(Event).offset(skip).limit(limit).all()
+    events = paginate(load_for(db.query(Event), EventWithVenue), Event.id, response, skip, limit, after)
     return events
 
-@router.get("/{event_id}", response_model=EventWithVenue)
+@router.get("/available-tickets", response_model=Dict[int, List[dict]])
+def get_available_tickets_bulk(
+    ids: str = Query(..., description="Comma-separated event ids, e.g. 1,2,3"),
+    db: Session = Depends(get_db)
+):
+    """Get available tickets for several events in one request, keyed by event id."""
+    try:
+        event_ids = sorted({int(event_id) for event_id in ids.split(",") if event_id.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(event_ids) > MAX_BULK_EVENT_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_EVENT_IDS} event ids per request")
+    
+    # Events without ticket types are listed with no entries; unknown ids are left out
+    existing = [row.id for row in db.query(Event.id).filter(Event.id.in_(event_ids))]
+    availability = get_ticket_availability(db, existing)
+    return {event_id: availability.get(event_id, []) for event_id in existing}
+
+@router.get("/{event_id}", response_model=EventWithVenue, dependencies=[Depends(conditional_get("events", "venues"))])
+@cached_route(event_cache, EventWithVenue, key="event_id")
 def get_event(event_id: int, db: Session = Depends(get_db)):
     """Get a specific event by ID."""
-    event = db.query(Event).filter(Event.id == event_id).first()
+    event = load_for(db.query(Event), EventWithVenue).filter(Event.id == event_id).first()
     if event is None:
         raise HTTPException(status_code=404, detail="Event not found")
     return event
@@ -44,63 +82,55 @@ def get_event_bookings(event_id: int, db: Session = Depends(get_db)):
     if event is None:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    bookings = db.query(Booking).filter(Booking.event_id == event_id).all()
+    bookings = load_for(db.query(Booking), BookingSchema).filter(Booking.event_id == event_id).all()
     return bookings
 
 @router.get("/{event_id}/available-tickets", response_model=List[dict])
 def get_available_tickets(event_id: int, db: Session = Depends(get_db)):
     """Get available tickets for an event."""
-    event = db.query(Event).filter(Event.id == event_id).first()
+    event = db.query(Event.id).filter(Event.id == event_id).first()
     if event is None:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    ticket_types = db.query(TicketType).filter(TicketType.event_id == event_id).all()
-    
-    result = []
-    for ticket_type in ticket_types:
-        # Calculate how many tickets are already booked
-        booked_tickets = db.query(Booking).filter(
-            Booking.ticket_type_id == ticket_type.id,
-            Booking.status != "cancelled"
-        ).with_entities(Booking.quantity).all()
-        
-        total_booked = sum(booking.quantity for booking in booked_tickets)
-        available = ticket_type.quantity_available - total_booked
-        
-        result.append({
-            "ticket_type_id": ticket_type.id,
-            "name": ticket_type.name,
-            "price": ticket_type.price,
-            "available": available,
-            "total": ticket_type.quantity_available
-        })
-    
-    return result
+    return get_ticket_availability(db, [event_id]).get(event_id, [])
 
 @router.get("/{event_id}/revenue", response_model=dict)
 def get_event_revenue(event_id: int, db: Session = Depends(get_db)):
     """Calculate total revenue for a specific event."""
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if event is None:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    # Get all confirmed bookings for this event
-    bookings = db.query(Booking).filter(
+    # Revenue and seats sold from confirmed bookings
+    confirmed = db.query(
+        Booking.event_id,
+        func.sum(Booking.total_price).label("total_revenue"),
+        func.sum(Booking.quantity).label("tickets_sold")
+    ).filter(
         Booking.event_id == event_id,
-        Booking.status == "confirmed"
-    ).all()
+        Booking.status == BookingStatus.CONFIRMED
+    ).group_by(Booking.event_id).subquery()
     
-    total_revenue = sum(booking.total_price for booking in bookings)
-    tickets_sold = sum(booking.quantity for booking in bookings)
+    # Seats still on sale
+    on_sale = db.query(
+        TicketType.event_id,
+        func.sum(TicketType.quantity_available).label("tickets_available")
+    ).filter(TicketType.event_id == event_id).group_by(TicketType.event_id).subquery()
     
-    # Calculate total available tickets
-    ticket_types = db.query(TicketType).filter(TicketType.event_id == event_id).all()
-    total_tickets = sum(tt.quantity_available for tt in ticket_types)
+    row = db.query(
+        Event.id,
+        Event.name,
+        func.coalesce(confirmed.c.total_revenue, 0).label("total_revenue"),
+        func.coalesce(confirmed.c.tickets_sold, 0).label("tickets_sold"),
+        func.coalesce(on_sale.c.tickets_available, 0).label("tickets_available")
+    ).outerjoin(
+        confirmed, confirmed.c.event_id == Event.id
+    ).outerjoin(
+        on_sale, on_sale.c.event_id == Event.id
+    ).filter(Event.id == event_id).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Event not found")
     
     return {
-        "event_id": event.id,
-        "event_name": event.name,
-        "total_revenue": total_revenue,
-        "tickets_sold": tickets_sold,
-        "tickets_available": total_tickets - tickets_sold
-    } 
\ No newline at end of file
+        "event_id": row.id,
+        "event_name": row.name,
+        "total_revenue": row.total_revenue,
+        "tickets_sold": row.tickets_sold,
+        "tickets_available": row.tickets_available
+    }
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+
+from app.database.database import get_db
+from app.models.models import Booking, SeatHold, TicketType, BookingStatus
+from app.schemas.schemas import Booking as BookingSchema
+from app.schemas.schemas import Hold as HoldSchema, HoldCreate
+from app.utils.cache import ticket_type_cache
+from app.utils.counters import bump_counters
+from app.utils.helpers import generate_confirmation_code, invalidate_booking_caches
+from app.utils.holds import hold_manager, place_hold, take_hold
+from app.utils.inventory import release_tickets
+from app.utils.waiting_room import waiting_room
+
+router = APIRouter()
+
+@router.post("/", response_model=HoldSchema, status_code=status.HTTP_201_CREATED)
+def create_hold(
+    hold: HoldCreate,
+    db: Session = Depends(get_db),
+    x_queue_token: Optional[str] = Header(None, description="Admitted queue token, for events behind a waiting room")
+):
+    """Hold seats for checkout; they go back on sale if the hold is not confirmed in time."""
+    # Check the ticket type exists and belongs to the event
+    ticket_type = db.query(TicketType.event_id).filter(TicketType.id == hold.ticket_type_id).first()
+    if not ticket_type:
+        raise HTTPException(status_code=404, detail="Ticket type not found")
+    if ticket_type.event_id != hold.event_id:
+        raise HTTPException(status_code=400, detail="Ticket type does not belong to this event")
+    if hold.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+
+    # Events behind a waiting room only take holds from admitted buyers
+    with waiting_room.admission(hold.event_id, x_queue_token):
+        db_hold = place_hold(db, hold)
+        if db_hold is None:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Not enough tickets available")
+        db.commit()
+    ticket_type_cache.invalidate(hold.ticket_type_id)
+    db.refresh(db_hold)
+    hold_manager.track(db_hold.id, db_hold.expires_at)
+    return db_hold
+
+@router.get("/{hold_id}", response_model=HoldSchema)
+def get_hold(hold_id: int, db: Session = Depends(get_db)):
+    """Get a hold that has not expired."""
+    hold = db.query(SeatHold).filter(SeatHold.id == hold_id).first()
+    if hold is None or hold.expires_at <= datetime.utcnow():
+        raise HTTPException(status_code=404, detail="Hold not found")
+    return hold
+
+@router.post("/{hold_id}/confirm", response_model=BookingSchema, status_code=status.HTTP_201_CREATED)
+def confirm_hold(hold_id: int, db: Session = Depends(get_db)):
+    """Turn a live hold into a confirmed booking for its seats."""
+    # Deleting the hold claims it, so it is confirmed at most once and never swept afterwards
+    hold = take_hold(db, hold_id)
+    if hold is None:
+        raise HTTPException(status_code=404, detail="Hold not found or expired")
+
+    # The seats are already off sale; they now count as booked
+    price = db.query(TicketType.price).filter(TicketType.id == hold.ticket_type_id).scalar()
+    if price is None:
+        # Keep the hold; the sweeper releases it when it expires
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Ticket type not found")
+    db_booking = Booking(
+        user_name=hold.user_name,
+        user_email=hold.user_email,
+        quantity=hold.quantity,
+        event_id=hold.event_id,
+        ticket_type_id=hold.ticket_type_id,
+        total_price=price * hold.quantity,
+        confirmation_code=generate_confirmation_code(),
+        status=BookingStatus.CONFIRMED
+    )
+    db.add(db_booking)
+    bump_counters(db, total_bookings=1, booked_tickets=hold.quantity, total_revenue=db_booking.total_price)
+    db.commit()
+    invalidate_booking_caches(db, hold.event_id, hold.ticket_type_id)
+    db.refresh(db_booking)
+    return db_booking
+
+@router.delete("/{hold_id}", status_code=status.HTTP_204_NO_CONTENT)
+def release_hold(hold_id: int, db: Session = Depends(get_db)):
+    """Give a hold's seats back before it expires."""
+    hold = take_hold(db, hold_id, live_only=False)
+    if hold is None:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    release_tickets(db, hold.ticket_type_id, hold.quantity, booked=False)
+    db.commit()
+    ticket_type_cache.invalidate(hold.ticket_type_id)
+    return None
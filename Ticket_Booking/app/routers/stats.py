@@ -1,45 +1,39 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from app.database.database import get_db
-from app.models.models import Event, Venue, Booking, TicketType
-from app.schemas.schemas import BookingSystemStats
+from app.utils.cache import cache_stats
+from app.utils.counters import read_counters, reconcile_counters
+from app.utils.versions import conditional_get
 
 router = APIRouter()
 
-@router.get("/stats", response_model=dict)
+def _counters_version(db: Session):
+    # Every booking bumps the counters, so they are their own version
+    return ".".join(str(value) for value in read_counters(db))
+
+@router.get("/stats", response_model=dict, dependencies=[Depends(conditional_get(version=_counters_version))])
 def get_booking_stats(db: Session = Depends(get_db)):
     """Get booking statistics (total bookings, events, venues, available tickets)."""
-    # Count total events
-    total_events = db.query(func.count(Event.id)).scalar()
-    
-    # Count total venues
-    total_venues = db.query(func.count(Venue.id)).scalar()
-    
-    # Count total bookings
-    total_bookings = db.query(func.count(Booking.id)).scalar()
-    
-    # Calculate total revenue from confirmed bookings
-    total_revenue = db.query(func.sum(Booking.total_price)).filter(
-        Booking.status == "confirmed"
-    ).scalar() or 0
-    
-    # Calculate available tickets
-    # First, get total tickets
-    total_tickets = db.query(func.sum(TicketType.quantity_available)).scalar() or 0
-    
-    # Then, get booked tickets (excluding cancelled)
-    booked_tickets = db.query(func.sum(Booking.quantity)).filter(
-        Booking.status != "cancelled"
-    ).scalar() or 0
-    
-    available_tickets = total_tickets - booked_tickets
+    # Read the running totals kept up to date by every write path
+    counters = read_counters(db)
     
     return {
-        "total_events": total_events,
-        "total_venues": total_venues,
-        "total_bookings": total_bookings,
-        "total_revenue": float(total_revenue),
-        "available_tickets": available_tickets
-    } 
\ No newline at end of file
+        "total_events": counters.total_events,
+        "total_venues": counters.total_venues,
+        "total_bookings": counters.total_bookings,
+        "total_revenue": float(counters.total_revenue),
+        "available_tickets": counters.available_tickets
+    }
+
+@router.get("/stats/cache", response_model=dict)
+def get_cache_stats():
+    """Get hit/miss counts of the response caches."""
+    return cache_stats()
+
+@router.post("/stats/reconcile", response_model=dict)
+def reconcile_booking_stats(db: Session = Depends(get_db)):
+    """Recompute the statistics counters from scratch and report any drift."""
+    drift = reconcile_counters(db)
+    db.commit()
+    return {"drift": drift}
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.database.database import get_db
+from app.database.loaders import load_for
 from app.models.models import TicketType, Event, Booking
 from app.schemas.schemas import TicketType as TicketTypeSchema
 from app.schemas.schemas import TicketTypeCreate, TicketTypeWithBookings, Booking as BookingSchema
+from app.utils.cache import cached_route, ticket_type_cache
+from app.utils.counters import bump_counters
+from app.utils.pagination import paginate
 
 router = APIRouter()
 
@@ -19,20 +23,28 @@ def create_ticket_type(ticket_type: TicketTypeCreate, db: Session = Depends(get_
     
     db_ticket_type = TicketType(**ticket_type.dict())
     db.add(db_ticket_type)
+    bump_counters(db, available_tickets=db_ticket_type.quantity_available)
     db.commit()
     db.refresh(db_ticket_type)
     return db_ticket_type
 
 @router.get("/", response_model=List[TicketTypeSchema])
-def get_ticket_types(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_ticket_types(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_db)
+):
     """Get all ticket types."""
-    ticket_types = db.query(TicketType).offset(skip).limit(limit).all()
+    ticket_types = paginate(load_for(db.query(TicketType), TicketTypeSchema), TicketType.id, response, skip, limit, after)
     return ticket_types
 
 @router.get("/{type_id}", response_model=TicketTypeSchema)
+@cached_route(ticket_type_cache, TicketTypeSchema, key="type_id")
 def get_ticket_type(type_id: int, db: Session = Depends(get_db)):
     """Get a specific ticket type by ID."""
-    ticket_type = db.query(TicketType).filter(TicketType.id == type_id).first()
+    ticket_type = load_for(db.query(TicketType), TicketTypeSchema).filter(TicketType.id == type_id).first()
     if ticket_type is None:
         raise HTTPException(status_code=404, detail="Ticket type not found")
     return ticket_type
@@ -44,5 +56,5 @@ def get_ticket_type_bookings(type_id: int, db: Session = Depends(get_db)):
     if ticket_type is None:
         raise HTTPException(status_code=404, detail="Ticket type not found")
     
-    bookings = db.query(Booking).filter(Booking.ticket_type_id == type_id).all()
+    bookings = load_for(db.query(Booking), BookingSchema).filter(Booking.ticket_type_id == type_id).all()
     return bookings 
\ No newline at end of file
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import and_, func
+from typing import List, Optional
 
 from app.database.database import get_db
-from app.models.models import Venue, Event
+from app.database.loaders import load_for
+from app.models.models import Venue, Event, Booking, BookingStatus
 from app.schemas.schemas import Venue as VenueSchema
 from app.schemas.schemas import VenueCreate, VenueWithEvents, Event as EventSchema
+from app.utils.cache import cached_route, occupancy_cache, venue_cache, venue_events_cache
+from app.utils.counters import bump_counters
+from app.utils.pagination import paginate
 
 router = APIRouter()
 
@@ -14,57 +19,73 @@ def create_venue(venue: VenueCreate, db: Session = Depends(get_db)):
     """Create a new venue."""
     db_venue = Venue(**venue.dict())
     db.add(db_venue)
+    bump_counters(db, total_venues=1)
     db.commit()
     db.refresh(db_venue)
+    # A lookup of this id before it existed must not outlive the venue's creation
+    occupancy_cache.invalidate(db_venue.id)
     return db_venue
 
 @router.get("/", response_model=List[VenueSchema])
-def get_venues(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_venues(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_db)
+):
     """Get all venues."""
-    venues = db.query(Venue).offset(skip).limit(limit).all()
+    venues = paginate(load_for(db.query(Venue), VenueSchema), Venue.id, response, skip, limit, after)
     return venues
 
 @router.get("/{venue_id}", response_model=VenueSchema)
+@cached_route(venue_cache, VenueSchema, key="venue_id")
 def get_venue(venue_id: int, db: Session = Depends(get_db)):
     """Get a specific venue by ID."""
-    venue = db.query(Venue).filter(Venue.id == venue_id).first()
+    venue = load_for(db.query(Venue), VenueSchema).filter(Venue.id == venue_id).first()
     if venue is None:
         raise HTTPException(status_code=404, detail="Venue not found")
     return venue
 
 @router.get("/{venue_id}/events", response_model=List[EventSchema])
+@cached_route(venue_events_cache, List[EventSchema], key="venue_id")
 def get_venue_events(venue_id: int, db: Session = Depends(get_db)):
     """Get all events at a specific venue."""
     venue = db.query(Venue).filter(Venue.id == venue_id).first()
     if venue is None:
         raise HTTPException(status_code=404, detail="Venue not found")
     
-    events = db.query(Event).filter(Event.venue_id == venue_id).all()
+    events = load_for(db.query(Event), EventSchema).filter(Event.venue_id == venue_id).all()
     return events
 
 @router.get("/{venue_id}/occupancy", response_model=dict)
 def get_venue_occupancy(venue_id: int, db: Session = Depends(get_db)):
     """Get venue occupancy statistics."""
-    venue = db.query(Venue).filter(Venue.id == venue_id).first()
-    if venue is None:
+    return occupancy_cache.get_or_set(venue_id, lambda: _compute_venue_occupancy(db, venue_id))
+
+def _compute_venue_occupancy(db: Session, venue_id: int):
+    # Seats held by live bookings across every event at the venue, in one query
+    row = db.query(
+        Venue.id,
+        Venue.name,
+        Venue.capacity,
+        func.coalesce(func.sum(Booking.quantity), 0).label("total_bookings")
+    ).outerjoin(
+        Event, Event.venue_id == Venue.id
+    ).outerjoin(
+        Booking, and_(Booking.event_id == Event.id, Booking.status != BookingStatus.CANCELLED)
+    ).filter(Venue.id == venue_id).group_by(Venue.id).first()
+    if row is None:
+        # Raised inside the cache lookup, so an unknown venue is never cached
         raise HTTPException(status_code=404, detail="Venue not found")
     
-    # Get all events at this venue
-    events = db.query(Event).filter(Event.venue_id == venue_id).all()
-    
-    # Calculate total bookings across all events
-    total_bookings = 0
-    for event in events:
-        event_bookings = sum(booking.quantity for booking in event.bookings if booking.status != "cancelled")
-        total_bookings += event_bookings
-    
     # Calculate occupancy rate
-    occupancy_rate = (total_bookings / venue.capacity) * 100 if venue.capacity > 0 else 0
+    occupancy_rate = (row.total_bookings / row.capacity) * 100 if row.capacity > 0 else 0
     
     return {
-        "venue_id": venue.id,
-        "venue_name": venue.name,
-        "capacity": venue.capacity,
-        "total_bookings": total_bookings,
+        "venue_id": row.id,
+        "venue_name": row.name,
+        "capacity": row.capacity,
+        "total_bookings": row.total_bookings,
         "occupancy_rate": round(occupancy_rate, 2)
-    } 
\ No newline at end of file
+    }
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.database.database import get_db
+from app.models.models import Event
+from app.schemas.schemas import QueueToken, WaitingRoom, WaitingRoomSettings
+from app.utils.waiting_room import waiting_room
+
+router = APIRouter()
+
+# Routes that only read the in-process waiting room are async, so buyers polling
+# their tokens are answered on the event loop rather than queueing for a
+# threadpool thread behind the booking writers
+
+@router.put("/events/{event_id}", response_model=WaitingRoom)
+def open_waiting_room(event_id: int, settings: WaitingRoomSettings, db: Session = Depends(get_db)):
+    """Put an event's bookings behind a waiting room, or change its admission rate."""
+    if db.query(Event.id).filter(Event.id == event_id).first() is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if settings.admit_per_second <= 0:
+        raise HTTPException(status_code=400, detail="admit_per_second must be positive")
+    if settings.burst is not None and settings.burst <= 0:
+        raise HTTPException(status_code=400, detail="burst must be positive")
+    waiting_room.open(event_id, settings.admit_per_second, settings.burst)
+    return waiting_room.room(event_id)
+
+@router.get("/events/{event_id}", response_model=WaitingRoom)
+async def get_waiting_room(event_id: int):
+    """Get an event's waiting room settings and how many buyers are waiting."""
+    room = waiting_room.room(event_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Event has no waiting room")
+    return room
+
+@router.delete("/events/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def close_waiting_room(event_id: int):
+    """Take bookings for an event without queue tokens again."""
+    if not waiting_room.close(event_id):
+        raise HTTPException(status_code=404, detail="Event has no waiting room")
+    return None
+
+@router.post("/events/{event_id}/tokens", response_model=QueueToken, status_code=status.HTTP_201_CREATED)
+async def join_queue(event_id: int):
+    """Join an event's queue; poll the token until it is admitted, then book with it."""
+    token = waiting_room.join(event_id)
+    if token is None:
+        raise HTTPException(status_code=404, detail="Event has no waiting room")
+    return token
+
+@router.get("/tokens/{token}", response_model=QueueToken)
+async def get_queue_token(token: str):
+    """Get a queue token's position and whether it has been admitted."""
+    queue_token = waiting_room.status(token)
+    if queue_token is None:
+        raise HTTPException(status_code=404, detail="Queue token not found or expired")
+    return queue_token
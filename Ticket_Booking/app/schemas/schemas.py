@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, List
 from app.models.models import BookingStatus
 
@@ -42,6 +43,9 @@ class TicketTypeCreate(TicketTypeBase):
 class BookingCreate(BookingBase):
     pass
 
+class HoldCreate(BookingBase):
+    pass
+
 # Read schemas
 class Venue(VenueBase):
     id: int
@@ -71,6 +75,13 @@ class Booking(BookingBase):
     class Config:
         orm_mode = True
 
+class Hold(BookingBase):
+    id: int
+    expires_at: datetime
+    
+    class Config:
+        orm_mode = True
+
 # Relationships schemas
 class EventWithVenue(Event):
     venue: Venue
@@ -100,6 +111,13 @@ class BookingUpdate(BaseModel):
 class BookingStatusUpdate(BaseModel):
     status: BookingStatus
 
+# Bulk schemas
+class BookingBulkResult(BaseModel):
+    index: int
+    booking: Optional[Booking] = None
+    status_code: Optional[int] = None  # what POST /bookings would have answered the error with
+    error: Optional[str] = None
+
 # Statistics schemas
 class EventRevenue(BaseModel):
     event_id: int
@@ -120,4 +138,31 @@ class BookingSystemStats(BaseModel):
     total_venues: int
     total_bookings: int
     total_revenue: float
-    available_tickets: int 
\ No newline at end of file
+    available_tickets: int
+
+# Waiting room schemas
+class WaitingRoomSettings(BaseModel):
+    admit_per_second: float
+    burst: Optional[int] = None
+
+class WaitingRoom(WaitingRoomSettings):
+    event_id: int
+    burst: int
+    waiting: int
+
+class QueueToken(BaseModel):
+    token: str
+    event_id: int
+    admitted: bool
+    position: int
+    retry_after: float
+
+# Serializers
+@lru_cache(maxsize=None)
+def serializer(schema) -> TypeAdapter:
+    """TypeAdapter for a response schema such as List[BookingWithDetails].
+
+    Building one compiles the schema's validator and serializer, so it is
+    done once per schema and shared by everything that serializes responses.
+    """
+    return TypeAdapter(schema) 
\ No newline at end of file
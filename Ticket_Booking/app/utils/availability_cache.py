@@ -0,0 +1,197 @@
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from sqlalchemy import bindparam, event, update
+from sqlalchemy.orm import Session
+from app.models.models import TicketType
+from app.utils.cache import ticket_type_cache
+
+logger = logging.getLogger(__name__)
+
+# In-process seat counter used when AVAILABILITY_CACHE_ENABLED is set.
+#
+# Bookings are admitted or rejected against the in-memory count under a
+# striped lock, so a flash sale no longer funnels every request through the
+# same ticket_types rows. Seat changes are tied to the caller's Session:
+# reservations are taken immediately and handed back if the session rolls
+# back, releases only become visible once it commits. Committed changes are
+# written back to ticket_types in batches by a background thread.
+#
+# The database lags the cache by up to one flush interval, and only one
+# process may run with the cache enabled against a given database.
+
+_SESSION_KEY = "availability_cache_changes"
+
+class AvailabilityCache:
+    def __init__(self, stripes=64):
+        self._available = {}
+        self._unflushed = defaultdict(int)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._session_factory = None
+
+    def _lock(self, ticket_type_id):
+        return self._locks[ticket_type_id % len(self._locks)]
+
+    def load(self, db: Session):
+        """Rebuild the counters from ticket_types (run at startup)."""
+        rows = db.query(TicketType.id, TicketType.quantity_available).all()
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            self._available = {row.id: row.quantity_available for row in rows}
+            self._unflushed.clear()
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    def get(self, ticket_type_id: int):
+        """Seats currently on sale, or None if the ticket type is not cached."""
+        return self._available.get(ticket_type_id)
+
+    def _ensure_loaded(self, db: Session, ticket_type_id: int):
+        if ticket_type_id in self._available:
+            return True
+        # Ticket types created after startup are pulled in on first use
+        quantity = db.query(TicketType.quantity_available).filter(TicketType.id == ticket_type_id).scalar()
+        if quantity is None:
+            return False
+        with self._lock(ticket_type_id):
+            self._available.setdefault(ticket_type_id, quantity)
+        return True
+
+    def _record(self, db: Session, ticket_type_id: int, delta: int):
+        # Make sure the session has a transaction whose end we will hear about
+        if not db.in_transaction():
+            db.begin()
+        db.info.setdefault(_SESSION_KEY, []).append((ticket_type_id, delta))
+
+    def reserve(self, db: Session, ticket_type_id: int, quantity: int):
+        """Take seats now; they are handed back if `db` rolls back."""
+        if not self._ensure_loaded(db, ticket_type_id):
+            return False
+        with self._lock(ticket_type_id):
+            if self._available[ticket_type_id] < quantity:
+                return False
+            self._available[ticket_type_id] -= quantity
+        self._record(db, ticket_type_id, -quantity)
+        return True
+
+    def release(self, db: Session, ticket_type_id: int, quantity: int):
+        """Give seats back once `db` commits."""
+        if not self._ensure_loaded(db, ticket_type_id):
+            return False
+        self._record(db, ticket_type_id, quantity)
+        return True
+
+    def _after_commit(self, changes):
+        for ticket_type_id, delta in changes:
+            with self._lock(ticket_type_id):
+                if delta > 0:
+                    self._available[ticket_type_id] += delta
+                self._unflushed[ticket_type_id] += delta
+
+    def _after_rollback(self, changes):
+        for ticket_type_id, delta in changes:
+            if delta < 0:
+                with self._lock(ticket_type_id):
+                    self._available[ticket_type_id] -= delta
+
+    def flush(self):
+        """Write committed seat changes back to ticket_types in one transaction."""
+        with self._flush_lock:
+            for lock in self._locks:
+                lock.acquire()
+            try:
+                batch = {key: delta for key, delta in self._unflushed.items() if delta}
+                self._unflushed.clear()
+            finally:
+                for lock in self._locks:
+                    lock.release()
+            if not batch:
+                return 0
+
+            db = self._session_factory()
+            try:
+                ticket_types = TicketType.__table__
+                db.execute(
+                    update(ticket_types)
+                    .where(ticket_types.c.id == bindparam("b_id"))
+                    .values(quantity_available=ticket_types.c.quantity_available + bindparam("b_delta")),
+                    [{"b_id": key, "b_delta": delta} for key, delta in batch.items()]
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                # Keep the changes for the next attempt
+                for key, delta in batch.items():
+                    with self._lock(key):
+                        self._unflushed[key] += delta
+                raise
+            finally:
+                db.close()
+            # GET /ticket-types/{type_id} reads quantity_available from the table
+            for key in batch:
+                ticket_type_cache.invalidate(key)
+            return len(batch)
+
+    @contextmanager
+    def paused(self):
+        """Hold off the write-behind thread; yields the committed seat deltas
+        that ticket_types does not reflect yet, as {ticket_type_id: delta}."""
+        with self._flush_lock:
+            for lock in self._locks:
+                lock.acquire()
+            try:
+                pending = {key: delta for key, delta in self._unflushed.items() if delta}
+            finally:
+                for lock in self._locks:
+                    lock.release()
+            yield pending
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing ticket availability")
+
+    def start(self, session_factory, interval):
+        """Load the counters and start the write-behind thread."""
+        self._session_factory = session_factory
+        db = session_factory()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the write-behind thread and flush what is left."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+availability_cache = AvailabilityCache()
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_changes(session):
+    changes = session.info.pop(_SESSION_KEY, None)
+    if changes:
+        availability_cache._after_commit(changes)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_uncommitted_changes(session, transaction):
+    if transaction.parent is not None:
+        return
+    # Anything still recorded here was never committed
+    changes = session.info.pop(_SESSION_KEY, None)
+    if changes:
+        availability_cache._after_rollback(changes)
@@ -0,0 +1,272 @@
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app import config
+from app.models.models import Booking, BookingStatus, Event, TicketType
+from app.utils.cache import occupancy_cache, ticket_type_cache
+from app.utils.confirmation_codes import confirmation_codes
+from app.utils.counters import bump_counters
+from app.utils.inventory import reserve_tickets, seats_available
+
+logger = logging.getLogger(__name__)
+
+# Group commit for single bookings, used when GROUP_COMMIT_ENABLED is set.
+#
+# Every POST /bookings normally runs its own transaction, and SQLite lets one
+# writer in at a time, so under load the request threads take turns at the
+# write lock and each pays for a commit. With group commit they hand their
+# booking to one writer thread instead and wait on a Future. The writer
+# takes everything queued (waiting up to GROUP_COMMIT_WINDOW_MS after the
+# first booking for more, at most GROUP_COMMIT_MAX_BATCH at a time) and
+# writes the group the way POST /bookings/bulk does: one query per table to
+# validate, one conditional UPDATE per ticket type, one executemany INSERT
+# and one commit. Each caller gets its own result once the group committed,
+# so a booking that was answered is durable.
+#
+# Bookings in a group are checked against the seats left in arrival order,
+# so the last seats go to the earliest bookings. If the whole transaction
+# fails, every booking in it fails with the same error, and the writer
+# thread goes on with the next group. A caller waits at most
+# GROUP_COMMIT_TIMEOUT seconds for its group to start; once it has, the
+# caller waits for the answer, so a booking is never committed unanswered.
+# Async handlers await the same Future through book_async().
+
+NOT_ENOUGH_TICKETS = (400, "Not enough tickets available")
+
+def _grant(bookings, indexes, seats_left, errors):
+    # Give seats to the items at `indexes` in order while they last and
+    # reject the rest; returns the seats given
+    taken = 0
+    for index in indexes:
+        if bookings[index].quantity <= seats_left - taken:
+            taken += bookings[index].quantity
+            errors.pop(index, None)
+        else:
+            errors[index] = NOT_ENOUGH_TICKETS
+    return taken
+
+def create_bookings(db: Session, bookings, errors=None):
+    """Create bookings in one transaction and commit; returns a result per
+    item, in order: {"index", "booking"} or {"index", "status_code", "error"}.
+
+    `errors` maps indexes the caller already rejected to (status code, error).
+    """
+    errors = dict(errors or {})
+
+    # Load every referenced event and ticket type with one query each
+    venue_by_event = dict(db.query(Event.id, Event.venue_id).filter(
+        Event.id.in_({booking.event_id for booking in bookings})
+    ).all())
+    ticket_types = {row.id: row for row in db.query(
+        TicketType.id, TicketType.event_id, TicketType.price, TicketType.quantity_available
+    ).filter(TicketType.id.in_({booking.ticket_type_id for booking in bookings})).all()}
+
+    # Validate each item, then hand out the seats left per ticket type in request order
+    valid = {}
+    for index, booking in enumerate(bookings):
+        if index in errors:
+            continue
+        ticket_type = ticket_types.get(booking.ticket_type_id)
+        if booking.event_id not in venue_by_event:
+            errors[index] = (404, "Event not found")
+        elif ticket_type is None:
+            errors[index] = (404, "Ticket type not found")
+        elif ticket_type.event_id != booking.event_id:
+            errors[index] = (400, "Ticket type does not belong to this event")
+        elif booking.quantity <= 0:
+            errors[index] = (400, "Quantity must be positive")
+        else:
+            valid.setdefault(ticket_type.id, []).append(index)
+    seats_taken = {
+        type_id: _grant(bookings, indexes, seats_available(ticket_types[type_id]), errors)
+        for type_id, indexes in valid.items()
+    }
+
+    # Reserve each ticket type's seats with one conditional UPDATE. If a
+    # concurrent booking took some since they were read, hand that ticket
+    # type's seats out again against a fresh count and retry, so only the
+    # items that no longer fit are rejected.
+    for type_id, indexes in valid.items():
+        while seats_taken[type_id] and not reserve_tickets(db, type_id, seats_taken[type_id]):
+            row = db.query(TicketType.id, TicketType.quantity_available).filter(TicketType.id == type_id).one()
+            seats_taken[type_id] = _grant(bookings, indexes, seats_available(row), errors)
+
+    booking_date = datetime.utcnow()
+    accepted = [booking for index, booking in enumerate(bookings) if index not in errors]
+    # One block of confirmation codes for the whole transaction
+    rows = [
+        {
+            **booking.dict(),
+            "total_price": ticket_types[booking.ticket_type_id].price * booking.quantity,
+            "booking_date": booking_date,
+            "status": BookingStatus.PENDING,
+            "confirmation_code": code,
+        }
+        for booking, code in zip(accepted, confirmation_codes.allocate(len(accepted)))
+    ]
+
+    # Insert every accepted booking with one executemany in the same transaction
+    ids = []
+    if rows:
+        ids = db.execute(
+            insert(Booking).returning(Booking.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        bump_counters(db, total_bookings=len(rows))
+    db.commit()
+    for venue_id in {venue_by_event[row["event_id"]] for row in rows}:
+        occupancy_cache.invalidate(venue_id)
+    for type_id, quantity in seats_taken.items():
+        if quantity:
+            ticket_type_cache.invalidate(type_id)
+
+    created = iter(zip(ids, rows))
+    results = []
+    for index in range(len(bookings)):
+        if index in errors:
+            status_code, error = errors[index]
+            results.append({"index": index, "status_code": status_code, "error": error})
+        else:
+            booking_id, row = next(created)
+            results.append({"index": index, "booking": {"id": booking_id, **row}})
+    return results
+
+class BookingWriter:
+    def __init__(self, window=None, max_batch=None, timeout=None):
+        self.window = config.GROUP_COMMIT_WINDOW_MS / 1000 if window is None else window
+        self.max_batch = max_batch or config.GROUP_COMMIT_MAX_BATCH
+        self.timeout = config.GROUP_COMMIT_TIMEOUT if timeout is None else timeout
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._session_factory = None
+        self.batches = 0
+        self.bookings = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def submit(self, booking) -> Future:
+        """Queue a BookingCreate; the Future resolves to its create_bookings result."""
+        future = Future()
+        self._queue.put((booking, future))
+        return future
+
+    def book(self, booking):
+        """Queue a BookingCreate and wait until its group has been written.
+
+        Raises TimeoutError if its group has not started within `timeout`
+        seconds; the booking is then dropped from the queue.
+        """
+        future = self.submit(booking)
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            if future.cancel():
+                raise TimeoutError("Timed out waiting for the booking writer") from None
+            # Its group is being written already; the answer follows shortly
+            return future.result()
+
+    async def book_async(self, booking):
+        """book() for async handlers: waits on the event loop, not a thread."""
+        future = self.submit(booking)
+        result = asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), self.timeout)
+        except asyncio.TimeoutError:
+            if future.cancel():
+                raise TimeoutError("Timed out waiting for the booking writer") from None
+            return await result
+
+    def _next_batch(self):
+        # Block for the first booking, then take what else arrives within the window
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                # Write this group, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _create(self, batch):
+        db = self._session_factory()
+        try:
+            return create_bookings(db, [booking for booking, _ in batch])
+        finally:
+            # Rolls back whatever did not commit
+            db.close()
+
+    def _write(self, batch):
+        # Callers that timed out while queued are skipped; the rest can no longer cancel
+        batch = [(booking, future) for booking, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self._create(batch)
+        except Exception as e:
+            logger.exception("Error writing a group of %d bookings", len(batch))
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        with self._lock:
+            self.batches += 1
+            self.bookings += len(batch)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Keep the thread alive for the next group; nobody may wait forever on this one
+                logger.exception("Error in the booking writer")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def start(self, session_factory, window=None, max_batch=None, timeout=None):
+        """Start the writer thread; bookings are written with `session_factory`."""
+        if window is not None:
+            self.window = window
+        if max_batch is not None:
+            self.max_batch = max_batch
+        if timeout is not None:
+            self.timeout = timeout
+        self._session_factory = session_factory
+        with self._lock:
+            self.batches = self.bookings = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write what is queued and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {"batches": self.batches, "bookings": self.bookings}
+
+booking_writer = BookingWriter()
@@ -0,0 +1,322 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from app import config
+from app.schemas.schemas import serializer
+from app.utils.pagination import NEXT_CURSOR_HEADER
+
+# Read-through caches for hot GET routes and computed values.
+#
+# Each Cache is a namespace in a shared backend: the in-process LRU with
+# per-entry TTL by default, or Redis (RESPONSE_CACHE_BACKEND=redis) so that
+# several server processes share entries and invalidations. Writers call
+# invalidate()/clear() after their transaction commits; the TTL bounds how
+# long anything a writer does not invalidate can stay stale.
+
+_MISSING = object()
+
+class MemoryBackend:
+    """In-process store that evicts the least recently used entry when full."""
+
+    def __init__(self, max_entries=10000):
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    # Counters are kept apart from the entries so eviction never resets them
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "evictions": self.evictions}
+
+class RedisBackend:
+    """Store entries as JSON in Redis, or in any client with the same
+    get/set/delete/incr methods (e.g. a stub in tests)."""
+
+    def __init__(self, client, prefix="ticket_booking:"):
+        self._client = client
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self._prefix + key)
+        return _MISSING if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._prefix + key, json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(self._prefix + key)
+
+    def counter(self, key):
+        return int(self._client.get(self._prefix + key) or 0)
+
+    def incr(self, key):
+        return self._client.incr(self._prefix + key)
+
+    def stats(self):
+        return {"backend": "redis"}
+
+class NullBackend:
+    """Caches nothing; every lookup is a miss."""
+
+    def get(self, key):
+        return _MISSING
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def counter(self, key):
+        return 0
+
+    def incr(self, key):
+        return 0
+
+    def stats(self):
+        return {"backend": "none"}
+
+def create_backend(name=None):
+    """Create the backend selected by RESPONSE_CACHE_BACKEND (memory, redis or none)."""
+    name = name or config.RESPONSE_CACHE_BACKEND
+    if name == "memory":
+        return MemoryBackend(config.RESPONSE_CACHE_MAX_ENTRIES)
+    if name == "redis":
+        import redis  # optional dependency: pip install redis
+        return RedisBackend(redis.Redis.from_url(config.REDIS_URL))
+    if name == "none":
+        return NullBackend()
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND {name!r}; expected 'memory', 'redis' or 'none'")
+
+class Cache:
+    """Thread-safe cache of computed values with per-key invalidation.
+
+    Writers call invalidate() after their transaction commits. Each key has a
+    version that invalidate() bumps, and a value computed by get_or_set() is
+    only stored if no invalidation happened while it was being computed, so a
+    read that raced with a write cannot leave a stale value behind.
+
+    clear() drops the whole namespace by bumping a generation counter kept in
+    the backend, which every key includes.
+    """
+
+    def __init__(self, name, backend=None, ttl=None):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self._versions = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _backend(self):
+        return self.backend or default_backend()
+
+    def _key(self, backend, key):
+        generation = backend.counter(f"{self.name}:generation")
+        return f"{self.name}:{generation}:{key}"
+
+    def get_or_set(self, key, compute):
+        """Return the cached value for `key`, computing and storing it on a miss.
+
+        None is never stored, so a compute() that finds nothing is run again
+        next time; raise from compute() (e.g. a 404) to report a missing row.
+        """
+        value, miss = self._lookup(key)
+        if miss is None:
+            return value
+        return self._store(miss, compute())
+
+    async def get_or_set_async(self, key, compute):
+        """get_or_set with a coroutine function as `compute`."""
+        value, miss = self._lookup(key)
+        if miss is None:
+            return value
+        return self._store(miss, await compute())
+
+    def _lookup(self, key):
+        # Returns (value, None) on a hit, else (None, what _store needs)
+        key = str(key)
+        backend = self._backend()
+        with self._lock:
+            version = (self._epoch, self._versions.get(key, 0))
+        # The value is stored under the generation it was read in, so a
+        # clear() from another process during compute() leaves it unreachable
+        backend_key = self._key(backend, key)
+        value = backend.get(backend_key)
+        if value is not _MISSING:
+            with self._lock:
+                self.hits += 1
+            return value, None
+        return None, (key, backend, backend_key, version)
+
+    def _store(self, miss, value):
+        key, backend, backend_key, version = miss
+        with self._lock:
+            self.misses += 1
+            store = (self._epoch, self._versions.get(key, 0)) == version
+        if store and value is not None:
+            backend.set(backend_key, value, self.ttl or config.RESPONSE_CACHE_TTL)
+        return value
+
+    def invalidate(self, key):
+        """Drop the cached value for `key`."""
+        key = str(key)
+        backend = self._backend()
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self.invalidations += 1
+        backend.delete(self._key(backend, key))
+
+    def clear(self):
+        """Drop every cached value."""
+        backend = self._backend()
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += 1
+        backend.incr(f"{self.name}:generation")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+def default_backend():
+    """The backend shared by every cache that was not given its own."""
+    global _default_backend
+    if _default_backend is None:
+        with _default_backend_lock:
+            if _default_backend is None:
+                _default_backend = create_backend()
+    return _default_backend
+
+def set_default_backend(backend):
+    """Replace the shared backend, e.g. with NullBackend() or a Redis stub."""
+    global _default_backend
+    _default_backend = backend
+
+def cache_stats():
+    """Hit/miss counters per cache plus the shared backend's own figures."""
+    return {
+        "backend": default_backend().stats(),
+        "caches": {cache.name: cache.stats() for cache in caches},
+    }
+
+def clear_caches():
+    for cache in caches:
+        cache.clear()
+
+def cached_route(cache, response_model, key):
+    """Serve a GET handler from `cache`, keyed by the named parameter(s).
+
+    The handler's result is validated against `response_model` and stored
+    in its JSON form, together with the X-Next-Cursor header if the handler
+    set one. Errors such as 404s are not cached.
+    """
+    adapter = serializer(response_model)
+    names = (key,) if isinstance(key, str) else tuple(key)
+
+    def decorator(endpoint):
+        signature = inspect.signature(endpoint)
+
+        def lookup(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            return ":".join(str(arguments[name]) for name in names), arguments.get("response")
+
+        def to_entry(result, response):
+            body = adapter.validate_python(result, from_attributes=True)
+            entry = {"body": adapter.dump_python(body, mode="json")}
+            if response is not None and NEXT_CURSOR_HEADER in response.headers:
+                entry["next_cursor"] = response.headers[NEXT_CURSOR_HEADER]
+            return entry
+
+        def from_entry(entry, response):
+            if response is not None and "next_cursor" in entry:
+                response.headers[NEXT_CURSOR_HEADER] = entry["next_cursor"]
+            return entry["body"]
+
+        # Async handlers (app/routers/aio) are computed on the event loop
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def async_wrapper(*args, **kwargs):
+                key, response = lookup(args, kwargs)
+
+                async def compute():
+                    return to_entry(await endpoint(*args, **kwargs), response)
+
+                return from_entry(await cache.get_or_set_async(key, compute), response)
+            return async_wrapper
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            key, response = lookup(args, kwargs)
+            entry = cache.get_or_set(key, lambda: to_entry(endpoint(*args, **kwargs), response))
+            return from_entry(entry, response)
+        return wrapper
+    return decorator
+
+# Venue occupancy responses keyed by venue id; invalidated by booking writes
+occupancy_cache = Cache("occupancy")
+# GET /events/ pages keyed by skip:limit:after; cleared when an event is created
+event_list_cache = Cache("event_list")
+# GET /events/{event_id}, /venues/{venue_id}; events and venues are not edited
+# after creation, so these only expire
+event_cache = Cache("event")
+venue_cache = Cache("venue")
+# GET /venues/{venue_id}/events; invalidated when an event is created there
+venue_events_cache = Cache("venue_events")
+# GET /ticket-types/{type_id}; quantity_available changes with every booking
+ticket_type_cache = Cache("ticket_type")
+
+caches = [occupancy_cache, event_list_cache, event_cache, venue_cache, venue_events_cache, ticket_type_cache]
@@ -0,0 +1,231 @@
+import logging
+import os
+import random
+import secrets
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import config
+from app.models.models import WorkerIdLease
+
+logger = logging.getLogger(__name__)
+
+# Confirmation codes that cannot collide.
+#
+# Each code encodes a 63-bit Snowflake-style id: milliseconds since EPOCH_MS,
+# the worker id of the process that issued it and a sequence number within
+# that millisecond. Ids are handed out from an in-process counter, so codes
+# need no database round trip and a bulk request takes a whole block under
+# one lock. When a millisecond's 4096 sequence numbers run out the counter
+# moves on to the next millisecond instead of waiting for the clock.
+#
+# The id is written as 13 Crockford base32 characters plus a Luhn mod 32
+# check character, which catches any single mistyped character and most
+# swapped neighbours before the database is asked.
+#
+# Codes are unique as long as no two running processes share a worker id.
+# CONFIRMATION_WORKER_ID (0-1023) pins one per process. Without it the
+# server leases a free id from worker_id_leases at startup and renews the
+# lease in the background; a lease that was not renewed for
+# CONFIRMATION_WORKER_LEASE_TTL seconds belongs to a dead process and may be
+# taken over. A process that loses its lease (stalled past the TTL) leases
+# a new id before issuing more codes. Code issued without either (scripts,
+# the benchmarks) falls back to a random id with a warning. The unique index
+# on bookings.confirmation_code still rejects a duplicate if that ever fails.
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_VALUES = {char: value for value, char in enumerate(ALPHABET)}
+# Characters that are easily misread as ones in the alphabet
+_MISREAD = str.maketrans({"O": "0", "I": "1", "L": "1"})
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+TIMESTAMP_BITS = 41
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+
+_ID_CHARS = 13  # ceil(63 / 5)
+CODE_LENGTH = _ID_CHARS + 1
+_SHIFTS = [5 * shift for shift in reversed(range(_ID_CHARS))]
+
+# Luhn mod 32 addend of each value in a doubled position
+_DOUBLED = [value * 2 // 32 + value * 2 % 32 for value in range(32)]
+
+def _check_character(digits):
+    # Luhn mod 32: double every other value from the right and sum
+    digits = digits[::-1]
+    total = sum(_DOUBLED[value] for value in digits[0::2]) + sum(digits[1::2])
+    return ALPHABET[-total % 32]
+
+def encode(code_id: int):
+    """Write an id as a confirmation code."""
+    digits = [(code_id >> shift) & 31 for shift in _SHIFTS]
+    return "".join([ALPHABET[value] for value in digits]) + _check_character(digits)
+
+def normalize(code: str):
+    """Uppercase a code the way it is stored, dropping spaces and dashes and,
+    for generated codes, reading O as 0 and I/L as 1. Older 8-character
+    random codes are left as they are."""
+    code = code.strip().upper().replace("-", "").replace(" ", "")
+    if len(code) == CODE_LENGTH:
+        code = code.translate(_MISREAD)
+    return code
+
+def is_valid(code: str):
+    """Whether a normalized code is a generated one with a correct check character."""
+    if len(code) != CODE_LENGTH or any(char not in _VALUES for char in code):
+        return False
+    return _check_character([_VALUES[char] for char in code[:-1]]) == code[-1]
+
+def decode(code: str):
+    """Return (issued at in ms since the Unix epoch, worker id, sequence) for a code."""
+    code = normalize(code)
+    if not is_valid(code):
+        raise ValueError(f"Not a valid confirmation code: {code!r}")
+    code_id = 0
+    for char in code[:-1]:
+        code_id = code_id << 5 | _VALUES[char]
+    return (
+        (code_id >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS,
+        (code_id >> SEQUENCE_BITS) & MAX_WORKER_ID,
+        code_id & ((1 << SEQUENCE_BITS) - 1),
+    )
+
+class ConfirmationCodeGenerator:
+    """Thread-safe source of unique confirmation codes for one worker id."""
+
+    def __init__(self, worker_id=None, clock=time.time):
+        if worker_id is None:
+            worker_id = config.CONFIRMATION_WORKER_ID
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Worker id must be between 0 and {MAX_WORKER_ID}")
+        # None until leased (or picked at random on first use)
+        self.worker_id = worker_id
+        self._configured = worker_id is not None
+        self._clock = clock
+        # Next free (milliseconds since EPOCH_MS, sequence) slot, as one number
+        self._next_slot = 0
+        self._lock = threading.Lock()
+        self._session_factory = None
+        self._holder = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._ttl = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def allocate(self, count: int):
+        """Reserve `count` codes at once and return them in issue order."""
+        now = int(self._clock() * 1000) - EPOCH_MS
+        with self._lock:
+            if self.worker_id is None:
+                self.worker_id = secrets.randbelow(MAX_WORKER_ID + 1)
+                logger.warning(
+                    "CONFIRMATION_WORKER_ID is not set and no worker id was leased; using random worker id %d. "
+                    "Confirmation codes can collide with another process that picks the same id.",
+                    self.worker_id
+                )
+            worker = self.worker_id << SEQUENCE_BITS
+            # Never behind the clock, and never back in time if the clock steps back
+            first = max(self._next_slot, now << SEQUENCE_BITS)
+            self._next_slot = first + count
+        if (first + count) >> SEQUENCE_BITS >= 1 << TIMESTAMP_BITS:
+            raise OverflowError("Confirmation code timestamps are exhausted")
+        # Shift the slot's milliseconds past the worker bits; its sequence stays in the low bits
+        return [
+            encode((slot >> SEQUENCE_BITS) << (WORKER_BITS + SEQUENCE_BITS) | worker | slot & ((1 << SEQUENCE_BITS) - 1))
+            for slot in range(first, first + count)
+        ]
+
+    def next_code(self):
+        return self.allocate(1)[0]
+
+    def _lease(self):
+        # Take a free or expired worker id, trying them in random order so
+        # processes starting together rarely race for the same one
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self._ttl)
+        db = self._session_factory()
+        try:
+            held = set(db.execute(
+                select(WorkerIdLease.worker_id).where(WorkerIdLease.renewed_at >= cutoff)
+            ).scalars())
+            candidates = [worker_id for worker_id in range(MAX_WORKER_ID + 1) if worker_id not in held]
+            random.shuffle(candidates)
+            for worker_id in candidates:
+                lease = {"holder": self._holder, "renewed_at": now}
+                taken_over = db.execute(
+                    update(WorkerIdLease)
+                    .where(WorkerIdLease.worker_id == worker_id, WorkerIdLease.renewed_at < cutoff)
+                    .values(**lease)
+                ).rowcount
+                if not taken_over:
+                    try:
+                        with db.begin_nested():
+                            db.execute(insert(WorkerIdLease).values(worker_id=worker_id, **lease))
+                    except IntegrityError:
+                        # Another process leased it first
+                        continue
+                db.commit()
+                return worker_id
+        finally:
+            db.close()
+        raise RuntimeError(f"All {MAX_WORKER_ID + 1} confirmation code worker ids are leased")
+
+    def renew(self):
+        """Renew this process's lease, leasing a new worker id if it was lost."""
+        db = self._session_factory()
+        try:
+            renewed = db.execute(
+                update(WorkerIdLease)
+                .where(WorkerIdLease.worker_id == self.worker_id, WorkerIdLease.holder == self._holder)
+                .values(renewed_at=datetime.utcnow())
+            ).rowcount
+            db.commit()
+        finally:
+            db.close()
+        if not renewed:
+            lost = self.worker_id
+            worker_id = self._lease()
+            with self._lock:
+                self.worker_id = worker_id
+            logger.error("Lost the lease on confirmation code worker id %d; now using %d", lost, worker_id)
+
+    def _run(self):
+        while not self._stop.wait(self._ttl / 3):
+            try:
+                self.renew()
+            except Exception:
+                logger.exception("Error renewing the confirmation code worker id lease")
+
+    def start(self, session_factory, ttl):
+        """Lease a worker id from the database and keep the lease renewed,
+        unless CONFIRMATION_WORKER_ID set one."""
+        if self._configured:
+            return
+        self._session_factory = session_factory
+        self._ttl = ttl
+        worker_id = self._lease()
+        with self._lock:
+            self.worker_id = worker_id
+        logger.info("Leased confirmation code worker id %d", worker_id)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop renewing and give the leased worker id back."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        db = self._session_factory()
+        try:
+            db.execute(delete(WorkerIdLease).where(WorkerIdLease.holder == self._holder))
+            db.commit()
+        finally:
+            db.close()
+
+confirmation_codes = ConfirmationCodeGenerator()
@@ -0,0 +1,160 @@
+import math
+import random
+from contextlib import nullcontext
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import config
+from app.database.locking import get_all_for_update
+from app.models.models import Event, Venue, Booking, TicketType, BookingStatus, SystemCounters
+from app.utils.availability_cache import availability_cache
+
+# system_counters holds the totals shown by /booking-system/stats. Every write
+# path bumps the affected counters with `col = col + delta` in the same
+# transaction as the change itself, so the stats endpoint sums a handful of
+# rows instead of counting and summing whole tables. reconcile_counters()
+# recomputes everything from scratch and reports how far the rows had drifted.
+#
+# The totals are split over COUNTER_STRIPES rows (ids 1..N) and a read adds
+# them up. A single row would be locked by every booking transaction until it
+# commits, so on PostgreSQL all bookings would queue on that one row lock even
+# though they touch different ticket types. Each session picks one stripe at
+# random and uses it for every bump, so a transaction locks exactly one
+# counter row and two transactions can never wait on each other's stripes.
+
+COUNTERS_ID = 1
+
+COUNTER_NAMES = [
+    "total_events", "total_venues", "total_bookings",
+    "total_revenue", "booked_tickets", "available_tickets",
+]
+
+def _stripe(db: Session):
+    stripe = db.info.get("counter_stripe")
+    if stripe is None:
+        stripe = db.info["counter_stripe"] = random.randint(COUNTERS_ID, config.COUNTER_STRIPES)
+    return stripe
+
+def _bump(db, deltas):
+    # The UPDATE adding `deltas` to this session's stripe, or None if they are all zero
+    values = {
+        getattr(SystemCounters, name): getattr(SystemCounters, name) + delta
+        for name, delta in deltas.items() if delta
+    }
+    if not values:
+        return None
+    return (
+        update(SystemCounters)
+        .where(SystemCounters.id == _stripe(db))
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+
+def _missing_stripe(db, result):
+    # A database reconciled before COUNTER_STRIPES was raised lacks the
+    # higher stripes; use the first row from now on until it is reconciled
+    if result.rowcount == 0 and _stripe(db) != COUNTERS_ID:
+        db.info["counter_stripe"] = COUNTERS_ID
+        return True
+    return False
+
+def bump_counters(db: Session, **deltas):
+    """Add the given deltas to this session's counter stripe. Does not commit."""
+    statement = _bump(db, deltas)
+    if statement is not None and _missing_stripe(db, db.execute(statement)):
+        bump_counters(db, **deltas)
+
+async def bump_counters_async(db: AsyncSession, **deltas):
+    """bump_counters for an AsyncSession."""
+    statement = _bump(db, deltas)
+    if statement is not None and _missing_stripe(db, await db.execute(statement)):
+        await bump_counters_async(db, **deltas)
+
+def compute_counters(db: Session, pending_seats=None):
+    """Recompute every counter from the base tables.
+
+    `pending_seats` are committed seat changes the availability cache has not
+    written back to ticket_types yet.
+    """
+    booked = db.query(
+        func.count(Booking.id),
+        func.coalesce(func.sum(Booking.quantity).filter(Booking.status != BookingStatus.CANCELLED), 0),
+        func.coalesce(func.sum(Booking.total_price).filter(Booking.status == BookingStatus.CONFIRMED), 0),
+    ).one()
+    available = db.query(func.coalesce(func.sum(TicketType.quantity_available), 0)).scalar()
+    return {
+        "total_events": db.query(func.count(Event.id)).scalar(),
+        "total_venues": db.query(func.count(Venue.id)).scalar(),
+        "total_bookings": booked[0],
+        "total_revenue": float(booked[2]),
+        "booked_tickets": booked[1],
+        "available_tickets": available + sum((pending_seats or {}).values()),
+    }
+
+def reconcile_counters(db: Session):
+    """Overwrite the counter stripes with freshly computed totals: the first
+    row gets the totals and every other stripe is zeroed. Does not commit.
+
+    Returns {counter: {"stored": old, "actual": new}} for every counter that
+    had drifted (stored is None when there were no rows yet).
+    """
+    paused = availability_cache.paused() if config.AVAILABILITY_CACHE_ENABLED else nullcontext({})
+    with paused as pending_seats:
+        # Take the row locks first: writers bump a stripe before they commit,
+        # so none can commit between the recount and the overwrite
+        stripes = {row.id: row for row in get_all_for_update(db, SystemCounters)}
+        actual = compute_counters(db, pending_seats)
+    
+    drift = {}
+    for name, value in actual.items():
+        stored = sum(getattr(row, name) or 0 for row in stripes.values()) if stripes else None
+        if stored is None or not math.isclose(stored, value, abs_tol=0.005):
+            drift[name] = {"stored": stored, "actual": value}
+    
+    for stripe in set(range(COUNTERS_ID, config.COUNTER_STRIPES + 1)) | set(stripes):
+        counters = stripes.get(stripe)
+        if counters is None:
+            counters = SystemCounters(id=stripe)
+            db.add(counters)
+        for name, value in actual.items():
+            setattr(counters, name, value if stripe == COUNTERS_ID else 0)
+    db.flush()
+    return drift
+
+def _totals():
+    return select(
+        func.count(SystemCounters.id).label("stripes"),
+        *(func.coalesce(func.sum(getattr(SystemCounters, name)), 0).label(name) for name in COUNTER_NAMES)
+    )
+
+def read_counters(db: Session):
+    """Return the summed counter stripes, creating them on first use."""
+    totals = db.execute(_totals()).one()
+    if totals.stripes == 0:
+        reconcile_counters(db)
+        db.commit()
+        return read_counters(db)
+    return totals
+
+async def read_counters_async(db: AsyncSession):
+    """read_counters for an AsyncSession. In async mode the server creates
+    the stripes at startup, so the first-use reconcile normally never runs
+    on the event loop."""
+    totals = (await db.execute(_totals())).one()
+    if totals.stripes == 0:
+        return await db.run_sync(read_counters)
+    return totals
+
+if __name__ == "__main__":
+    # Reconciliation job: python -m app.utils.counters
+    from app.database.database import SessionLocal
+    db = SessionLocal()
+    try:
+        drift = reconcile_counters(db)
+        db.commit()
+    finally:
+        db.close()
+    if not drift:
+        print("Counters match the database")
+    for name, values in drift.items():
+        print(f"{name}: stored {values['stored']}, actual {values['actual']}")
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from app.database.database import SessionLocal
+from app.models.models import Booking, Event, TicketType
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    Booking.id,
+    Booking.confirmation_code,
+    Booking.user_name,
+    Booking.user_email,
+    Booking.event_id,
+    Event.name.label("event_name"),
+    Booking.ticket_type_id,
+    TicketType.name.label("ticket_type_name"),
+    Booking.quantity,
+    Booking.total_price,
+    Booking.status,
+    Booking.booking_date,
+]
+
+def _export_rows():
+    """Yield every booking as a dict of plain values, EXPORT_BATCH_SIZE rows at a time.
+
+    The export opens its own session because the response body is produced
+    after the request's dependencies have finished.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            select(*EXPORT_COLUMNS)
+            .join(Event, Booking.event_id == Event.id)
+            .join(TicketType, Booking.ticket_type_id == TicketType.id)
+            .order_by(Booking.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for partition in result.mappings().partitions():
+            yield [
+                {
+                    **row,
+                    "status": row["status"].value if row["status"] else None,
+                    "booking_date": row["booking_date"].isoformat() if row["booking_date"] else None,
+                }
+                for row in partition
+            ]
+    finally:
+        db.close()
+
+def stream_bookings_ndjson():
+    """Yield bookings as newline-delimited JSON."""
+    for rows in _export_rows():
+        yield "".join(json.dumps(row) + "\n" for row in rows)
+
+def stream_bookings_csv():
+    """Yield bookings as CSV, starting with a header row."""
+    fieldnames = [column.key for column in EXPORT_COLUMNS]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for rows in _export_rows():
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,101 @@
+import inspect
+from fastapi import APIRouter, Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from app.schemas.schemas import serializer
+
+# Fast JSON mode (FAST_JSON_ENABLED) takes response serialization off
+# FastAPI's generic path.
+#
+# By default FastAPI validates a handler's return value against the
+# response_model, dumps the result to Python objects and then encodes those
+# with json.dumps. Here every route with a response_model is re-registered
+# with an endpoint that validates the return value once and encodes it
+# straight to JSON bytes with the schema's prebuilt serializer, then returns
+# the finished Response, which FastAPI passes through untouched.
+#
+# Headers and status codes set on the injected Response (X-Next-Cursor,
+# ETag) are copied onto the finished one, and the route's response_model_*
+# options apply to the encoding, as FastAPI would. The new route is built
+# with every other option of the original (response_class, deprecated,
+# operation_id, openapi_extra, ...), so the OpenAPI schema is unchanged.
+# Routes with a non-JSON response_class are kept as they are.
+#
+# The encoding is what gets faster, so the gain grows with the response:
+# large pages of bookings, not single objects.
+
+_RESPONSE_PARAMETER = "fast_json_response"
+
+# Everything APIRoute takes besides the path and endpoint, copied from the original route
+_ROUTE_OPTIONS = [name for name in inspect.signature(APIRoute.__init__).parameters if name not in ("self", "path", "endpoint")]
+
+def _response_parameter(signature):
+    for parameter in signature.parameters.values():
+        if parameter.annotation is Response:
+            return parameter.name
+    return None
+
+def _make_fast_endpoint(route: APIRoute):
+    endpoint, status_code = route.endpoint, route.status_code
+    adapter = serializer(route.response_model)
+    dump_options = {
+        "include": route.response_model_include,
+        "exclude": route.response_model_exclude,
+        "by_alias": route.response_model_by_alias,
+        "exclude_unset": route.response_model_exclude_unset,
+        "exclude_defaults": route.response_model_exclude_defaults,
+        "exclude_none": route.response_model_exclude_none,
+    }
+    signature = inspect.signature(endpoint)
+    response_name = _response_parameter(signature)
+
+    def render(result, response):
+        if isinstance(result, Response):
+            return result
+        body = adapter.dump_json(adapter.validate_python(result, from_attributes=True), **dump_options)
+        rendered = Response(body, status_code=response.status_code or status_code or 200, media_type="application/json")
+        rendered.raw_headers.extend(response.raw_headers)
+        return rendered
+
+    def arguments(kwargs):
+        # The endpoint only receives the Response if it asked for one
+        if response_name is None:
+            return kwargs.pop(_RESPONSE_PARAMETER), kwargs
+        return kwargs[response_name], kwargs
+
+    if inspect.iscoroutinefunction(endpoint):
+        async def fast_endpoint(**kwargs):
+            response, kwargs = arguments(kwargs)
+            return render(await endpoint(**kwargs), response)
+    else:
+        def fast_endpoint(**kwargs):
+            response, kwargs = arguments(kwargs)
+            return render(endpoint(**kwargs), response)
+
+    if response_name is None:
+        signature = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(_RESPONSE_PARAMETER, inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+        ])
+    fast_endpoint.__signature__ = signature
+    fast_endpoint.__name__ = endpoint.__name__
+    fast_endpoint.__doc__ = endpoint.__doc__
+    return fast_endpoint
+
+def _encodes_json(route):
+    response_class = route.response_class
+    return isinstance(response_class, DefaultPlaceholder) or issubclass(response_class, JSONResponse)
+
+def make_fast_json_router(router: APIRouter):
+    """Return a copy of `router` whose routes encode their response_model with
+    its prebuilt serializer. Routes without a response_model or with a
+    non-JSON response_class are kept as they are."""
+    fast_router = APIRouter()
+    for route in router.routes:
+        if not isinstance(route, APIRoute) or route.response_model is None or not _encodes_json(route):
+            fast_router.routes.append(route)
+            continue
+        options = {name: getattr(route, name) for name in _ROUTE_OPTIONS}
+        fast_router.routes.append(APIRoute(route.path, _make_fast_endpoint(route), **options))
+    return fast_router
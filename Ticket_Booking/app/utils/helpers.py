@@ -1,12 +1,14 @@
-import random
-import string
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.models import TicketType, Booking
+from app.models.models import Event, TicketType, Booking, BookingStatus
+from app.utils.cache import occupancy_cache, ticket_type_cache
+from app.utils.confirmation_codes import confirmation_codes
+from app.utils.inventory import seats_available
 
-def generate_confirmation_code(length=8):
-    """Generate a random confirmation code for bookings."""
-    chars = string.ascii_uppercase + string.digits
-    return ''.join(random.choice(chars) for _ in range(length))
+def generate_confirmation_code():
+    """Generate a unique confirmation code for a booking."""
+    return confirmation_codes.next_code()
 
 def calculate_total_price(db: Session, ticket_type_id: int, quantity: int):
     """Calculate the total price for a booking based on ticket type and quantity."""
@@ -15,35 +17,56 @@ def calculate_total_price(db: Session, ticket_type_id: int, quantity: int):
         return None
     return ticket_type.price * quantity
 
-def check_ticket_availability(db: Session, ticket_type_id: int, quantity: int):
-    """Check if there are enough tickets available for a booking."""
-    ticket_type = db.query(TicketType).filter(TicketType.id == ticket_type_id).first()
-    if not ticket_type:
-        return False
-    
-    # Calculate how many tickets are already booked
-    booked_tickets = db.query(Booking).filter(
-        Booking.ticket_type_id == ticket_type_id,
-        Booking.status != "cancelled"
-    ).with_entities(Booking.quantity).all()
-    
-    total_booked = sum(booking.quantity for booking in booked_tickets)
-    return ticket_type.quantity_available - total_booked >= quantity
+async def calculate_total_price_async(db: AsyncSession, ticket_type_id: int, quantity: int):
+    """calculate_total_price for an AsyncSession."""
+    price = await db.scalar(select(TicketType.price).where(TicketType.id == ticket_type_id))
+    if price is None:
+        return None
+    return price * quantity
 
-def update_ticket_availability(db: Session, ticket_type_id: int, quantity: int, is_cancellation=False):
-    """Update ticket availability after a booking or cancellation."""
-    ticket_type = db.query(TicketType).filter(TicketType.id == ticket_type_id).first()
-    if not ticket_type:
-        return False
+def get_ticket_availability(db: Session, event_ids):
+    """Get availability per ticket type for several events with one grouped query.
     
-    if is_cancellation:
-        # Add tickets back to available pool
-        ticket_type.quantity_available += quantity
-    else:
-        # Remove tickets from available pool
-        if ticket_type.quantity_available < quantity:
-            return False
-        ticket_type.quantity_available -= quantity
+    Returns a dict mapping each event id that has ticket types to a list of
+    ticket type availability entries.
+    """
+    rows = db.query(
+        TicketType.id,
+        TicketType.event_id,
+        TicketType.name,
+        TicketType.price,
+        TicketType.quantity_available,
+        func.coalesce(func.sum(Booking.quantity), 0).label("booked")
+    ).outerjoin(
+        Booking,
+        and_(Booking.ticket_type_id == TicketType.id, Booking.status != BookingStatus.CANCELLED)
+    ).filter(
+        TicketType.event_id.in_(event_ids)
+    ).group_by(TicketType.id).order_by(TicketType.id).all()
     
-    db.commit()
-    return True 
\ No newline at end of file
+    availability = {}
+    for row in rows:
+        # Seats on sale already exclude those held by live bookings
+        available = seats_available(row)
+        availability.setdefault(row.event_id, []).append({
+            "ticket_type_id": row.id,
+            "name": row.name,
+            "price": row.price,
+            "available": available,
+            "total": available + row.booked
+        })
+    return availability
+
+def _drop_booking_caches(venue_id, ticket_type_id: int):
+    if venue_id is not None:
+        occupancy_cache.invalidate(venue_id)
+    ticket_type_cache.invalidate(ticket_type_id)
+
+def invalidate_booking_caches(db: Session, event_id: int, ticket_type_id: int):
+    """Drop the cached occupancy of the venue hosting an event and the cached
+    ticket type whose seats a booking changed (call after commit)."""
+    _drop_booking_caches(db.query(Event.venue_id).filter(Event.id == event_id).scalar(), ticket_type_id)
+
+async def invalidate_booking_caches_async(db: AsyncSession, event_id: int, ticket_type_id: int):
+    """invalidate_booking_caches for an AsyncSession."""
+    _drop_booking_caches(await db.scalar(select(Event.venue_id).where(Event.id == event_id)), ticket_type_id)
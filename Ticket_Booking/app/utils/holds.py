@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import config
+from app.models.models import SeatHold
+from app.utils.cache import ticket_type_cache
+from app.utils.inventory import reserve_tickets, reserve_tickets_async, release_tickets
+
+logger = logging.getLogger(__name__)
+
+# Seat holds for on-sale spikes.
+#
+# A hold takes its seats off sale for HOLD_TTL_SECONDS while the buyer checks
+# out: the seats are reserved through the inventory functions (so the
+# availability cache applies) and the hold is a seat_holds row written in the
+# same transaction, so holds survive a restart. Confirming deletes the row and
+# creates the booking; a hold that is never confirmed is released by the
+# sweeper, so abandoned checkouts give their seats back instead of keeping
+# them as pending bookings forever.
+#
+# The sweeper is an asyncio task. HoldManager keeps a heap of (expires_at,
+# hold id) for the holds this process knows of, so the task sleeps until the
+# next one is due rather than polling; placing a hold that expires first
+# wakes it. Each sweep deletes due rows HOLD_SWEEP_BATCH at a time with
+# DELETE ... RETURNING and releases their seats with one UPDATE per ticket
+# type. Only rows a statement actually deleted are released, so a hold
+# confirmed or released concurrently (or swept by another process) is never
+# released twice.
+
+def _new_hold(hold):
+    return SeatHold(**hold.dict(), expires_at=datetime.utcnow() + timedelta(seconds=config.HOLD_TTL_SECONDS))
+
+def place_hold(db: Session, hold):
+    """Reserve seats for a HoldCreate and add its seat_holds row. Does not
+    commit; returns None if there are not enough seats."""
+    if not reserve_tickets(db, hold.ticket_type_id, hold.quantity, booked=False):
+        return None
+    db_hold = _new_hold(hold)
+    db.add(db_hold)
+    return db_hold
+
+async def place_hold_async(db: AsyncSession, hold):
+    """place_hold for an AsyncSession."""
+    if not await reserve_tickets_async(db, hold.ticket_type_id, hold.quantity, booked=False):
+        return None
+    db_hold = _new_hold(hold)
+    db.add(db_hold)
+    return db_hold
+
+def _take(hold_id: int, live_only: bool):
+    statement = delete(SeatHold).where(SeatHold.id == hold_id)
+    if live_only:
+        statement = statement.where(SeatHold.expires_at > datetime.utcnow())
+    return statement.returning(*SeatHold.__table__.c).execution_options(synchronize_session=False)
+
+def take_hold(db: Session, hold_id: int, live_only: bool = True):
+    """Delete a hold and return its columns, or None if there is no such hold
+    (or, with `live_only`, it has expired). Does not commit."""
+    return db.execute(_take(hold_id, live_only)).first()
+
+async def take_hold_async(db: AsyncSession, hold_id: int, live_only: bool = True):
+    """take_hold for an AsyncSession."""
+    return (await db.execute(_take(hold_id, live_only))).first()
+
+class HoldManager:
+    def __init__(self, session_factory=None, batch_size=None):
+        self.batch_size = batch_size or config.HOLD_SWEEP_BATCH
+        self._heap = []
+        self._lock = threading.Lock()
+        self._session_factory = session_factory
+        self._task = None
+        self._loop = None
+        self._wakeup = None
+        self._last_sweep = 0.0
+        self.released_holds = 0
+        self.sweeps = 0
+
+    def track(self, hold_id: int, expires_at: datetime):
+        """Schedule a new hold's release (call after commit)."""
+        with self._lock:
+            heapq.heappush(self._heap, (expires_at, hold_id))
+            earliest = self._heap[0][1] == hold_id
+        # Holds placed from request threads: wake the sweeper if this one is now due first
+        if earliest and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def next_expiry(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now):
+        with self._lock:
+            due = 0
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+                due += 1
+            return due
+
+    def sweep(self, now=None):
+        """Release every hold that expired by `now`; returns how many were released."""
+        now = now or datetime.utcnow()
+        released = 0
+        while True:
+            db = self._session_factory()
+            try:
+                due = select(SeatHold.id).where(SeatHold.expires_at <= now).order_by(SeatHold.expires_at).limit(self.batch_size)
+                rows = db.execute(
+                    delete(SeatHold).where(SeatHold.id.in_(due))
+                    .returning(SeatHold.ticket_type_id, SeatHold.quantity)
+                    .execution_options(synchronize_session=False)
+                ).all()
+                seats = defaultdict(int)
+                for row in rows:
+                    seats[row.ticket_type_id] += row.quantity
+                for ticket_type_id, quantity in seats.items():
+                    release_tickets(db, ticket_type_id, quantity, booked=False)
+                db.commit()
+            finally:
+                db.close()
+            for ticket_type_id in seats:
+                ticket_type_cache.invalidate(ticket_type_id)
+            released += len(rows)
+            if len(rows) < self.batch_size:
+                break
+        self._pop_due(now)
+        with self._lock:
+            self.released_holds += released
+            self.sweeps += 1
+        return released
+
+    async def _run(self, interval):
+        loop = asyncio.get_running_loop()
+        while True:
+            next_expiry = self.next_expiry()
+            delay = interval - (time.monotonic() - self._last_sweep)
+            if next_expiry is not None:
+                delay = min(delay, (next_expiry - datetime.utcnow()).total_seconds())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(delay, 0))
+                self._wakeup.clear()
+                continue
+            except asyncio.TimeoutError:
+                pass
+            # Sweep when one of our holds is due, and every `interval` for everyone else's
+            if not self._pop_due(datetime.utcnow()) and time.monotonic() - self._last_sweep < interval:
+                continue
+            self._last_sweep = time.monotonic()
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception:
+                logger.exception("Error releasing expired holds")
+
+    def start(self, session_factory, interval):
+        """Schedule the existing holds and start the sweeper on the running event loop."""
+        self._session_factory = session_factory
+        db = session_factory()
+        try:
+            holds = [(row.expires_at, row.id) for row in db.query(SeatHold.id, SeatHold.expires_at)]
+        finally:
+            db.close()
+        with self._lock:
+            self._heap = holds
+            heapq.heapify(self._heap)
+        self._last_sweep = 0.0
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run(interval))
+
+    async def stop(self):
+        """Stop the sweeper."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+
+    def stats(self):
+        with self._lock:
+            return {"scheduled": len(self._heap), "released_holds": self.released_holds, "sweeps": self.sweeps}
+
+hold_manager = HoldManager()
@@ -0,0 +1,97 @@
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import config
+from app.models.models import TicketType
+from app.utils.availability_cache import availability_cache
+from app.utils.counters import bump_counters, bump_counters_async
+
+# TicketType.quantity_available is the number of seats still on sale. Seats are
+# taken and given back with a single conditional UPDATE, so concurrent bookings
+# can never drive the counter below zero. None of these functions commit: the
+# caller commits the inventory change together with the booking row.
+# Quantities must be positive: a negative one would run the UPDATE backwards
+# and put seats on sale that never existed, so both raise ValueError instead.
+#
+# Both also move the booked/available seat counters behind the stats endpoint;
+# seats taken for a hold (booked=False) only leave the available count.
+#
+# With AVAILABILITY_CACHE_ENABLED the same calls go to the in-process
+# availability cache, which follows the caller's commit or rollback.
+
+def _check_quantity(quantity: int):
+    if quantity <= 0:
+        raise ValueError(f"Seat quantity must be positive, got {quantity}")
+
+def _take_seats(ticket_type_id: int, quantity: int):
+    return (
+        update(TicketType)
+        .where(TicketType.id == ticket_type_id, TicketType.quantity_available >= quantity)
+        .values(quantity_available=TicketType.quantity_available - quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+def _give_seats(ticket_type_id: int, quantity: int):
+    return (
+        update(TicketType)
+        .where(TicketType.id == ticket_type_id)
+        .values(quantity_available=TicketType.quantity_available + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+def reserve_tickets(db: Session, ticket_type_id: int, quantity: int, booked: bool = True):
+    """Atomically take `quantity` seats from a ticket type.
+
+    Returns False (and changes nothing) if fewer seats are left.
+    """
+    _check_quantity(quantity)
+    if config.AVAILABILITY_CACHE_ENABLED:
+        reserved = availability_cache.reserve(db, ticket_type_id, quantity)
+    else:
+        reserved = db.execute(_take_seats(ticket_type_id, quantity)).rowcount == 1
+    if reserved:
+        bump_counters(db, booked_tickets=quantity if booked else 0, available_tickets=-quantity)
+    return reserved
+
+def release_tickets(db: Session, ticket_type_id: int, quantity: int, booked: bool = True):
+    """Return `quantity` seats to a ticket type's available pool."""
+    _check_quantity(quantity)
+    if config.AVAILABILITY_CACHE_ENABLED:
+        released = availability_cache.release(db, ticket_type_id, quantity)
+    else:
+        released = db.execute(_give_seats(ticket_type_id, quantity)).rowcount == 1
+    if released:
+        bump_counters(db, booked_tickets=-quantity if booked else 0, available_tickets=quantity)
+    return released
+
+# AsyncSession versions for the async routers. The availability cache loads
+# ticket types through a sync Session, so with it enabled they run the sync
+# versions on the request's connection through run_sync.
+
+async def reserve_tickets_async(db: AsyncSession, ticket_type_id: int, quantity: int, booked: bool = True):
+    """reserve_tickets for an AsyncSession."""
+    _check_quantity(quantity)
+    if config.AVAILABILITY_CACHE_ENABLED:
+        return await db.run_sync(reserve_tickets, ticket_type_id, quantity, booked)
+    reserved = (await db.execute(_take_seats(ticket_type_id, quantity))).rowcount == 1
+    if reserved:
+        await bump_counters_async(db, booked_tickets=quantity if booked else 0, available_tickets=-quantity)
+    return reserved
+
+async def release_tickets_async(db: AsyncSession, ticket_type_id: int, quantity: int, booked: bool = True):
+    """release_tickets for an AsyncSession."""
+    _check_quantity(quantity)
+    if config.AVAILABILITY_CACHE_ENABLED:
+        return await db.run_sync(release_tickets, ticket_type_id, quantity, booked)
+    released = (await db.execute(_give_seats(ticket_type_id, quantity))).rowcount == 1
+    if released:
+        await bump_counters_async(db, booked_tickets=-quantity if booked else 0, available_tickets=quantity)
+    return released
+
+def seats_available(ticket_type: TicketType):
+    """Seats still on sale for a loaded ticket type."""
+    if config.AVAILABILITY_CACHE_ENABLED:
+        cached = availability_cache.get(ticket_type.id)
+        if cached is not None:
+            return cached
+    return ticket_type.quantity_available
@@ -0,0 +1,55 @@
+import base64
+import json
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# List endpoints page either by offset (`skip`) or by keyset (`after`).
+#
+# Both modes order by primary key. Whenever a page comes back full, the
+# response carries an opaque cursor for the last row in the X-Next-Cursor
+# header; passing it back as `after` continues with an indexed range scan
+# instead of skipping rows, so deep pages cost the same as the first one and
+# stay stable while new rows are inserted.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(last_id: int):
+    """Encode the primary key of the last row on a page as an opaque token."""
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Return the primary key stored in a cursor, or raise a 400 error."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+def _page(query, key_column, skip: int = 0, after: str = None):
+    # Works on ORM queries and select() statements alike
+    query = query.order_by(key_column)
+    if after is not None:
+        return query.filter(key_column > decode_cursor(after))
+    if skip:
+        return query.offset(skip)
+    return query
+
+def _set_next_cursor(rows, key_column, response: Response, limit: int):
+    if limit > 0 and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(rows[-1], key_column.key))
+
+def paginate(query, key_column, response: Response, skip: int = 0, limit: int = 100, after: str = None):
+    """Return one page of `query` ordered by `key_column` and set the next cursor."""
+    rows = _page(query, key_column, skip, after).limit(limit).all()
+    _set_next_cursor(rows, key_column, response, limit)
+    return rows
+
+async def paginate_async(db: AsyncSession, statement, key_column, response: Response, skip: int = 0, limit: int = 100, after: str = None):
+    """paginate for a select() of ORM entities run on an AsyncSession."""
+    rows = (await db.scalars(_page(statement, key_column, skip, after).limit(limit))).all()
+    _set_next_cursor(rows, key_column, response, limit)
+    return rows
@@ -0,0 +1,140 @@
+import secrets
+from itertools import chain
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Response
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import config
+from app.database.database import get_db, get_async_db
+from app.models.models import TableVersion
+
+# Version-based ETags for conditional GETs.
+#
+# table_versions keeps a write version for each table in VERSIONED_TABLES.
+# A committed Session that wrote to one of them, through the unit of work
+# (add/delete/dirty objects) or an insert/update/delete statement, bumps its
+# version in the same transaction, so every server process sees the same
+# versions. A GET route tagged with Depends(conditional_get("events", "venues"))
+# reads them with one query, sends them as its ETag and answers a request
+# whose If-None-Match still matches with 304 before the handler runs.
+#
+# Only rarely written tables are versioned: a version row is a lock every
+# writer of its table queues on. Routes over hot tables pass `version`, a
+# function computing the tag from the data instead (the stats route uses the
+# counter totals themselves).
+#
+# The ETag is read in the same transaction as the body, before the handler
+# queries, so it is never newer than the body it is sent with. A table's
+# first version is random, so a recreated database does not repeat tags.
+
+VERSIONED_TABLES = {"events", "venues"}
+
+_SESSION_KEY = "table_versions_written"
+
+def _record_tables(session, tables):
+    tables = VERSIONED_TABLES.intersection(tables)
+    if tables:
+        session.info.setdefault(_SESSION_KEY, set()).update(tables)
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_tables(session, flush_context):
+    # new/dirty/deleted still describe what was just flushed
+    _record_tables(session, {instance.__table__.name for instance in chain(session.new, session.dirty, session.deleted)})
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_statement_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _record_tables(orm_execute_state.session, {orm_execute_state.statement.table.name})
+
+@event.listens_for(Session, "before_commit")
+def _bump_written_tables(session):
+    # Flush now so the versions also cover what the commit would flush
+    session.flush()
+    tables = session.info.pop(_SESSION_KEY, None)
+    if tables:
+        bump_versions(session.connection(), tables)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_rolled_back_tables(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_SESSION_KEY, None)
+
+def bump_versions(connection, tables):
+    """Bump the versions of `tables` in the connection's transaction."""
+    upsert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+    statement = upsert(TableVersion)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TableVersion.name],
+        set_={"version": TableVersion.version + 1}
+    )
+    # In name order, so two writers lock the rows in the same order
+    connection.execute(statement, [
+        {"name": table, "version": secrets.randbelow(2**31)} for table in sorted(tables)
+    ])
+
+def _versions(tables):
+    return select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(tables))
+
+def read_versions(db: Session, tables):
+    """Return {table: version} for `tables`; 0 for tables never written."""
+    versions = dict(db.execute(_versions(tables)).all())
+    return {table: versions.get(table, 0) for table in tables}
+
+async def read_versions_async(db: AsyncSession, tables):
+    """read_versions for an AsyncSession."""
+    versions = dict((await db.execute(_versions(tables))).all())
+    return {table: versions.get(table, 0) for table in tables}
+
+def _matches(etag: str, if_none_match: str):
+    # If-None-Match uses weak comparison, so W/"x" and "x" are the same tag
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in tags]
+
+def _check_tables(tables):
+    unversioned = set(tables) - VERSIONED_TABLES
+    if unversioned:
+        raise ValueError(f"Tables without write versions: {', '.join(sorted(unversioned))}")
+
+def _send_tag(tag, response: Response, if_none_match: Optional[str]):
+    etag = f'W/"{tag}"'
+    # no-cache: browsers keep the body but revalidate it on every request
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and _matches(etag, if_none_match):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+def conditional_get(*tables: str, version=None):
+    """Dependency that tags the response with the versions of `tables` (or
+    `version(db)`) and raises 304 Not Modified when the client already holds
+    that version."""
+    _check_tables(tables)
+
+    def check(response: Response, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+        if not config.ETAGS_ENABLED:
+            return
+        if version is not None:
+            tag = version(db)
+        else:
+            versions = read_versions(db, tables)
+            tag = ".".join(str(versions[table]) for table in tables)
+        _send_tag(tag, response, if_none_match)
+    return check
+
+def conditional_get_async(*tables: str, version=None):
+    """conditional_get for the async routers; `version` is a coroutine
+    function taking the AsyncSession."""
+    _check_tables(tables)
+
+    async def check(response: Response, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+        if not config.ETAGS_ENABLED:
+            return
+        if version is not None:
+            tag = await version(db)
+        else:
+            versions = await read_versions_async(db, tables)
+            tag = ".".join(str(versions[table]) for table in tables)
+        _send_tag(tag, response, if_none_match)
+    return check
@@ -0,0 +1,197 @@
+import math
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from fastapi import HTTPException
+from app import config
+
+# Waiting room for on-sale spikes.
+#
+# When a popular event goes on sale every buyer posts a booking at once and
+# the writers queue on SQLite's lock, each one sleeping in the busy handler,
+# so fewer bookings get through than when the load is lower. An event with an
+# open waiting room takes bookings only from buyers who have been admitted:
+# a buyer first asks for a queue token, polls it until it is admitted and
+# then sends it with the booking (or hold) as the X-Queue-Token header. A
+# token is used up by the booking it admits, whether it is accepted or
+# rejected (sold out, bad request); only a server-side failure (a 5xx, a
+# database error) gives it back for a retry.
+#
+# Admission is a token bucket per event: the bucket fills at admit_per_second
+# up to `burst`, and each unit admits the next token in the queue. The bucket
+# is brought up to date whenever the room is looked at, so there is no
+# scheduler task; tokens are numbered in the order they were issued and a
+# token is admitted once the room has admitted that many.
+#
+# Rooms and tokens live in this process. Run a single server process for an
+# event behind a waiting room, as with the availability cache.
+
+class WaitingRoom:
+    """Queue tokens and admissions for the events behind a waiting room."""
+
+    def __init__(self, clock=time.monotonic, token_ttl=None):
+        self.token_ttl = token_ttl or config.WAITING_ROOM_TOKEN_TTL
+        self._clock = clock
+        self._lock = threading.Lock()
+        # event id -> _Room
+        self._rooms = {}
+        # token -> (event id, queue number, expires at), in issue order
+        self._tokens = OrderedDict()
+
+    def open(self, event_id: int, admit_per_second: float, burst: int = None):
+        """Put an event behind a waiting room, or change its admission rate."""
+        if admit_per_second <= 0:
+            raise ValueError("admit_per_second must be positive")
+        burst = burst or config.WAITING_ROOM_BURST
+        now = self._clock()
+        with self._lock:
+            room = self._rooms.get(event_id)
+            if room is None:
+                self._rooms[event_id] = _Room(admit_per_second, burst, now)
+            else:
+                # Admit at the old rate up to now, and at the new one from here on
+                room.advance(now)
+                room.rate, room.burst = admit_per_second, burst
+                room.bucket = min(room.bucket, burst)
+
+    def close(self, event_id: int):
+        """Take an event out of the waiting room; returns whether it had one."""
+        with self._lock:
+            return self._rooms.pop(event_id, None) is not None
+
+    def is_open(self, event_id: int):
+        return event_id in self._rooms
+
+    def room(self, event_id: int):
+        """Return an event's room settings and queue length, or None."""
+        with self._lock:
+            room = self._rooms.get(event_id)
+            if room is None:
+                return None
+            room.advance(self._clock())
+            return {
+                "event_id": event_id,
+                "admit_per_second": room.rate,
+                "burst": room.burst,
+                "waiting": room.issued - room.admitted,
+            }
+
+    def join(self, event_id: int):
+        """Issue a queue token for an event; returns its status, or None if
+        the event has no waiting room."""
+        token = secrets.token_urlsafe(16)
+        now = self._clock()
+        with self._lock:
+            room = self._rooms.get(event_id)
+            if room is None:
+                return None
+            self._expire(now)
+            self._tokens[token] = (event_id, room.issued, now + self.token_ttl)
+            room.issued += 1
+            return self._status(token, now)
+
+    def status(self, token: str):
+        """Return a token's place in its queue, or None if it is unknown,
+        used, expired or its room has closed."""
+        now = self._clock()
+        with self._lock:
+            return self._status(token, now)
+
+    @contextmanager
+    def admission(self, event_id: int, token):
+        """Use up an admitted token for a booking on `event_id`, giving it
+        back if the block fails on the server's side (an HTTPException with
+        a 5xx status or any other exception, e.g. OperationalError) so the
+        buyer can try again with it. A 4xx answer uses the token up.
+
+        Does nothing for events without a waiting room. Raises 403 when the
+        token is missing or not valid for the event, and 429 with a
+        Retry-After header while it is still waiting.
+        """
+        if event_id not in self._rooms:
+            yield
+            return
+        now = self._clock()
+        with self._lock:
+            status = self._status(token, now) if isinstance(token, str) else None
+            if status is None or status["event_id"] != event_id:
+                raise HTTPException(status_code=403, detail="This event needs an admitted queue token (X-Queue-Token)")
+            if not status["admitted"]:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Queue token not admitted yet; position {status['position']}",
+                    headers={"Retry-After": str(math.ceil(status["retry_after"]))}
+                )
+            entry = self._tokens.pop(token)
+        try:
+            yield
+        except HTTPException as e:
+            if e.status_code >= 500:
+                self._give_back(token, entry)
+            raise
+        except BaseException:
+            self._give_back(token, entry)
+            raise
+
+    def _give_back(self, token, entry):
+        with self._lock:
+            self._tokens[token] = entry
+
+    def reset(self):
+        with self._lock:
+            self._rooms.clear()
+            self._tokens.clear()
+
+    def _status(self, token, now):
+        entry = self._tokens.get(token)
+        if entry is None:
+            return None
+        event_id, number, expires_at = entry
+        room = self._rooms.get(event_id)
+        if room is None or expires_at <= now:
+            del self._tokens[token]
+            return None
+        room.advance(now)
+        position = max(0, number - room.admitted + 1)
+        return {
+            "token": token,
+            "event_id": event_id,
+            "admitted": position == 0,
+            "position": position,
+            # When the bucket will have admitted everyone up to this token
+            "retry_after": max(0.0, (position - room.bucket) / room.rate),
+        }
+
+    def _expire(self, now):
+        # Tokens are kept in issue order, so the expired ones are at the front
+        # (a token given back goes to the end; _status drops it if it expired)
+        while self._tokens:
+            token, (_, _, expires_at) = next(iter(self._tokens.items()))
+            if expires_at > now:
+                break
+            del self._tokens[token]
+
+class _Room:
+    __slots__ = ("rate", "burst", "bucket", "updated", "issued", "admitted")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.bucket = float(burst)
+        self.updated = now
+        # Tokens issued and admitted so far; tokens numbered below `admitted` are in
+        self.issued = 0
+        self.admitted = 0
+
+    def advance(self, now):
+        self.bucket = min(self.burst, self.bucket + (now - self.updated) * self.rate)
+        self.updated = now
+        admit = min(int(self.bucket), self.issued - self.admitted)
+        self.admitted += admit
+        self.bucket -= admit
+
+waiting_room = WaitingRoom()
+for _event_id in config.WAITING_ROOM_EVENTS:
+    waiting_room.open(_event_id, config.WAITING_ROOM_RATE, config.WAITING_ROOM_BURST)
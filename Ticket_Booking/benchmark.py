@@ -0,0 +1,1958 @@
+"""Load tests for the Ticket Booking backend.
+
+Each scenario runs against a throwaway SQLite database so it never touches
+ticket_booking.db. Run a scenario with:
+
+    python benchmark.py inventory --threads 16 --capacity 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, event as sqlalchemy_event, func, insert, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app import config
+from app.database.database import Base, get_db, get_async_db
+from app.database.engines import create_database_engine
+from app.database.init_db import create_tables
+from app.database.loaders import load_for
+from app.database import search
+from app.database.sqlite import create_sqlite_engine, create_async_sqlite_engine
+from app.models.models import Venue, Event, TicketType, Booking, BookingStatus, SeatHold, WorkerIdLease
+from app.schemas.schemas import BookingCreate, BookingStatusUpdate, BookingWithDetails, EventWithVenue
+from app.schemas.schemas import Venue as VenueSchema, TicketType as TicketTypeSchema, serializer
+from app.routers import bookings, events, holds, venues, ticket_types, stats, waiting_room
+from app.routers.aio import bookings as async_bookings, events as async_events, holds as async_holds
+from app.routers.aio import venues as async_venues, ticket_types as async_ticket_types
+from app.routers.aio import stats as async_stats, waiting_room as async_waiting_room
+from app.utils.availability_cache import availability_cache
+from app.utils.booking_writer import BookingWriter, booking_writer, create_bookings
+from app.utils import confirmation_codes
+from app.utils.cache import MemoryBackend, NullBackend, RedisBackend, clear_caches, set_default_backend
+from app.utils.counters import reconcile_counters
+from app.utils.fast_json import make_fast_json_router
+from app.utils.holds import HoldManager, hold_manager
+from app.utils.pagination import encode_cursor
+
+
+def make_session_factory(tuned=False, pragmas=None, search_index=True, **engine_options):
+    """Create an empty database in a temporary file and return a sessionmaker.
+
+    With `tuned` the engine comes from the app's SQLite factory (WAL, pragmas,
+    pool), with `pragmas` overriding the configured ones; otherwise it is a
+    bare engine with SQLite's defaults. The schema is the one run.py creates,
+    search index triggers included, so writes cost what they cost in the app;
+    `search_index=False` leaves the index out.
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="ticket_booking_bench_"), "bench.db")
+    if tuned:
+        engine = create_sqlite_engine(f"sqlite:///{path}", pragmas={**config.SQLITE_PRAGMAS, **(pragmas or {})},
+                                      pool="queue", **engine_options)
+    else:
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, **engine_options)
+    if search_index:
+        create_tables(engine)
+    else:
+        Base.metadata.create_all(bind=engine)
+    # Cached responses belong to the previous scenario's database
+    clear_caches()
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def add_hot_ticket_type(SessionLocal, capacity):
+    """Add one venue, event and ticket type with `capacity` seats; return their ids."""
+    db = SessionLocal()
+    try:
+        venue = Venue(name="Bench Arena", location="Bench", capacity=capacity)
+        db.add(venue)
+        db.flush()
+        event = Event(name="On-sale", date=datetime.now() + timedelta(days=30), venue_id=venue.id)
+        db.add(event)
+        db.flush()
+        ticket_type = TicketType(name="GA", price=50.0, quantity_available=capacity, event_id=event.id)
+        db.add(ticket_type)
+        db.commit()
+        reconcile_counters(db)
+        db.commit()
+        return event.id, ticket_type.id
+    finally:
+        db.close()
+
+
+def check_counters(SessionLocal):
+    """Fail if the stats counters drifted from the tables during the run."""
+    db = SessionLocal()
+    try:
+        drift = reconcile_counters(db)
+        db.commit()
+    finally:
+        db.close()
+    assert not drift, f"stats counters drifted: {drift}"
+
+
+def run_concurrently(threads, attempts, task):
+    """Call `task()` `attempts` times from `threads` threads.
+
+    `task` returns an outcome label; returns (outcome counts, latencies, elapsed).
+    """
+    counts = {}
+    latencies = []
+    lock = threading.Lock()
+    remaining = iter(range(attempts))
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            outcome = task()
+            latency = time.perf_counter() - start
+            with lock:
+                counts[outcome] = counts.get(outcome, 0) + 1
+                latencies.append(latency)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return counts, latencies, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def book_one(SessionLocal, event_id, ticket_type_id):
+    """Return a task that books one seat through the bookings router."""
+    def task():
+        db = SessionLocal()
+        try:
+            bookings.create_booking(
+                BookingCreate(user_name="bench", user_email="bench@example.com",
+                              quantity=1, event_id=event_id, ticket_type_id=ticket_type_id),
+                db=db
+            )
+            return "booked"
+        except HTTPException:
+            return "rejected"
+        except Exception:
+            db.rollback()
+            return "errors"
+        finally:
+            db.close()
+    return task
+
+
+def seats_left(SessionLocal, ticket_type_id):
+    """Return (seats sold to live bookings, quantity_available) for a ticket type."""
+    db = SessionLocal()
+    try:
+        remaining = db.query(TicketType.quantity_available).filter(TicketType.id == ticket_type_id).scalar()
+        sold = db.query(func.sum(Booking.quantity)).filter(
+            Booking.ticket_type_id == ticket_type_id,
+            Booking.status != BookingStatus.CANCELLED
+        ).scalar() or 0
+        return sold, remaining
+    finally:
+        db.close()
+
+
+def run_inventory(args):
+    """Hammer one ticket type with concurrent bookings and check nothing is oversold."""
+    SessionLocal = make_session_factory()
+    event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.capacity)
+    attempts = args.capacity * args.oversubscribe
+    counts, _, elapsed = run_concurrently(args.threads, attempts, book_one(SessionLocal, event_id, ticket_type_id))
+    sold, remaining = seats_left(SessionLocal, ticket_type_id)
+
+    print(f"attempts={attempts} threads={args.threads} elapsed={elapsed:.2f}s")
+    print(f"booked={counts.get('booked', 0)} rejected={counts.get('rejected', 0)} errors={counts.get('errors', 0)}")
+    print(f"throughput={counts.get('booked', 0) / elapsed:.0f} bookings/s")
+    print(f"capacity={args.capacity} sold={sold} remaining={remaining}")
+    assert sold + remaining == args.capacity, "inventory drifted"
+    assert sold <= args.capacity, "oversold"
+    check_counters(SessionLocal)
+    check_quantity_validation()
+
+
+def check_quantity_validation():
+    """A booking for zero or fewer seats is rejected with the same 400 on
+    every path, and never puts seats back on sale."""
+    SessionLocal = make_session_factory(tuned=True)
+    event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, 10)
+    app = build_app(SessionLocal)
+
+    def booking(quantity):
+        return {"user_name": "bench", "user_email": "bench@example.com", "quantity": quantity,
+                "event_id": event_id, "ticket_type_id": ticket_type_id}
+
+    async def requests():
+        answers = {}
+        for quantity in (0, -5):
+            answers[f"POST /bookings quantity={quantity}"] = await asgi_json(app, "POST", "/bookings/", booking(quantity))
+            _, results = await asgi_json(app, "POST", "/bookings/bulk", [booking(quantity)])
+            answers[f"POST /bookings/bulk quantity={quantity}"] = (results[0]["status_code"], {"detail": results[0]["error"]})
+            answers[f"POST /holds quantity={quantity}"] = await asgi_json(app, "POST", "/holds/", booking(quantity))
+            booking_writer.start(SessionLocal, window=0)
+            try:
+                answers[f"POST /bookings quantity={quantity}, group commit"] = await asgi_json(app, "POST", "/bookings/", booking(quantity))
+            finally:
+                booking_writer.stop()
+        status_code, created = await asgi_json(app, "POST", "/bookings/", booking(2))
+        assert status_code == 201, created
+        answers["PUT /bookings quantity=-5"] = await asgi_json(app, "PUT", f"/bookings/{created['id']}", {"quantity": -5})
+        return answers
+
+    for request, answer in asyncio.run(requests()).items():
+        assert answer == (400, {"detail": "Quantity must be positive"}), f"{request}: {answer}"
+    sold, remaining = seats_left(SessionLocal, ticket_type_id)
+    assert (sold, remaining) == (2, 8), f"seats moved: {sold} sold, {remaining} available"
+    check_counters(SessionLocal)
+    print("bookings, bulk items, group commit, holds and updates all reject quantities below 1 with 400")
+
+
+def backend_session_factory(url):
+    """Return (sessionmaker, cleanup) for the backend check.
+
+    Uses `url` if given, else a throwaway PostgreSQL from testing.postgresql
+    when it (and the pg binaries) are installed, else a temporary SQLite file.
+    The schema is dropped and recreated, so never point `url` at real data.
+    """
+    cleanup = lambda: None
+    if url is None:
+        try:
+            import testing.postgresql
+            postgresql = testing.postgresql.Postgresql()
+            url, cleanup = postgresql.url(), postgresql.stop
+        except Exception:
+            path = os.path.join(tempfile.mkdtemp(prefix="ticket_booking_bench_"), "bench.db")
+            url = f"sqlite:///{path}"
+    engine = create_database_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    clear_caches()
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine), cleanup
+
+
+def run_backend(args):
+    """Check the booking paths against the configured backend under concurrency.
+
+    Many threads book the same ticket type (no overselling), then cancel the
+    same bookings at the same time (seats are released exactly once).
+    """
+    SessionLocal, cleanup = backend_session_factory(args.url)
+    try:
+        print(f"backend: {SessionLocal.kw['bind'].url.render_as_string(hide_password=True)}")
+        event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.capacity)
+        counts, _, elapsed = run_concurrently(args.threads, args.capacity * 2, book_one(SessionLocal, event_id, ticket_type_id))
+        sold, remaining = seats_left(SessionLocal, ticket_type_id)
+        print(f"booking:   {counts} elapsed={elapsed:.2f}s sold={sold} remaining={remaining}")
+        assert sold == args.capacity and remaining == 0, "inventory drifted"
+
+        db = SessionLocal()
+        try:
+            booking_ids = [row.id for row in db.query(Booking.id).filter(Booking.ticket_type_id == ticket_type_id)]
+        finally:
+            db.close()
+        cancels = iter([booking_id for booking_id in booking_ids for _ in range(args.cancels_per_booking)])
+        lock = threading.Lock()
+
+        def cancel():
+            with lock:
+                booking_id = next(cancels)
+            db = SessionLocal()
+            try:
+                bookings.update_booking_status(booking_id, BookingStatusUpdate(status=BookingStatus.CANCELLED), db)
+                return "cancelled"
+            except Exception:
+                db.rollback()
+                return "errors"
+            finally:
+                db.close()
+
+        counts, _, elapsed = run_concurrently(args.threads, len(booking_ids) * args.cancels_per_booking, cancel)
+        sold, remaining = seats_left(SessionLocal, ticket_type_id)
+        print(f"cancelling: {counts} elapsed={elapsed:.2f}s sold={sold} remaining={remaining}")
+        assert sold == 0 and remaining == args.capacity, "seats released more than once"
+        check_counters(SessionLocal)
+        print("ok")
+    finally:
+        cleanup()
+
+
+def run_availability(args):
+    """Compare request latency with the availability cache off and on.
+
+    The workload mixes bookings on a hot ticket type with availability reads.
+    """
+    for enabled in (False, True):
+        SessionLocal = make_session_factory()
+        event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.capacity)
+        config.AVAILABILITY_CACHE_ENABLED = enabled
+        if enabled:
+            availability_cache.start(SessionLocal, config.AVAILABILITY_FLUSH_INTERVAL)
+        book = book_one(SessionLocal, event_id, ticket_type_id)
+
+        def read_availability():
+            db = SessionLocal()
+            try:
+                events.get_available_tickets(event_id, db)
+                return "read"
+            finally:
+                db.close()
+
+        def task():
+            if random.random() < args.read_ratio:
+                return read_availability()
+            return book()
+
+        try:
+            counts, latencies, elapsed = run_concurrently(args.threads, args.requests, task)
+            check_counters(SessionLocal)
+        finally:
+            if enabled:
+                availability_cache.stop()
+                config.AVAILABILITY_CACHE_ENABLED = False
+        sold, remaining = seats_left(SessionLocal, ticket_type_id)
+
+        label = "cache" if enabled else "database"
+        print(f"[{label}] requests={args.requests} elapsed={elapsed:.2f}s {counts}")
+        print(f"[{label}] p50={percentile(latencies, 50) * 1000:.2f}ms "
+              f"p99={percentile(latencies, 99) * 1000:.2f}ms "
+              f"throughput={len(latencies) / elapsed:.0f} req/s")
+        assert sold + remaining == args.capacity, "inventory drifted"
+
+
+def run_bulk(args):
+    """Compare POST /bookings/ one item at a time with POST /bookings/bulk."""
+    runs = [("single", None)] + [(f"bulk/{size}", size) for size in args.batch_sizes]
+    for label, batch_size in runs:
+        SessionLocal = make_session_factory()
+        event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.items)
+        items = [BookingCreate(user_name="bench", user_email="bench@example.com",
+                               quantity=1, event_id=event_id, ticket_type_id=ticket_type_id)
+                 for _ in range(args.items)]
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            if batch_size is None:
+                for item in items:
+                    bookings.create_booking(item, db=db)
+            else:
+                for offset in range(0, len(items), batch_size):
+                    results = bookings.create_bookings_bulk(items[offset:offset + batch_size], db)
+                    assert all(result.get("booking") for result in results), "bulk items rejected"
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+        sold, remaining = seats_left(SessionLocal, ticket_type_id)
+        print(f"{label:<11} items={len(items)} elapsed={elapsed:.2f}s throughput={len(items) / elapsed:.0f} bookings/s")
+        assert sold == args.items and remaining == 0, "inventory drifted"
+        check_counters(SessionLocal)
+
+
+def run_mixed(args):
+    """Compare SQLite's defaults with the tuned engine under mixed reads and writes.
+
+    Readers fetch availability and revenue of random events while writers book
+    seats; a --write-ratio share of requests are bookings.
+    """
+    for tuned in (False, True):
+        SessionLocal = make_session_factory(tuned=tuned)
+        add_catalog(SessionLocal, venues=5, events_per_venue=20, bookings_per_event=200)
+        event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.requests)
+        book = book_one(SessionLocal, event_id, ticket_type_id)
+        latencies = {"read": [], "write": []}
+
+        def read():
+            db = SessionLocal()
+            try:
+                catalog_event_id = random.randint(1, 100)
+                events.get_available_tickets(catalog_event_id, db)
+                events.get_event_revenue(catalog_event_id, db)
+                return "read"
+            except Exception:
+                return "errors"
+            finally:
+                db.close()
+
+        def task():
+            kind = "write" if random.random() < args.write_ratio else "read"
+            start = time.perf_counter()
+            outcome = book() if kind == "write" else read()
+            latencies[kind].append(time.perf_counter() - start)
+            return outcome
+
+        counts, all_latencies, elapsed = run_concurrently(args.threads, args.requests, task)
+        label = "tuned" if tuned else "default"
+        print(f"[{label}] requests={args.requests} threads={args.threads} elapsed={elapsed:.2f}s {counts}")
+        print(f"[{label}] throughput={len(all_latencies) / elapsed:.0f} req/s")
+        for kind, values in latencies.items():
+            if values:
+                print(f"[{label}] {kind:<5} p50={percentile(values, 50) * 1000:.2f}ms "
+                      f"p99={percentile(values, 99) * 1000:.2f}ms")
+        check_counters(SessionLocal)
+
+
+def add_catalog(SessionLocal, venues, events_per_venue, bookings_per_event):
+    """Fill the database with venues, events, two ticket types per event and bookings."""
+    db = SessionLocal()
+    try:
+        db.execute(insert(Venue), [
+            {"name": f"Venue {v}", "location": "Bench", "capacity": 10000}
+            for v in range(venues)
+        ])
+        event_rows = [
+            {"name": f"Event {v}-{e}", "date": datetime.now() + timedelta(days=e), "venue_id": v + 1}
+            for v in range(venues) for e in range(events_per_venue)
+        ]
+        db.execute(insert(Event), event_rows)
+        db.execute(insert(TicketType), [
+            {"name": name, "price": price, "quantity_available": 1000, "event_id": event_id}
+            for event_id in range(1, len(event_rows) + 1)
+            for name, price in (("VIP", 150.0), ("Standard", 75.0))
+        ])
+        db.execute(insert(Booking), [
+            {"user_name": f"user {event_id}-{b}", "user_email": f"user{event_id}-{b}@example.com",
+             "quantity": 1, "total_price": 75.0, "booking_date": datetime.now(),
+             "status": BookingStatus.CONFIRMED, "confirmation_code": f"B{event_id:05d}{b:06d}",
+             "event_id": event_id, "ticket_type_id": event_id * 2}
+            for event_id in range(1, len(event_rows) + 1) for b in range(bookings_per_event)
+        ])
+        db.commit()
+        reconcile_counters(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_queries(args):
+    """Count the SQL statements each list endpoint issues as the page size grows.
+
+    Responses are serialized through their response_model the same way
+    FastAPI does, so lazy relationship loads are included in the count.
+    """
+    SessionLocal = make_session_factory()
+    add_catalog(SessionLocal, venues=5, events_per_venue=20, bookings_per_event=20)
+    db = SessionLocal()
+    try:
+        # Looked up once per engine, so keep it out of the per-page counts
+        search.has_search_index(db)
+    finally:
+        db.close()
+    statements = []
+    sqlalchemy_event.listen(SessionLocal.kw["bind"], "before_cursor_execute",
+                            lambda *_: statements.append(1))
+
+    endpoints = {
+        "GET /bookings/": (lambda db, n: bookings.get_bookings(Response(), skip=0, limit=n, after=None, db=db), List[BookingWithDetails]),
+        "GET /bookings/search": (lambda db, n: bookings.search_bookings(q=None, event="Event", venue=None, ticket_type=None, skip=0, limit=n, db=db),
+                                 List[BookingWithDetails]),
+        "GET /events/": (lambda db, n: events.get_events(Response(), skip=0, limit=n, after=None, db=db), List[EventWithVenue]),
+        "GET /venues/": (lambda db, n: venues.get_venues(Response(), skip=0, limit=n, after=None, db=db), List[VenueSchema]),
+        "GET /ticket-types/": (lambda db, n: ticket_types.get_ticket_types(Response(), skip=0, limit=n, after=None, db=db), List[TicketTypeSchema]),
+    }
+    failed = False
+    for name, (call, response_model) in endpoints.items():
+        adapter = TypeAdapter(response_model)
+        counts = []
+        for page_size in args.page_sizes:
+            db = SessionLocal()
+            try:
+                statements.clear()
+                adapter.validate_python(call(db, page_size), from_attributes=True)
+                counts.append(len(statements))
+            finally:
+                db.close()
+        bounded = len(set(counts)) == 1
+        failed |= not bounded
+        print(f"{name:<22} statements per page size {dict(zip(args.page_sizes, counts))} "
+              f"{'ok' if bounded else 'GROWS WITH PAGE SIZE'}")
+    assert not failed, "an endpoint issues more statements for larger pages"
+
+
+def run_pagination(args):
+    """Time GET /bookings/ pages at increasing depth, by offset and by cursor."""
+    SessionLocal = make_session_factory()
+    event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.rows)
+    db = SessionLocal()
+    try:
+        chunk = 50000
+        for start in range(0, args.rows, chunk):
+            db.execute(insert(Booking), [
+                {"user_name": "bench", "user_email": "bench@example.com", "quantity": 1,
+                 "total_price": 50.0, "booking_date": datetime.now(), "status": BookingStatus.CONFIRMED,
+                 "confirmation_code": f"P{n:09d}", "event_id": event_id, "ticket_type_id": ticket_type_id}
+                for n in range(start, min(start + chunk, args.rows))
+            ])
+        db.commit()
+    finally:
+        db.close()
+    print(f"seeded {args.rows} bookings")
+
+    for depth in (0.0, 0.1, 0.5, 0.9, 0.99):
+        skip = int(args.rows * depth)
+        timings = {}
+        for mode in ("offset", "cursor"):
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    if mode == "offset":
+                        bookings.get_bookings(Response(), skip=skip, limit=args.limit, after=None, db=db)
+                    else:
+                        # Booking ids are dense here, so the cursor for row `skip` is its id
+                        bookings.get_bookings(Response(), skip=0, limit=args.limit, after=encode_cursor(skip), db=db)
+                timings[mode] = (time.perf_counter() - start) / args.repeat
+            finally:
+                db.close()
+        print(f"depth={depth:>5.0%} skip={skip:<9} offset={timings['offset'] * 1000:8.2f}ms "
+              f"cursor={timings['cursor'] * 1000:8.2f}ms")
+
+
+FIRST_NAMES = ["Ana", "Bruno", "Chen", "Dara", "Elif", "Farid", "Grace", "Hiro", "Ines", "Jonas", "Kemi", "Luca"]
+LAST_NAMES = ["Okafor", "Silva", "Nguyen", "Kowalski", "Haddad", "Larsen", "Moreau", "Tanaka", "Ibrahim", "Novak"]
+
+
+def search_booking_rows(start, stop, events):
+    """Bookings numbered start..stop-1 with varied names and unique emails, spread over `events` events."""
+    rows = []
+    for n in range(start, stop):
+        first, last = FIRST_NAMES[n % len(FIRST_NAMES)], LAST_NAMES[(n // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        event_id = n % events + 1
+        rows.append({
+            "user_name": f"{first} {last}", "user_email": f"{first.lower()}.{last.lower()}{n}@example.com",
+            "quantity": 1, "total_price": 75.0, "booking_date": datetime.now(), "status": BookingStatus.CONFIRMED,
+            "confirmation_code": f"S{n:09d}", "event_id": event_id, "ticket_type_id": event_id * 2 - n % 2,
+        })
+    return rows
+
+
+def joined_ilike_search(db, filters, skip, limit):
+    """Search the way the app did before the index: ILIKE over every booking
+    joined to its event, venue and ticket type names, in id order."""
+    columns = {"event": Event.name, "venue": Venue.name, "ticket_type": TicketType.name,
+               "user_name": Booking.user_name, "user_email": Booking.user_email}
+    query = (load_for(db.query(Booking), BookingWithDetails)
+             .join(Event, Booking.event_id == Event.id).join(Venue, Event.venue_id == Venue.id)
+             .join(TicketType, Booking.ticket_type_id == TicketType.id))
+    conditions = [columns[field].icontains(term, autoescape=True) for fields, term in filters for field in fields]
+    return query.filter(or_(*conditions)).order_by(Booking.id).offset(skip).limit(limit).all()
+
+
+def run_search(args):
+    """Weigh the full-text index: what keeping it up to date adds to inserts
+    and booking requests, against search times with the index, with the
+    app's fallback and with ILIKE over joined names; and check all three
+    find the same bookings."""
+    SessionLocal = make_session_factory(tuned=True, search_index=False)
+    engine = SessionLocal.kw["bind"]
+    add_catalog(SessionLocal, venues=args.venues, events_per_venue=args.events // args.venues, bookings_per_event=0)
+    book = book_one(SessionLocal, *add_hot_ticket_type(SessionLocal, args.requests * 2))
+    chunk = 50000
+
+    def fill(start, stop):
+        db = SessionLocal()
+        try:
+            began = time.perf_counter()
+            for offset in range(start, stop, chunk):
+                db.execute(insert(Booking), search_booking_rows(offset, min(offset + chunk, stop), args.events))
+            db.commit()
+            return (stop - start) / (time.perf_counter() - began)
+        finally:
+            db.close()
+
+    def booking_requests():
+        began = time.perf_counter()
+        outcomes = [book() for _ in range(args.requests)]
+        assert outcomes == ["booked"] * args.requests, outcomes
+        return (time.perf_counter() - began) / args.requests
+
+    plain_rows = fill(0, args.bookings)
+    plain_request = booking_requests()
+    began = time.perf_counter()
+    with engine.begin() as connection:
+        search.create_search_index(connection)
+    built = time.perf_counter() - began
+    extra = min(args.bookings, 100000)
+    indexed_rows = fill(args.bookings, args.bookings + extra)
+    indexed_request = booking_requests()
+
+    print(f"built the index from {args.bookings} bookings in {built:.1f}s")
+    print(f"{'writes':<36}{'no index':>10}{'index':>10}{'per row':>12}")
+    print(f"{'bulk insert rows/s':<36}{plain_rows:>10,.0f}{indexed_rows:>10,.0f}"
+          f"{(1 / indexed_rows - 1 / plain_rows) * 1e6:>10.0f}us")
+    print(f"{'POST /bookings ms':<36}{plain_request * 1000:>10.2f}{indexed_request * 1000:>10.2f}"
+          f"{(indexed_request - plain_request) * 1e6:>10.0f}us")
+
+    total = args.bookings + extra
+    sample = search_booking_rows(total // 2, total // 2 + 1, args.events)[0]
+    every_field = ("event", "venue", "ticket_type", "user_name", "user_email")
+    searches = {
+        "q=<one booking's email>": [(every_field, sample["user_email"])],
+        "user_email=<one booking's email>": [(("user_email",), sample["user_email"])],
+        "q=okafor": [(every_field, "okafor")],
+        f"event=Event 3-{args.events // args.venues - 1}": [(("event",), f"Event 3-{args.events // args.venues - 1}")],
+        "venue=Venue 7": [(("venue",), "Venue 7")],
+        "ticket_type=VIP": [(("ticket_type",), "VIP")],
+        "event=Event 5-1 or venue=Venue 2": [(("event",), "Event 5-1"), (("venue",), "Venue 2")],
+        "q=ok (too short for the index)": [(every_field, "ok")],
+    }
+
+    def timed(search_function, filters):
+        times = []
+        for _ in range(args.repeat):
+            db = SessionLocal()
+            try:
+                began = time.perf_counter()
+                search_function(db, filters, 0, args.limit)
+                times.append(time.perf_counter() - began)
+            finally:
+                db.close()
+        return min(times)
+
+    def every_match(search_function, filters):
+        db = SessionLocal()
+        try:
+            return {booking.id for booking in search_function(db, filters, 0, total)}
+        finally:
+            db.close()
+
+    def without_index(function):
+        def search_function(*search_args):
+            search._index_available[engine] = False
+            try:
+                return function(*search_args)
+            finally:
+                del search._index_available[engine]
+        return search_function
+
+    searchers = {"index": search.find_bookings, "no index": without_index(search.find_bookings),
+                 "joined": joined_ilike_search}
+    print(f"\n{total} bookings, first page of {args.limit}, best of {args.repeat}, ms")
+    print(f"{'search':<36}" + "".join(f"{name:>10}" for name in searchers) + f"{'found':>10}")
+    for name, filters in searches.items():
+        times = [timed(function, filters) for function in searchers.values()]
+        line = f"{name:<36}" + "".join(f"{elapsed * 1000:>10.2f}" for elapsed in times)
+        if args.check:
+            found = {label: every_match(function, filters) for label, function in searchers.items()}
+            # The index ranks its first matches, so compare every match rather than the first pages
+            assert found["index"] == found["no index"] == found["joined"], \
+                f"{name}: " + ", ".join(f"{label} found {len(ids)}" for label, ids in found.items())
+            line += f"{len(found['index']):>10}"
+        print(line)
+    if args.check:
+        print("the index, the fallback and ILIKE over joined names find the same bookings for every search")
+
+        # Pages of a size that does not divide the ranked window, so one of
+        # them spans its end, must add up to the whole result in order
+        page = search.RANK_WINDOW // 3 + 1
+        db = SessionLocal()
+        try:
+            for name, filters in searches.items():
+                everything = [booking.id for booking in search.find_bookings(db, filters, 0, total)]
+                paged = []
+                for skip in range(0, len(everything) + page, page):
+                    paged += [booking.id for booking in search.find_bookings(db, filters, skip, page)]
+                assert paged == everything, f"{name}: pages of {page} do not add up to the full result"
+                assert len(set(paged)) == len(paged), f"{name}: a booking appears on two pages"
+        finally:
+            db.close()
+        print(f"pages of {page} add up to the full result for every search")
+
+
+def legacy_confirmation_code(length=8):
+    """The original generator: random characters, unique only by luck."""
+    chars = string.ascii_uppercase + string.digits
+    return "".join(random.choice(chars) for _ in range(length))
+
+
+def run_codes(args):
+    """Confirmation codes: issue rate of the original random codes and of the
+    generator, singly and in blocks; uniqueness under concurrent allocation
+    and across worker ids; and GET /bookings/by-code/{code} lookups."""
+    generator = confirmation_codes.ConfirmationCodeGenerator(worker_id=1)
+
+    def rate(issue):
+        start = time.perf_counter()
+        codes = issue()
+        return codes, len(codes) / (time.perf_counter() - start)
+
+    legacy, legacy_rate = rate(lambda: [legacy_confirmation_code() for _ in range(args.codes)])
+    singles, single_rate = rate(lambda: [generator.next_code() for _ in range(args.codes)])
+    blocks, block_rate = rate(lambda: [
+        code for _ in range(args.codes // args.block) for code in generator.allocate(args.block)
+    ])
+    print(f"{args.codes} codes per generator")
+    print(f"{'generator':<24}{'codes/s':>12}{'duplicates':>12}")
+    for name, codes, codes_per_second in (("random (original)", legacy, legacy_rate),
+                                          ("sequence, one at a time", singles, single_rate),
+                                          (f"sequence, blocks of {args.block}", blocks, block_rate)):
+        print(f"{name:<24}{codes_per_second:>12,.0f}{len(codes) - len(set(codes)):>12}")
+    space = 36 ** 8
+    for bookings_total in (10 ** 6, 10 ** 7):
+        # Birthday bound for the original codes: expected colliding pairs
+        print(f"original codes, {bookings_total:,} bookings: {bookings_total * (bookings_total - 1) / 2 / space:.2f} "
+              "expected collisions (each a failed booking)")
+
+    # Threads sharing one generator, and two workers, never hand out the same code
+    issued = []
+    lock = threading.Lock()
+
+    def allocate(worker_generator):
+        codes = []
+        for n in range(args.codes // args.threads // 10):
+            codes += worker_generator.allocate(1 + n % 20)
+        with lock:
+            issued.extend(codes)
+
+    other = confirmation_codes.ConfirmationCodeGenerator(worker_id=2)
+    threads = [threading.Thread(target=allocate, args=(generator if n % 2 else other,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(issued)) == len(issued), "duplicate confirmation codes"
+    assert all(confirmation_codes.is_valid(code) for code in issued)
+    print(f"\n{len(issued)} codes from {args.threads} threads on 2 worker ids: all unique and valid")
+
+    SessionLocal = make_session_factory()
+
+    # Server processes lease distinct worker ids; a lease left unrenewed past
+    # its TTL is taken over, and its old holder moves to a new id
+    leased = [confirmation_codes.ConfirmationCodeGenerator() for _ in range(3)]
+    for worker_generator in leased:
+        worker_generator.start(SessionLocal, ttl=3600)
+    assert len({worker_generator.worker_id for worker_generator in leased}) == 3, "two processes leased the same worker id"
+    stalled = leased[0]
+    lost = stalled.worker_id
+    db = SessionLocal()
+    try:
+        db.query(WorkerIdLease).filter(WorkerIdLease.worker_id == lost).update(
+            {WorkerIdLease.renewed_at: datetime.utcnow() - timedelta(hours=2)})
+        # Every other id is held, so the next process has to take the expired lease
+        held = {worker_generator.worker_id for worker_generator in leased}
+        db.execute(insert(WorkerIdLease), [
+            {"worker_id": worker_id, "holder": "elsewhere", "renewed_at": datetime.utcnow()}
+            for worker_id in range(confirmation_codes.MAX_WORKER_ID + 1) if worker_id not in held
+        ])
+        db.commit()
+    finally:
+        db.close()
+    taker = confirmation_codes.ConfirmationCodeGenerator()
+    taker.start(SessionLocal, ttl=3600)
+    assert taker.worker_id == lost, "the expired lease was not taken over"
+    db = SessionLocal()
+    try:
+        db.query(WorkerIdLease).filter(WorkerIdLease.holder == "elsewhere").delete()
+        db.commit()
+    finally:
+        db.close()
+    stalled.renew()
+    assert stalled.worker_id not in {worker_generator.worker_id for worker_generator in leased[1:] + [taker]}, \
+        "the stalled process kept a worker id that is leased to another"
+    for worker_generator in leased + [taker]:
+        worker_generator.stop()
+    db = SessionLocal()
+    try:
+        assert db.query(WorkerIdLease).count() == 0, "stopped processes kept their leases"
+    finally:
+        db.close()
+    print("leased worker ids: distinct per process, expired leases taken over, released on stop")
+
+    add_catalog(SessionLocal, venues=10, events_per_venue=args.events // 10, bookings_per_event=args.bookings_per_event)
+    event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.lookups)
+    statements = []
+    sqlalchemy_event.listen(SessionLocal.kw["bind"], "before_cursor_execute", lambda *_: statements.append(1))
+
+    async def lookups(app):
+        booking = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 1,
+                   "event_id": event_id, "ticket_type_id": ticket_type_id}
+        status_code, results = await asgi_json(app, "POST", "/bookings/bulk", [booking] * args.lookups)
+        assert status_code == 200 and all("booking" in result for result in results)
+        created = [result["booking"] for result in results]
+        by_code, by_id = [], []
+        for booking in created:
+            start = time.perf_counter()
+            status_code, found = await asgi_json(app, "GET", f"/bookings/by-code/{booking['confirmation_code']}")
+            by_code.append(time.perf_counter() - start)
+            assert status_code == 200 and found["id"] == booking["id"]
+            start = time.perf_counter()
+            assert (await asgi_json(app, "GET", f"/bookings/{booking['id']}"))[0] == 200
+            by_id.append(time.perf_counter() - start)
+        print(f"\nGET /bookings/by-code/{{code}}: p50 {percentile(by_code, 50) * 1000:.2f}ms, "
+              f"GET /bookings/{{id}}: p50 {percentile(by_id, 50) * 1000:.2f}ms "
+              f"({len(created)} lookups among {args.events * args.bookings_per_event + len(created)} bookings)")
+
+        # A mistyped code fails its check character before any query
+        code = created[0]["confirmation_code"]
+        mistyped = code[:3] + ("0" if code[3] != "0" else "1") + code[4:]
+        statements.clear()
+        assert (await asgi_json(app, "GET", f"/bookings/by-code/{mistyped}"))[0] == 404
+        assert not statements, "a mistyped code reached the database"
+        print("mistyped code: 404 without a query")
+
+    asyncio.run(lookups(build_app(SessionLocal)))
+
+
+def explain_statements(engine, call):
+    """Run `call()` and return (sql, EXPLAIN QUERY PLAN details) for each SELECT
+    and DELETE it issued."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "DELETE")):
+            captured.append((statement, parameters))
+
+    sqlalchemy_event.listen(engine, "before_cursor_execute", capture)
+    try:
+        call()
+    finally:
+        sqlalchemy_event.remove(engine, "before_cursor_execute", capture)
+
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            plans.append((statement, [row[-1] for row in rows]))
+    return plans
+
+
+# Tables whose size is fixed by configuration rather than by the data: a
+# scan reads the same few rows however large the database grows
+BOUNDED_TABLES = {
+    "system_counters",  # COUNTER_STRIPES rows, summed by the stats endpoint
+}
+
+
+def run_plans(args):
+    """Fail if a hot query falls back to a full table scan of a table that grows."""
+    SessionLocal = make_session_factory()
+    add_catalog(SessionLocal, venues=3, events_per_venue=5, bookings_per_event=20)
+    engine = SessionLocal.kw["bind"]
+
+    def with_session(handler, *handler_args):
+        def call():
+            db = SessionLocal()
+            try:
+                handler(*handler_args, db=db)
+            finally:
+                db.close()
+        return call
+
+    hot_queries = {
+        "GET /events/{id}/available-tickets": with_session(events.get_available_tickets, 1),
+        "GET /events/{id}/revenue": with_session(events.get_event_revenue, 1),
+        "GET /events/available-tickets?ids=": with_session(events.get_available_tickets_bulk, "1,2,3"),
+        "GET /events/{id}/bookings": with_session(events.get_event_bookings, 1),
+        "GET /venues/{id}/events": with_session(venues.get_venue_events, 1),
+        "GET /venues/{id}/occupancy": with_session(venues.get_venue_occupancy, 1),
+        "GET /ticket-types/{id}/bookings": with_session(ticket_types.get_ticket_type_bookings, 2),
+        "GET /booking-system/stats": with_session(stats.get_booking_stats),
+        "expired hold sweep": HoldManager(SessionLocal).sweep,
+    }
+    full_scans = []
+    for name, call in hot_queries.items():
+        print(name)
+        for statement, details in explain_statements(engine, call):
+            for detail in details:
+                # Scans of materialized subqueries are fine; scans of real tables are not
+                scan = (detail.startswith("SCAN ") and " USING " not in detail
+                        and detail.split()[1] in Base.metadata.tables)
+                if scan and detail.split()[1] in BOUNDED_TABLES:
+                    print(f"    BOUNDED SCAN {detail}")
+                    continue
+                print(f"    {'FULL SCAN ' if scan else ''}{detail}")
+                if scan:
+                    full_scans.append((name, detail, " ".join(statement.split())))
+    for name, detail, statement in full_scans:
+        print(f"{name}: {detail}\n    {statement}")
+    assert not full_scans, f"{len(full_scans)} full table scan(s) in hot queries"
+
+
+async def asgi_request(app, method, path, body=None):
+    """Send one HTTP request straight to an ASGI app and return the status code."""
+    status_code, _ = await asgi_call(app, method, path, body)
+    return status_code
+
+
+async def asgi_call(app, method, path, body=None, headers=None):
+    """Send one HTTP request straight to an ASGI app; return (status code, response headers)."""
+    status_code, response_headers, _ = await asgi_exchange(app, method, path, body, headers)
+    return status_code, response_headers
+
+
+async def asgi_json(app, method, path, body=None):
+    """Send one HTTP request straight to an ASGI app; return (status code, decoded JSON body)."""
+    status_code, _, response_body = await asgi_exchange(app, method, path, body)
+    return status_code, json.loads(response_body) if response_body else None
+
+
+async def asgi_exchange(app, method, path, body=None, headers=None):
+    """Send one HTTP request straight to an ASGI app; return (status code, headers, body bytes)."""
+    path, _, query_string = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    request_headers = [(b"host", b"bench"), (b"content-type", b"application/json")]
+    request_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query_string.encode(), "root_path": "",
+        "headers": request_headers,
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    received = False
+    status_code = None
+    response_headers = {}
+    response_body = bytearray()
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            response_headers.update((name.decode(), value.decode()) for name, value in message["headers"])
+        elif message["type"] == "http.response.body":
+            response_body.extend(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        return 500, {}, b""
+    return status_code, response_headers, bytes(response_body)
+
+
+def async_session_factory(SessionLocal, **engine_options):
+    """Return an AsyncSession factory over the bench database of `SessionLocal`,
+    from the app's async SQLite factory (configured pragmas and pool)."""
+    path = SessionLocal.kw["bind"].url.database
+    engine = create_async_sqlite_engine(f"sqlite+aiosqlite:///{path}", pool="queue", **engine_options)
+    return async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+def build_app(SessionLocal, fast_json=False, mode="threadpool", AsyncSessionLocal=None):
+    """Build an app serving the routers against the bench database, as sync
+    handlers in the threadpool or, with mode="async", the async routers."""
+    app = FastAPI(default_response_class=ORJSONResponse if fast_json else JSONResponse)
+    if mode == "async":
+        modules = (async_events, async_venues, async_ticket_types, async_bookings, async_holds, async_waiting_room, async_stats)
+    else:
+        modules = (events, venues, ticket_types, bookings, holds, waiting_room, stats)
+    prefixes = ("/events", "/venues", "/ticket-types", "/bookings", "/holds", "/waiting-room", "/booking-system")
+    for module, prefix in zip(modules, prefixes):
+        app.include_router(make_fast_json_router(module.router) if fast_json else module.router, prefix=prefix)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[get_db] = override_get_db
+
+    if mode == "async":
+        AsyncSessionLocal = AsyncSessionLocal or async_session_factory(SessionLocal)
+
+        async def override_get_async_db():
+            async with AsyncSessionLocal() as db:
+                yield db
+        app.dependency_overrides[get_async_db] = override_get_async_db
+    return app
+
+
+def run_holds(args):
+    """Simulate an on-sale: --users buyers compete for --seats seats, one
+    seat each, with --clients requests in flight at a time.
+
+    A buyer who gets a seat finishes checkout after --checkout seconds, or
+    with probability --abandon never comes back. Directly, a seat is a
+    pending booking from the start and finishing checkout confirms it, so an
+    abandoned checkout keeps its seat forever. With holds, a seat is a hold
+    that finishing checkout confirms, and abandoned holds go back on sale
+    after --ttl seconds for the buyers still arriving.
+    """
+    config.HOLD_TTL_SECONDS = args.ttl
+    print(f"{args.users} buyers, {args.seats} seats, {args.abandon:.0%} abandon checkout, hold TTL {args.ttl}s")
+    print(f"{'flow':<8}{'seconds':>9}{'req/s':>8}{'take p50':>10}{'take p99':>10}"
+          f"{'sold':>7}{'stuck':>7}{'unsold':>8}{'retried':>9}")
+
+    for flow in ("direct", "holds"):
+        # The app's SQLite engine (WAL, busy timeout): confirmations write
+        # concurrently with new bookings. Its pool outnumbers --clients.
+        SessionLocal = make_session_factory(tuned=True)
+        event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.seats)
+        app = build_app(SessionLocal)
+        buyer = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 1,
+                 "event_id": event_id, "ticket_type_id": ticket_type_id}
+        take_latencies = []
+        outcomes = {}
+
+        async def simulate():
+            requests = asyncio.Semaphore(args.clients)
+            buyers = iter(range(args.users))
+            checkouts = []
+
+            async def send(method, path, body=None):
+                # Retry what SQLite's busy timeout turned into a 500, as a client would
+                while True:
+                    async with requests:
+                        start = time.perf_counter()
+                        status_code, response = await asgi_json(app, method, path, body)
+                        elapsed = time.perf_counter() - start
+                    outcomes[status_code] = outcomes.get(status_code, 0) + 1
+                    if status_code < 500:
+                        return status_code, response, elapsed
+
+            async def checkout(seat_id):
+                await asyncio.sleep(args.checkout)
+                if flow == "direct":
+                    status_code, _, _ = await send("PATCH", f"/bookings/{seat_id}/status", {"status": "confirmed"})
+                else:
+                    status_code, _, _ = await send("POST", f"/holds/{seat_id}/confirm")
+                # A checkout slower than the TTL finds its hold gone
+                assert status_code in (200, 201, 404), status_code
+
+            async def arrivals():
+                # Buyers are shared between the --clients arrival loops
+                for _ in buyers:
+                    status_code, seat, elapsed = await send("POST", "/bookings/" if flow == "direct" else "/holds/", buyer)
+                    take_latencies.append(elapsed)
+                    assert status_code in (201, 400), status_code
+                    if status_code == 201 and random.random() >= args.abandon:
+                        checkouts.append(asyncio.create_task(checkout(seat["id"])))
+
+            if flow == "holds":
+                hold_manager.start(SessionLocal, args.ttl)
+            try:
+                await asyncio.gather(*(arrivals() for _ in range(args.clients)))
+                await asyncio.gather(*checkouts)
+                if flow == "holds":
+                    # Let the last abandoned holds expire and be swept
+                    await asyncio.sleep(args.ttl + 0.5)
+            finally:
+                if flow == "holds":
+                    await hold_manager.stop()
+
+        start = time.perf_counter()
+        asyncio.run(simulate())
+        elapsed = time.perf_counter() - start
+
+        db = SessionLocal()
+        try:
+            by_status = dict(db.query(Booking.status, func.coalesce(func.sum(Booking.quantity), 0))
+                             .filter(Booking.ticket_type_id == ticket_type_id).group_by(Booking.status).all())
+            available = db.query(TicketType.quantity_available).filter(TicketType.id == ticket_type_id).scalar()
+            held = db.query(func.coalesce(func.sum(SeatHold.quantity), 0)).scalar()
+        finally:
+            db.close()
+        sold = by_status.get(BookingStatus.CONFIRMED, 0)
+        stuck = by_status.get(BookingStatus.PENDING, 0)
+        # Every seat is sold, stuck in an abandoned pending booking, held or still on sale
+        assert sold + stuck + held + available == args.seats, "seats were lost or oversold"
+        assert held == 0, "expired holds were not released"
+        check_counters(SessionLocal)
+        requests_sent = sum(outcomes.values())
+        retried = sum(count for status_code, count in outcomes.items() if status_code >= 500)
+        print(f"{flow:<8}{elapsed:>9.1f}{requests_sent / elapsed:>8.0f}"
+              f"{percentile(take_latencies, 50) * 1000:>10.1f}{percentile(take_latencies, 99) * 1000:>10.1f}"
+              f"{sold:>7}{stuck:>7}{available:>8}{retried:>9}")
+    print("sold: confirmed bookings, stuck: seats in abandoned pending bookings, unsold: left on sale, "
+          "retried: requests that failed with a 5xx and were sent again")
+
+
+def run_waiting_room(args):
+    """Simulate an on-sale rush: --buyers buyers try to book one of --seats
+    seats at the same moment, --clients requests in flight at a time.
+
+    Without the queue every buyer posts the booking straight away and sends
+    it again while it fails with a 5xx. With the queue the event is behind a
+    waiting room admitting each of --rates buyers per second in turn: each
+    buyer gets a queue token, polls it until it is admitted and then books
+    with it. Goodput is seats sold per second until the event sold out.
+    Buyers still waiting when it sells out give up.
+    """
+    print(f"{args.buyers} buyers, {args.seats} seats, {args.clients} requests in flight")
+    print(f"{'flow':<14}{'sold out s':>11}{'goodput/s':>10}{'book p50':>10}{'book p99':>10}"
+          f"{'wait p50':>10}{'wait p99':>10}{'bookings':>10}{'5xx':>7}{'polls':>7}")
+
+    for rate in [None, *args.rates]:
+        flow = "open" if rate is None else f"queue {rate:g}/s"
+        # The app's SQLite engine, as served: writers wait on the lock in the
+        # busy handler. Keep --clients below its pool size (60 by default).
+        SessionLocal = make_session_factory(tuned=True)
+        event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.seats)
+        app = build_app(SessionLocal)
+        buyer = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 1,
+                 "event_id": event_id, "ticket_type_id": ticket_type_id}
+        waiting_room.waiting_room.reset()
+        if rate is not None:
+            waiting_room.waiting_room.open(event_id, rate, args.burst)
+        book_latencies = []
+        waits = []
+        outcomes = {}
+        counts = {"bookings": 0, "polls": 0}
+        sold_out_at = None
+
+        async def simulate():
+            nonlocal sold_out_at
+            requests = asyncio.Semaphore(args.clients)
+            sold_out = asyncio.Event()
+            start = time.perf_counter()
+
+            async def send(method, path, body=None, headers=None):
+                async with requests:
+                    sent = time.perf_counter()
+                    status_code, _, response = await asgi_exchange(app, method, path, body, headers)
+                    elapsed = time.perf_counter() - sent
+                outcomes[status_code] = outcomes.get(status_code, 0) + 1
+                return status_code, json.loads(response) if response else None, elapsed
+
+            async def book(headers=None):
+                # Send the booking again while it fails with a 5xx, as a client would
+                while True:
+                    counts["bookings"] += 1
+                    status_code, _, elapsed = await send("POST", "/bookings/", buyer, headers)
+                    book_latencies.append(elapsed)
+                    if status_code < 500:
+                        return status_code
+
+            async def arrive():
+                nonlocal sold_out_at
+                arrived = time.perf_counter()
+                headers = None
+                if rate is not None:
+                    status_code, token, _ = await send("POST", f"/waiting-room/events/{event_id}/tokens")
+                    assert status_code == 201, status_code
+                    while not token["admitted"]:
+                        await asyncio.sleep(max(token["retry_after"], 0.01))
+                        if sold_out.is_set():
+                            return
+                        counts["polls"] += 1
+                        status_code, token, _ = await send("GET", f"/waiting-room/tokens/{token['token']}")
+                        assert status_code == 200, status_code
+                    headers = {"X-Queue-Token": token["token"]}
+                status_code = await book(headers)
+                assert status_code in (201, 400), status_code
+                waits.append(time.perf_counter() - arrived)
+                if status_code == 201:
+                    sold_out_at = max(sold_out_at or 0, time.perf_counter() - start)
+                else:
+                    sold_out.set()
+
+            await asyncio.gather(*(arrive() for _ in range(args.buyers)))
+
+        asyncio.run(simulate())
+        waiting_room.waiting_room.reset()
+
+        sold, remaining = seats_left(SessionLocal, ticket_type_id)
+        assert sold + remaining == args.seats, "seats were lost or oversold"
+        check_counters(SessionLocal)
+        failed = sum(count for status_code, count in outcomes.items() if status_code >= 500)
+        print(f"{flow:<14}{sold_out_at:>11.2f}{sold / sold_out_at:>10.0f}"
+              f"{percentile(book_latencies, 50) * 1000:>10.1f}{percentile(book_latencies, 99) * 1000:>10.1f}"
+              f"{percentile(waits, 50):>10.2f}{percentile(waits, 99):>10.2f}"
+              f"{counts['bookings']:>10}{failed:>7}{counts['polls']:>7}")
+    print("book: latency of one booking request (ms), wait: arrival to answer for buyers who got one (s), "
+          "bookings: booking requests sent, 5xx: requests that failed and were sent again")
+
+    # A rejected booking uses its token up; a server-side failure gives it back
+    SessionLocal = make_session_factory()
+    event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, 1)
+    app = build_app(SessionLocal)
+    room = waiting_room.waiting_room
+    room.reset()
+    room.open(event_id, 1000, 10)
+    too_many = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 2,
+                "event_id": event_id, "ticket_type_id": ticket_type_id}
+
+    async def check_tokens():
+        token = (await asgi_json(app, "POST", f"/waiting-room/events/{event_id}/tokens"))[1]["token"]
+        assert (await asgi_exchange(app, "POST", "/bookings/", too_many, {"X-Queue-Token": token}))[0] == 400
+        assert (await asgi_exchange(app, "POST", "/bookings/", too_many, {"X-Queue-Token": token}))[0] == 403, \
+            "a rejected booking gave its token back"
+        token = (await asgi_json(app, "POST", f"/waiting-room/events/{event_id}/tokens"))[1]["token"]
+        for failure in (HTTPException(status_code=503), OperationalError("INSERT", {}, Exception("database is locked"))):
+            try:
+                with room.admission(event_id, token):
+                    raise failure
+            except type(failure):
+                pass
+        assert (await asgi_exchange(app, "POST", "/bookings/", {**too_many, "quantity": 1}, {"X-Queue-Token": token}))[0] == 201, \
+            "a server-side failure used the token up"
+
+    try:
+        asyncio.run(check_tokens())
+    finally:
+        room.reset()
+    print("tokens: used up by a rejected booking, given back after a 5xx or a database error")
+
+
+def run_group_commit(args):
+    """Book --bookings seats through POST /bookings with --clients requests in
+    flight, committing each booking on its own and then through the group
+    commit writer at each of --windows (milliseconds).
+
+    Runs on the app's SQLite engine with --synchronous; "full" syncs the WAL
+    on every commit, "normal" (the app's default) only at checkpoints.
+    """
+    print(f"{args.bookings} bookings, {args.clients} requests in flight, synchronous={args.synchronous}, "
+          f"at most {args.max_batch} per group")
+    print(f"{'commit':<16}{'seconds':>9}{'bookings/s':>12}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'commits':>9}{'per commit':>12}{'5xx':>6}")
+
+    for window in [None, *args.windows]:
+        # Keep --clients below the engine's pool size (60 by default)
+        SessionLocal = make_session_factory(tuned=True, pragmas={"synchronous": args.synchronous})
+        event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.bookings)
+        app = build_app(SessionLocal)
+        booking = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 1,
+                   "event_id": event_id, "ticket_type_id": ticket_type_id}
+        latencies = []
+        statuses = {}
+        commits = {"count": 0}
+
+        def count_commit(connection):
+            commits["count"] += 1
+        engine = SessionLocal.kw["bind"]
+        sqlalchemy_event.listen(engine, "commit", count_commit)
+
+        async def run_clients():
+            remaining = iter(range(args.bookings))
+
+            async def client():
+                for _ in remaining:
+                    start = time.perf_counter()
+                    status_code = await asgi_request(app, "POST", "/bookings/", booking)
+                    latencies.append(time.perf_counter() - start)
+                    statuses[status_code] = statuses.get(status_code, 0) + 1
+
+            await asyncio.gather(*(client() for _ in range(args.clients)))
+
+        if window is not None:
+            booking_writer.start(SessionLocal, window=window / 1000, max_batch=args.max_batch)
+        start = time.perf_counter()
+        try:
+            asyncio.run(run_clients())
+        finally:
+            booking_writer.stop()
+        elapsed = time.perf_counter() - start
+        sqlalchemy_event.remove(engine, "commit", count_commit)
+
+        sold, remaining = seats_left(SessionLocal, ticket_type_id)
+        assert sold + remaining == args.bookings, "seats were lost or oversold"
+        assert sold == statuses.get(201, 0), f"{sold} seats sold for {statuses.get(201, 0)} bookings answered 201"
+        check_counters(SessionLocal)
+        label = "per booking" if window is None else f"group {window:g} ms"
+        failed = sum(count for status_code, count in statuses.items() if status_code >= 500)
+        # Includes the commits made while setting up the event
+        print(f"{label:<16}{elapsed:>9.2f}{sold / elapsed:>12.0f}"
+              f"{percentile(latencies, 50) * 1000:>9.1f}{percentile(latencies, 99) * 1000:>9.1f}"
+              f"{commits['count']:>9}{sold / max(commits['count'], 1):>12.1f}{failed:>6}")
+
+    check_group_commit_failures()
+
+
+def check_group_commit_failures():
+    """A group that loses seats to a concurrent booking keeps the items that
+    still fit; a failed group fails only its own callers; and a booking left
+    queued past the timeout is dropped and never written."""
+    SessionLocal = make_session_factory(tuned=True)
+    event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, 12)
+
+    def item(quantity=1):
+        return BookingCreate(user_name="bench", user_email="bench@example.com", quantity=quantity,
+                             event_id=event_id, ticket_type_id=ticket_type_id)
+
+    # Another booking takes 4 of the 12 seats between the group's read and its UPDATE
+    db = SessionLocal()
+    raced = []
+
+    @sqlalchemy_event.listens_for(db, "do_orm_execute")
+    def book_first(orm_execute_state):
+        if not raced and orm_execute_state.is_update and orm_execute_state.statement.table.name == "ticket_types":
+            raced.append(True)
+            other = SessionLocal()
+            try:
+                assert "booking" in create_bookings(other, [item(4)])[0]
+            finally:
+                other.close()
+
+    try:
+        results = create_bookings(db, [item(3), item(3), item(3)])
+    finally:
+        db.close()
+    assert [result.get("status_code") for result in results] == [None, None, 400], results
+    sold, remaining = seats_left(SessionLocal, ticket_type_id)
+    assert (sold, remaining) == (10, 2), (sold, remaining)
+    print("a group that lost seats to a concurrent booking kept the 2 items that still fit")
+
+    # The writer thread survives a group whose session cannot even be created
+    calls = {"count": 0}
+
+    def flaky_sessions():
+        calls["count"] += 1
+        if calls["count"] == 1:
+            raise OperationalError("connect", {}, Exception("unable to open database file"))
+        return SessionLocal()
+
+    writer = BookingWriter(window=0)
+    writer.start(flaky_sessions)
+    try:
+        try:
+            writer.book(item())
+            raise AssertionError("the failed group was answered")
+        except OperationalError:
+            pass
+        assert "booking" in writer.book(item()), "the writer stopped after a failed group"
+    finally:
+        writer.stop()
+    print("a failed group fails its own bookings and the writer goes on")
+
+    # A booking still queued after the timeout is dropped; the group being
+    # written when it timed out is still answered
+    def slow_sessions():
+        time.sleep(0.3)
+        return SessionLocal()
+
+    writer = BookingWriter(window=0, timeout=0.1)
+    writer.start(slow_sessions)
+    try:
+        first = writer.submit(item())
+        time.sleep(0.05)
+        try:
+            writer.book(item())
+            raise AssertionError("the queued booking did not time out")
+        except TimeoutError:
+            pass
+        assert "booking" in first.result(), "the group being written was not answered"
+    finally:
+        writer.stop()
+    sold, remaining = seats_left(SessionLocal, ticket_type_id)
+    assert (sold, remaining) == (12, 0), f"the timed-out booking was written: {sold} sold"
+    check_counters(SessionLocal)
+    print("a booking queued past the timeout is dropped; the one being written is answered")
+
+
+def check_async_parity():
+    """Send the same requests to the threadpool and async routers, each on a
+    fresh database, and fail on any difference in status, body or next-page
+    cursor (confirmation codes and timestamps aside)."""
+    volatile = {"confirmation_code", "booking_date", "expires_at"}
+
+    def normalize(value):
+        if isinstance(value, dict):
+            return {key: "*" if key in volatile else normalize(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        return value
+
+    date = (datetime.now() + timedelta(days=30)).isoformat()
+
+    def booking(quantity, ticket_type_id=1, **fields):
+        return {"user_name": "Ana Okafor", "user_email": "ana@example.com", "quantity": quantity,
+                "event_id": 1, "ticket_type_id": ticket_type_id, **fields}
+
+    script = [
+        ("POST", "/venues/", {"name": "Arena", "location": "Lagos", "capacity": 100}),
+        ("POST", "/venues/", {"name": "Hall", "location": "Oslo", "capacity": 0}),
+        ("POST", "/events/", {"name": "Opening", "date": date, "venue_id": 1}),
+        ("POST", "/events/", {"name": "Nowhere", "date": date, "venue_id": 99}),
+        ("POST", "/ticket-types/", {"name": "GA", "price": 40.0, "quantity_available": 10, "event_id": 1}),
+        ("POST", "/ticket-types/", {"name": "VIP", "price": 90.0, "quantity_available": 2, "event_id": 1}),
+        ("POST", "/ticket-types/", {"name": "Ghost", "price": 1.0, "quantity_available": 1, "event_id": 99}),
+        ("POST", "/bookings/", booking(3)),
+        ("POST", "/bookings/", booking(0)),
+        ("POST", "/bookings/", booking(20)),
+        ("POST", "/bookings/", booking(1, ticket_type_id=9)),
+        ("POST", "/bookings/bulk", [booking(2), booking(1, ticket_type_id=2, user_name="Bruno Silva"), booking(9), booking(-1)]),
+        ("PUT", "/bookings/1", {"quantity": 5}),
+        ("PUT", "/bookings/1", {"quantity": -1}),
+        ("PUT", "/bookings/1", {"quantity": 99}),
+        ("PUT", "/bookings/42", {"quantity": 1}),
+        ("PATCH", "/bookings/1/status", {"status": "confirmed"}),
+        ("PATCH", "/bookings/2/status", {"status": "cancelled"}),
+        ("PATCH", "/bookings/2/status", {"status": "pending"}),
+        ("POST", "/holds/", {"user_name": "Chen", "user_email": "chen@example.com", "quantity": 1, "event_id": 1, "ticket_type_id": 2}),
+        ("POST", "/holds/", {"user_name": "Chen", "user_email": "chen@example.com", "quantity": 5, "event_id": 1, "ticket_type_id": 2}),
+        ("GET", "/holds/1", None),
+        ("POST", "/holds/1/confirm", None),
+        ("POST", "/holds/1/confirm", None),
+        ("POST", "/holds/", {"user_name": "Dara", "user_email": "dara@example.com", "quantity": 1, "event_id": 1, "ticket_type_id": 1}),
+        ("DELETE", "/holds/2", None),
+        ("DELETE", "/holds/2", None),
+        ("DELETE", "/bookings/3", None),
+        ("DELETE", "/bookings/42", None),
+        ("PUT", "/waiting-room/events/1", {"admit_per_second": 5}),
+        ("PUT", "/waiting-room/events/42", {"admit_per_second": 5}),
+        ("GET", "/waiting-room/events/1", None),
+        ("POST", "/bookings/", booking(1)),
+        ("POST", "/bookings/bulk", [booking(1)]),
+        ("DELETE", "/waiting-room/events/1", None),
+        ("GET", "/events/", None),
+        ("GET", "/events/?limit=1", None),
+        ("GET", "/events/1", None),
+        ("GET", "/events/42", None),
+        ("GET", "/events/1/bookings", None),
+        ("GET", "/events/1/available-tickets", None),
+        ("GET", "/events/available-tickets?ids=1,42", None),
+        ("GET", "/events/available-tickets?ids=x", None),
+        ("GET", "/events/1/revenue", None),
+        ("GET", "/venues/?limit=1", None),
+        ("GET", "/venues/2", None),
+        ("GET", "/venues/1/events", None),
+        ("GET", "/venues/1/occupancy", None),
+        ("GET", "/venues/2/occupancy", None),
+        ("GET", "/venues/42/occupancy", None),
+        ("GET", "/ticket-types/", None),
+        ("GET", "/ticket-types/2", None),
+        ("GET", "/ticket-types/1/bookings", None),
+        ("GET", "/bookings/?limit=2", None),
+        ("GET", f"/bookings/?limit=2&after={encode_cursor(2)}", None),
+        ("GET", "/bookings/?after=garbage", None),
+        ("GET", "/bookings/1", None),
+        ("GET", "/bookings/by-code/NOPE", None),
+        ("GET", "/bookings/search?q=okafor", None),
+        ("GET", "/bookings/search?venue=Arena&ticket_type=VIP", None),
+        ("GET", "/bookings/export?format=csv", None),
+        ("GET", "/booking-system/stats", None),
+        ("POST", "/booking-system/stats/reconcile", None),
+    ]
+
+    async def replay(app, AsyncSessionLocal=None):
+        responses = []
+        for method, path, body in script:
+            status_code, headers, payload = await asgi_exchange(app, method, path, body)
+            if not payload:
+                payload = None
+            elif headers.get("content-type", "").startswith("application/json"):
+                payload = normalize(json.loads(payload))
+            else:
+                # CSV export: the rows, without their codes and dates
+                payload = [line.split(",")[2:-1] for line in payload.decode().splitlines()]
+            responses.append((status_code, payload, headers.get("x-next-cursor")))
+        if AsyncSessionLocal is not None:
+            # aiosqlite connections are closed by their own threads, from this loop
+            await AsyncSessionLocal.kw["bind"].dispose()
+        return responses
+
+    results = {}
+    for mode in ("threadpool", "async"):
+        waiting_room.waiting_room.reset()
+        SessionLocal = make_session_factory(tuned=True)
+        AsyncSessionLocal = async_session_factory(SessionLocal) if mode == "async" else None
+        app = build_app(SessionLocal, mode=mode, AsyncSessionLocal=AsyncSessionLocal)
+        results[mode] = asyncio.run(replay(app, AsyncSessionLocal))
+    mismatches = [
+        (request, threadpool, async_)
+        for request, threadpool, async_ in zip(script, results["threadpool"], results["async"])
+        if threadpool != async_
+    ]
+    for (method, path, _), threadpool, async_ in mismatches:
+        print(f"{method} {path}\n    threadpool: {threadpool}\n    async:      {async_}")
+    assert not mismatches, f"{len(mismatches)} of {len(script)} responses differ between the modes"
+    print(f"{len(script)} requests over every router: the async routes answer exactly as the threadpool routes")
+
+
+def run_concurrency(args):
+    """Compare the threadpool routers with the async routers (ASYNC_DB_ENABLED)
+    under many concurrent clients, with bookings committed one by one and
+    with group commit.
+
+    Each of --clients clients sends --requests-per-client requests back to
+    back straight to the ASGI app: a --write-ratio share are bookings for one
+    ticket type, the rest alternate between its event's availability and the
+    first page of bookings. Every run uses the tuned engine with a pool of
+    --pool-size connections (default: one per client), opened by one untimed
+    request per client before the clock starts. Failed requests
+    are counted, not fatal (a booking that waits out SQLITE_BUSY_TIMEOUT_MS
+    for the write lock fails), but no seat may be oversold and the stats
+    counters must match the tables.
+    """
+    if args.check:
+        check_async_parity()
+    print(f"\n{args.clients} clients x {args.requests_per_client} requests, {args.write_ratio:.0%} bookings")
+    print(f"{'mode':<12}{'commit':<13}{'req/s':>7}{'p50 ms':>9}{'p99 ms':>9}{'p99.9 ms':>10}{'max ms':>9}{'5xx':>6}")
+    for mode in ("threadpool", "async"):
+        for group_commit in (False, True):
+            # A sync request keeps its session's connection until its
+            # dependency is torn down, after the response was serialized on a
+            # threadpool thread of its own. With more requests in flight than
+            # connections, the threads wait on checkout for connections held
+            # by requests waiting for a thread, until the pool times out. The
+            # async routes queue for a connection on the event loop instead,
+            # but not in order, so on the default pool (60) some requests wait
+            # past pool_timeout while most are served within seconds.
+            pool = {"pool_size": args.pool_size or args.clients, "max_overflow": 0}
+            SessionLocal = make_session_factory(tuned=True, **pool)
+            AsyncSessionLocal = async_session_factory(SessionLocal, **pool) if mode == "async" else None
+            app = build_app(SessionLocal, mode=mode, AsyncSessionLocal=AsyncSessionLocal)
+            event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, args.clients * args.requests_per_client)
+            booking = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 1,
+                       "event_id": event_id, "ticket_type_id": ticket_type_id}
+            reads = [f"/events/{event_id}/available-tickets", "/bookings/?limit=20"]
+            rng = random.Random(7)
+            latencies = []
+            statuses = {}
+            booked = 0
+
+            async def client():
+                nonlocal booked
+                for request in range(args.requests_per_client):
+                    write = rng.random() < args.write_ratio
+                    start = time.perf_counter()
+                    if write:
+                        status_code = await asgi_request(app, "POST", "/bookings/", booking)
+                    else:
+                        status_code = await asgi_request(app, "GET", reads[request % 2])
+                    latencies.append(time.perf_counter() - start)
+                    statuses[status_code] = statuses.get(status_code, 0) + 1
+                    booked += write and status_code == 201
+
+            async def run_clients():
+                # Opening an aiosqlite connection starts a thread; open them all before timing
+                await asyncio.gather(*(asgi_request(app, "GET", reads[0]) for _ in range(args.clients)))
+                start = time.perf_counter()
+                await asyncio.gather(*(client() for _ in range(args.clients)))
+                elapsed = time.perf_counter() - start
+                if AsyncSessionLocal is not None:
+                    await AsyncSessionLocal.kw["bind"].dispose()
+                return elapsed
+
+            if group_commit:
+                booking_writer.start(SessionLocal)
+            try:
+                elapsed = asyncio.run(run_clients())
+            finally:
+                booking_writer.stop()
+
+            sold, remaining = seats_left(SessionLocal, ticket_type_id)
+            assert sold + remaining == args.clients * args.requests_per_client, "seats were lost or oversold"
+            assert sold == booked, f"{sold} seats sold for {booked} bookings answered 201"
+            check_counters(SessionLocal)
+            SessionLocal.kw["bind"].dispose()
+            label = "group" if group_commit else "per booking"
+            failed = sum(count for status_code, count in statuses.items() if status_code >= 500)
+            print(f"{mode:<12}{label:<13}{len(latencies) / elapsed:>7.0f}{percentile(latencies, 50) * 1000:>9.1f}"
+                  f"{percentile(latencies, 99) * 1000:>9.1f}{percentile(latencies, 99.9) * 1000:>10.1f}"
+                  f"{max(latencies) * 1000:>9.1f}{failed:>6}")
+
+
+def run_etag(args):
+    """Check conditional GETs: a matching If-None-Match gets 304 after one
+    version query, and only writes to the tables behind a resource change its
+    ETag."""
+    statements = []
+
+    def count(*_):
+        statements.append(1)
+
+    async def check(app, event_id, ticket_type_id):
+        async def get(path, etag=None, expect=None):
+            statements.clear()
+            start = time.perf_counter()
+            status_code, headers = await asgi_call(app, "GET", path, headers={"If-None-Match": etag} if etag else None)
+            elapsed = time.perf_counter() - start
+            assert expect is None or status_code == expect, f"GET {path} gave {status_code}, expected {expect}"
+            return headers.get("etag"), len(statements), elapsed
+
+        paths = ["/events/", f"/events/{event_id}", "/booking-system/stats"]
+        tags = {}
+        for path in paths:
+            tags[path], queried, _ = await get(path, expect=200)
+            assert tags[path], f"GET {path} sent no ETag"
+            full = min([(await get(path, expect=200))[2] for _ in range(args.repeat)])
+            results = [await get(path, tags[path], expect=304) for _ in range(args.repeat)]
+            assert all(queried == 1 for _, queried, _ in results), f"304 for GET {path} ran more than the version query"
+            not_modified = min(elapsed for _, _, elapsed in results)
+            print(f"GET {path:<22} 200: {queried} statements {full * 1000:6.2f}ms   "
+                  f"304: 1 statement {not_modified * 1000:6.2f}ms")
+
+        # A booking writes bookings, ticket_types and the stats counters, not events or venues
+        booking = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 1,
+                   "event_id": event_id, "ticket_type_id": ticket_type_id}
+        assert await asgi_request(app, "POST", "/bookings/", booking) == 201
+        await get("/events/", tags["/events/"], expect=304)
+        await get("/booking-system/stats", tags["/booking-system/stats"], expect=200)
+
+        # A new event changes the event list
+        new_event = {"name": "Encore", "date": (datetime.now() + timedelta(days=60)).isoformat(), "venue_id": 1}
+        assert await asgi_request(app, "POST", "/events/", new_event) == 201
+        await get("/events/", tags["/events/"], expect=200)
+        print(f"writes change only the ETags of the resources they touch")
+
+        # The versions live in the database, so a write made by another server
+        # process changes the tag too
+        tags["/events/"], _, _ = await get("/events/", expect=200)
+        other_process = (
+            "from app.database.database import SessionLocal\n"
+            "from app.models.models import Venue\n"
+            "import app.utils.versions\n"
+            "db = SessionLocal()\n"
+            "db.query(Venue).filter(Venue.id == 1).update({Venue.location: 'Elsewhere'})\n"
+            "db.commit()\n"
+        )
+        database_url = SessionLocal.kw["bind"].url.render_as_string(hide_password=False)
+        subprocess.run([sys.executable, "-c", other_process], check=True,
+                       env={**os.environ, "DATABASE_URL": database_url})
+        await get("/events/", tags["/events/"], expect=200)
+        print(f"writes from other processes change the ETags too")
+
+    sqlalchemy_event.listen(Engine, "before_cursor_execute", count)
+    try:
+        SessionLocal = make_session_factory()
+        add_catalog(SessionLocal, venues=5, events_per_venue=args.events // 5, bookings_per_event=2)
+        event_id, ticket_type_id = add_hot_ticket_type(SessionLocal, 100)
+        asyncio.run(check(build_app(SessionLocal), event_id, ticket_type_id))
+    finally:
+        sqlalchemy_event.remove(Engine, "before_cursor_execute", count)
+
+
+def run_serialize(args):
+    """Time serializing each response schema from ORM rows: FastAPI's path
+    (validate, dump to Python, json.dumps), the same with orjson, and the
+    schema's prebuilt serializer encoding straight to JSON bytes.
+
+    Then time GET /bookings/ end to end with and without FAST_JSON_ENABLED.
+    """
+    SessionLocal = make_session_factory()
+    add_catalog(SessionLocal, venues=10, events_per_venue=args.items // 10, bookings_per_event=1)
+    schemas = {
+        "List[BookingWithDetails]": (List[BookingWithDetails], Booking),
+        "List[EventWithVenue]": (List[EventWithVenue], Event),
+        "List[TicketType]": (List[TicketTypeSchema], TicketType),
+        "List[Venue]": (List[VenueSchema], Venue),
+        "EventWithVenue": (EventWithVenue, Event),
+    }
+
+    async def fastapi_path(field, rows, response_class):
+        content = await serialize_response(field=field, response_content=rows)
+        return response_class(content).body
+
+    def best(call):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            body = call()
+            times.append(time.perf_counter() - start)
+        return min(times), body
+
+    print(f"best of {args.repeat}, ms per response")
+    print(f"{'schema':<26}{'items':>7}{'fastapi':>10}{'+orjson':>10}{'adapter':>10}{'speedup':>9}")
+    db = SessionLocal()
+    try:
+        for name, (schema, model) in schemas.items():
+            many = getattr(schema, "__origin__", None) is list
+            item_schema = schema.__args__[0] if many else schema
+            rows = load_for(db.query(model), item_schema).order_by(model.id).limit(args.items if many else 1).all()
+            # Load any remaining relationships before timing
+            serializer(schema).validate_python(rows if many else rows[0], from_attributes=True)
+            content = rows if many else rows[0]
+            field = create_response_field(name=f"Response_{name}", type_=schema)
+            adapter = serializer(schema)
+            loop = asyncio.new_event_loop()
+            try:
+                default, expected = best(lambda: loop.run_until_complete(fastapi_path(field, content, JSONResponse)))
+                orjson, body = best(lambda: loop.run_until_complete(fastapi_path(field, content, ORJSONResponse)))
+                assert json.loads(body) == json.loads(expected), f"{name}: orjson body differs"
+            finally:
+                loop.close()
+            fast, body = best(lambda: adapter.dump_json(adapter.validate_python(content, from_attributes=True)))
+            assert json.loads(body) == json.loads(expected), f"{name}: serializer body differs"
+            print(f"{name:<26}{len(rows):>7}{default * 1000:>10.2f}{orjson * 1000:>10.2f}{fast * 1000:>10.2f}"
+                  f"{default / fast:>8.1f}x")
+    finally:
+        db.close()
+
+    async def end_to_end(app):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            status_code, _ = await asgi_call(app, "GET", f"/bookings/?limit={args.items}")
+            times.append(time.perf_counter() - start)
+            assert status_code == 200
+        return min(times)
+
+    default = asyncio.run(end_to_end(build_app(SessionLocal)))
+    fast = asyncio.run(end_to_end(build_app(SessionLocal, fast_json=True)))
+    print(f"\nGET /bookings/?limit={args.items}: {default * 1000:.1f}ms default, "
+          f"{fast * 1000:.1f}ms with FAST_JSON_ENABLED ({default / fast:.1f}x)")
+
+
+class DictRedis:
+    """Stands in for a Redis client: same get/set/delete/incr calls, values
+    kept in a dict, so the redis run measures JSON encoding but no network."""
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value, ex=None):
+        self._values[key] = value
+
+    def delete(self, key):
+        self._values.pop(key, None)
+
+    def incr(self, key):
+        self._values[key] = int(self._values.get(key, 0)) + 1
+        return self._values[key]
+
+
+def run_cache(args):
+    """Read-heavy traffic against the cached GET routes with each cache backend.
+
+    Reports latency, SQL statements per request and the hit rate from
+    GET /booking-system/stats/cache, then checks that bookings and new events
+    show up in the cached responses straight away.
+    """
+    statements = []
+
+    def count(*_):
+        statements.append(1)
+
+    async def get_json(app, path):
+        status_code, body = await asgi_json(app, "GET", path)
+        assert status_code == 200, f"GET {path} gave {status_code}"
+        return body
+
+    async def traffic(name, app, event_ids, venue_ids):
+        before = (await get_json(app, "/booking-system/stats/cache"))["caches"]
+        # Most requests go to a few popular events, as in an on-sale rush
+        hot = max(1, len(event_ids) // 10)
+        latencies = []
+        statements.clear()
+        for _ in range(args.requests):
+            if random.random() < args.write_ratio:
+                event_id = random.choice(event_ids[:hot])
+                booking = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 1,
+                           "event_id": event_id, "ticket_type_id": event_id * 2}
+                start = time.perf_counter()
+                assert await asgi_request(app, "POST", "/bookings/", booking) == 201
+                latencies.append(time.perf_counter() - start)
+                continue
+            event_id = random.choice(event_ids[:hot] if random.random() < 0.8 else event_ids)
+            path = random.choice([
+                f"/events/{event_id}",
+                f"/venues/{random.choice(venue_ids)}",
+                f"/venues/{random.choice(venue_ids)}/events",
+                f"/ticket-types/{event_id * 2}",
+                "/events/?limit=20",
+            ])
+            start = time.perf_counter()
+            await get_json(app, path)
+            latencies.append(time.perf_counter() - start)
+        after = (await get_json(app, "/booking-system/stats/cache"))["caches"]
+        hits = sum(after[cache]["hits"] - before[cache]["hits"] for cache in after)
+        misses = sum(after[cache]["misses"] - before[cache]["misses"] for cache in after)
+        hit_rate = f"{hits / (hits + misses):.0%}" if hits + misses else "-"
+        print(f"{name:<8}{percentile(latencies, 50) * 1000:>9.2f}{percentile(latencies, 99) * 1000:>9.2f}"
+              f"{len(statements) / args.requests:>11.2f}{hit_rate:>10}")
+
+    async def check_invalidation(name, app, venue_id, event_id, ticket_type_id):
+        # Warm the caches, then write and read back
+        seats = (await get_json(app, f"/ticket-types/{ticket_type_id}"))["quantity_available"]
+        listed = len(await get_json(app, "/events/?limit=1000"))
+        at_venue = len(await get_json(app, f"/venues/{venue_id}/events"))
+        booking = {"user_name": "bench", "user_email": "bench@example.com", "quantity": 2,
+                   "event_id": event_id, "ticket_type_id": ticket_type_id}
+        assert await asgi_request(app, "POST", "/bookings/", booking) == 201
+        assert (await get_json(app, f"/ticket-types/{ticket_type_id}"))["quantity_available"] == seats - 2, \
+            f"{name}: cached ticket type kept its old seat count"
+        new_event = {"name": "Encore", "date": (datetime.now() + timedelta(days=60)).isoformat(), "venue_id": venue_id}
+        assert await asgi_request(app, "POST", "/events/", new_event) == 201
+        assert len(await get_json(app, "/events/?limit=1000")) == listed + 1, f"{name}: cached event list is stale"
+        assert len(await get_json(app, f"/venues/{venue_id}/events")) == at_venue + 1, \
+            f"{name}: cached venue events are stale"
+        # A lookup of a venue id before it exists must not be cached past its creation
+        next_venue_id = max(venue["id"] for venue in await get_json(app, "/venues/?limit=1000")) + 1
+        assert (await asgi_json(app, "GET", f"/venues/{next_venue_id}/occupancy"))[0] == 404
+        new_venue = {"name": "Annex", "location": "Bench Street", "capacity": 100}
+        status_code, created = await asgi_json(app, "POST", "/venues/", new_venue)
+        assert status_code == 201 and created["id"] == next_venue_id, status_code
+        assert (await get_json(app, f"/venues/{next_venue_id}/occupancy"))["venue_id"] == next_venue_id, \
+            f"{name}: occupancy of a new venue is stuck at 404"
+
+    backends = {
+        "none": NullBackend,
+        "memory": lambda: MemoryBackend(args.max_entries),
+        "redis": lambda: RedisBackend(DictRedis()),
+    }
+    print(f"{args.requests} requests, {args.write_ratio:.0%} bookings, 80% of reads on the top 10% of events")
+    print(f"{'backend':<8}{'p50 ms':>9}{'p99 ms':>9}{'SQL/req':>11}{'hit rate':>10}")
+    sqlalchemy_event.listen(Engine, "before_cursor_execute", count)
+    try:
+        for name, backend in backends.items():
+            set_default_backend(backend())
+            SessionLocal = make_session_factory()
+            add_catalog(SessionLocal, venues=args.venues, events_per_venue=args.events // args.venues, bookings_per_event=2)
+            app = build_app(SessionLocal)
+            event_ids = list(range(1, args.events + 1))
+            asyncio.run(traffic(name, app, event_ids, list(range(1, args.venues + 1))))
+            asyncio.run(check_invalidation(name, app, 1, 1, 2))
+        print("bookings, new events and new venues are visible in cached responses straight away")
+    finally:
+        sqlalchemy_event.remove(Engine, "before_cursor_execute", count)
+        set_default_backend(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    inventory = subparsers.add_parser("inventory", help="concurrent bookings on one hot ticket type")
+    inventory.add_argument("--threads", type=int, default=16)
+    inventory.add_argument("--capacity", type=int, default=2000)
+    inventory.add_argument("--oversubscribe", type=int, default=2,
+                           help="booking attempts per available seat")
+    inventory.set_defaults(func=run_inventory)
+
+    availability = subparsers.add_parser("availability", help="p50/p99 latency with and without the availability cache")
+    availability.add_argument("--threads", type=int, default=16)
+    availability.add_argument("--capacity", type=int, default=2000)
+    availability.add_argument("--requests", type=int, default=4000)
+    availability.add_argument("--read-ratio", type=float, default=0.8,
+                              help="fraction of requests that read availability")
+    availability.set_defaults(func=run_availability)
+
+    bulk = subparsers.add_parser("bulk", help="single-item vs bulk booking ingestion throughput")
+    bulk.add_argument("--items", type=int, default=20000)
+    bulk.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    bulk.set_defaults(func=run_bulk)
+
+    mixed = subparsers.add_parser("mixed", help="SQLite defaults vs the tuned engine under mixed reads and writes")
+    mixed.add_argument("--threads", type=int, default=16)
+    mixed.add_argument("--requests", type=int, default=5000)
+    mixed.add_argument("--write-ratio", type=float, default=0.2)
+    mixed.set_defaults(func=run_mixed)
+
+    backend = subparsers.add_parser("backend", help="concurrent booking/cancel checks against PostgreSQL or SQLite")
+    backend.add_argument("--url", help="scratch database URL (its tables are dropped); default: testing.postgresql if installed, else SQLite")
+    backend.add_argument("--threads", type=int, default=16)
+    backend.add_argument("--capacity", type=int, default=200)
+    backend.add_argument("--cancels-per-booking", type=int, default=4)
+    backend.set_defaults(func=run_backend)
+
+    queries = subparsers.add_parser("queries", help="SQL statements per list endpoint across page sizes")
+    queries.add_argument("--page-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    queries.set_defaults(func=run_queries)
+
+    pagination = subparsers.add_parser("pagination", help="page latency deep into a large bookings table")
+    pagination.add_argument("--rows", type=int, default=5000000)
+    pagination.add_argument("--limit", type=int, default=100)
+    pagination.add_argument("--repeat", type=int, default=5)
+    pagination.set_defaults(func=run_pagination)
+
+    plans = subparsers.add_parser("plans", help="EXPLAIN QUERY PLAN for hot queries; fails on full table scans")
+    plans.set_defaults(func=run_plans)
+
+    concurrency = subparsers.add_parser("concurrency", help="threadpool vs async routers under many concurrent clients")
+    concurrency.add_argument("--clients", type=int, default=2000)
+    concurrency.add_argument("--requests-per-client", type=int, default=5)
+    concurrency.add_argument("--write-ratio", type=float, default=0.1)
+    concurrency.add_argument("--pool-size", type=int, help="connections per engine (default: one per client)")
+    concurrency.add_argument("--no-check", dest="check", action="store_false",
+                             help="skip replaying every route in both modes and comparing the answers")
+    concurrency.set_defaults(func=run_concurrency)
+
+    etag = subparsers.add_parser("etag", help="conditional GETs: 304 after one version query, ETags change only on relevant writes")
+    etag.add_argument("--events", type=int, default=100)
+    etag.add_argument("--repeat", type=int, default=20)
+    etag.set_defaults(func=run_etag)
+
+    cache = subparsers.add_parser("cache", help="read-heavy traffic with no response cache, the memory LRU and a Redis stub")
+    cache.add_argument("--requests", type=int, default=5000)
+    cache.add_argument("--write-ratio", type=float, default=0.02)
+    cache.add_argument("--venues", type=int, default=10)
+    cache.add_argument("--events", type=int, default=200)
+    cache.add_argument("--max-entries", type=int, default=10000)
+    cache.set_defaults(func=run_cache)
+
+    search_parser = subparsers.add_parser("search", help="full-text booking search vs the ILIKE fallback at scale")
+    search_parser.add_argument("--bookings", type=int, default=1000000)
+    search_parser.add_argument("--venues", type=int, default=50)
+    search_parser.add_argument("--events", type=int, default=1000)
+    search_parser.add_argument("--limit", type=int, default=100)
+    search_parser.add_argument("--repeat", type=int, default=5)
+    search_parser.add_argument("--requests", type=int, default=500,
+                               help="single booking requests timed with and without the index")
+    search_parser.add_argument("--no-check", dest="check", action="store_false",
+                               help="skip comparing every match of the index with ILIKE")
+    search_parser.set_defaults(func=run_search)
+
+    holds_parser = subparsers.add_parser("holds", help="on-sale simulation: pending bookings vs expiring seat holds")
+    holds_parser.add_argument("--users", type=int, default=50000)
+    holds_parser.add_argument("--seats", type=int, default=5000)
+    holds_parser.add_argument("--clients", type=int, default=16, help="requests in flight at a time")
+    holds_parser.add_argument("--abandon", type=float, default=0.3, help="share of buyers who never finish checkout")
+    holds_parser.add_argument("--checkout", type=float, default=0.2, help="seconds a buyer takes to finish checkout")
+    holds_parser.add_argument("--ttl", type=float, default=2.0, help="hold lifetime in seconds")
+    holds_parser.set_defaults(func=run_holds)
+
+    waiting = subparsers.add_parser("waiting-room", help="on-sale rush: goodput with and without the waiting room queue")
+    waiting.add_argument("--buyers", type=int, default=4000)
+    waiting.add_argument("--seats", type=int, default=2000)
+    waiting.add_argument("--clients", type=int, default=50, help="requests in flight at a time")
+    waiting.add_argument("--rates", type=float, nargs="+", default=[50, 100, 150],
+                         help="buyers the queue admits per second, one run each")
+    waiting.add_argument("--burst", type=int, default=10, help="buyers the queue admits at once")
+    waiting.set_defaults(func=run_waiting_room)
+
+    group = subparsers.add_parser("group-commit", help="bookings/s with a commit per booking vs group commit at several batch windows")
+    group.add_argument("--bookings", type=int, default=5000)
+    group.add_argument("--clients", type=int, default=50, help="requests in flight at a time")
+    group.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5, 10],
+                       help="milliseconds the writer waits for more bookings, one run each")
+    group.add_argument("--max-batch", type=int, default=256, help="most bookings per transaction")
+    group.add_argument("--synchronous", choices=["off", "normal", "full"], default="normal")
+    group.set_defaults(func=run_group_commit)
+
+    codes = subparsers.add_parser("codes", help="confirmation codes: issue rate, uniqueness and lookups by code")
+    codes.add_argument("--codes", type=int, default=200000)
+    codes.add_argument("--block", type=int, default=1000, help="codes per allocation in the block run")
+    codes.add_argument("--threads", type=int, default=8)
+    codes.add_argument("--events", type=int, default=1000)
+    codes.add_argument("--bookings-per-event", type=int, default=100)
+    codes.add_argument("--lookups", type=int, default=1000)
+    codes.set_defaults(func=run_codes)
+
+    serialize = subparsers.add_parser("serialize", help="response serialization per schema: FastAPI default vs orjson vs prebuilt serializers")
+    serialize.add_argument("--items", type=int, default=1000, help="items per list response")
+    serialize.add_argument("--repeat", type=int, default=20)
+    serialize.set_defaults(func=run_serialize)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
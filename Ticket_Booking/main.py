@@ -1,10 +1,27 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import events, venues, ticket_types, bookings, stats
+from app import config
+from app.database.database import SessionLocal, async_engine, engine
+from app.database.init_db import create_server_tables
+from app.utils.availability_cache import availability_cache
+from app.utils.booking_writer import booking_writer
+from app.utils.confirmation_codes import confirmation_codes
+from app.utils.counters import read_counters
+from app.utils.fast_json import make_fast_json_router
+from app.utils.holds import hold_manager
+from app.utils.pagination import NEXT_CURSOR_HEADER
+
+# Async mode serves the same routes from native async handlers on an AsyncSession
+if config.ASYNC_DB_ENABLED:
+    from app.routers.aio import events, venues, ticket_types, bookings, holds, stats, waiting_room
+else:
+    from app.routers import events, venues, ticket_types, bookings, holds, stats, waiting_room
 
 app = FastAPI(title="Ticket Booking System", 
               description="API for managing events, venues, ticket types, and bookings",
-              version="1.0.0")
+              version="1.0.0",
+              default_response_class=ORJSONResponse if config.FAST_JSON_ENABLED else JSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -13,14 +30,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+@app.on_event("startup")
+def startup_event():
+    # Tables added after databases initialized by an older run.py
+    create_server_tables(engine)
+    if config.ASYNC_DB_ENABLED:
+        # Create the stats counter rows now, so the async stats route never
+        # has to build them on the event loop
+        with SessionLocal() as db:
+            read_counters(db)
+    confirmation_codes.start(SessionLocal, config.CONFIRMATION_WORKER_LEASE_TTL)
+    if config.AVAILABILITY_CACHE_ENABLED:
+        availability_cache.start(SessionLocal, config.AVAILABILITY_FLUSH_INTERVAL)
+    if config.GROUP_COMMIT_ENABLED:
+        booking_writer.start(SessionLocal)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Write the queued bookings before the seat counter's last flush
+    booking_writer.stop()
+    if config.AVAILABILITY_CACHE_ENABLED:
+        availability_cache.stop()
+    confirmation_codes.stop()
+
+@app.on_event("startup")
+async def start_hold_sweeper():
+    hold_manager.start(SessionLocal, config.HOLD_SWEEP_INTERVAL)
+
+@app.on_event("shutdown")
+async def stop_hold_sweeper():
+    await hold_manager.stop()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
+
+# In fast JSON mode responses are encoded by the schemas' prebuilt serializers
+def routes(module):
+    return make_fast_json_router(module.router) if config.FAST_JSON_ENABLED else module.router
+
 # Include routers
-app.include_router(events.router, prefix="/events", tags=["Events"])
-app.include_router(venues.router, prefix="/venues", tags=["Venues"])
-app.include_router(ticket_types.router, prefix="/ticket-types", tags=["Ticket Types"])
-app.include_router(bookings.router, prefix="/bookings", tags=["Bookings"])
-app.include_router(stats.router, prefix="/booking-system", tags=["Statistics"])
+app.include_router(routes(events), prefix="/events", tags=["Events"])
+app.include_router(routes(venues), prefix="/venues", tags=["Venues"])
+app.include_router(routes(ticket_types), prefix="/ticket-types", tags=["Ticket Types"])
+app.include_router(routes(bookings), prefix="/bookings", tags=["Bookings"])
+app.include_router(routes(holds), prefix="/holds", tags=["Holds"])
+app.include_router(routes(waiting_room), prefix="/waiting-room", tags=["Waiting Room"])
+app.include_router(routes(stats), prefix="/booking-system", tags=["Statistics"])
 
 @app.get("/")
 def read_root():